@@ -0,0 +1,115 @@
+"""
+Merge Benchmark
+Compares wall time, peak RSS and output size of PyPDF2's PdfMerger and
+the pikepdf merge in pdf_merge when merging many small documents.
+
+Each merger runs in its own interpreter so peak memory is not shared.
+
+Usage:
+    python bench_merge.py [inputs] [pages_per_input]
+
+The inputs are generated statements that all embed the same logo and
+font, like a month-end statement batch.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+MERGERS = ('pypdf2', 'pikepdf')
+
+
+def make_fixtures(work_dir, inputs, pages):
+    import fitz
+    import numpy as np
+    from PIL import Image
+
+    # Noise does not compress, so a duplicated logo shows up in the output size
+    logo_path = os.path.join(work_dir, 'logo.png')
+    Image.fromarray(np.random.default_rng(0).integers(0, 255, (200, 400, 3), dtype=np.uint8)).save(logo_path)
+
+    paths = []
+    for number in range(1, inputs + 1):
+        doc = fitz.open()
+        for page_number in range(1, pages + 1):
+            page = doc.new_page()
+            page.insert_image(fitz.Rect(50, 40, 250, 140), filename=logo_path)
+            page.insert_textbox(
+                fitz.Rect(50, 160, page.rect.width - 50, page.rect.height - 50),
+                f'Statement {number}, page {page_number}\n' + 'Opening balance 1,024.00 Payment -12.50 ' * 40,
+                fontname='tiro', fontsize=10
+            )
+        doc.set_toc([[1, f'Statement {number}', 1]])
+        path = os.path.join(work_dir, f'statement_{number:04d}.pdf')
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def run_merger(merger, list_path, output_path):
+    """Body of the measuring subprocess"""
+    import resource
+    from bench_render import _peak_rss_kb
+
+    with open(list_path) as f:
+        input_paths = json.load(f)
+
+    start = time.perf_counter()
+    if merger == 'pypdf2':
+        from PyPDF2 import PdfMerger
+        writer = PdfMerger()
+        for input_path in input_paths:
+            writer.append(input_path)
+        writer.write(output_path)
+        writer.close()
+    else:
+        import pdf_merge
+        pdf_merge.merge(input_paths, output_path)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'merger': merger,
+        'inputs': len(input_paths),
+        'seconds': round(elapsed, 3),
+        'peak_rss_mb': round(_peak_rss_kb(resource.RUSAGE_SELF) / 1024, 1),
+        'output_mb': round(os.path.getsize(output_path) / 1024 / 1024, 2),
+    }))
+
+
+def main(inputs=300, pages=2):
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_paths = make_fixtures(work_dir, inputs, pages)
+        list_path = os.path.join(work_dir, 'inputs.json')
+        with open(list_path, 'w') as f:
+            json.dump(input_paths, f)
+
+        input_mb = sum(os.path.getsize(path) for path in input_paths) / 1024 / 1024
+        print(f'{inputs} inputs, {pages} pages each, {input_mb:.1f} MB total')
+        print(f'{"merger":10} {"seconds":>8} {"peak MB":>8} {"output MB":>10}')
+        for merger in MERGERS:
+            output_path = os.path.join(work_dir, f'merged_{merger}.pdf')
+            result = subprocess.run(
+                [sys.executable, __file__, '--run', merger, list_path, output_path],
+                capture_output=True, text=True, cwd=SCRIPTS_DIR
+            )
+            lines = result.stdout.strip().splitlines()
+            if result.returncode != 0 or not lines:
+                error = (result.stderr.strip().splitlines() or ['failed'])[-1]
+                print(f'{merger:10} unavailable: {error}')
+                continue
+
+            row = json.loads(lines[-1])
+            print(f'{merger:10} {row["seconds"]:8.2f} {row["peak_rss_mb"]:8.1f} {row["output_mb"]:10.2f}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--run':
+        run_merger(sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        inputs = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+        pages = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+        main(inputs, pages)
@@ -0,0 +1,91 @@
+"""
+OCR Engine Benchmark
+Compares pages/sec of the OCR engines against plain pytesseract, which
+writes every page to a temp file and reloads the language data per call.
+
+Each engine runs in its own interpreter. Pages are rendered before the
+clock starts, so only recognition is measured, and the OCR cache is off.
+
+Usage:
+    python bench_ocr.py [pdf_path] [languages] [pages]
+
+Without a pdf_path a text-heavy fixture document is generated.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ENGINES = ('pytesseract', 'cli', 'tesserocr')
+
+
+def run_engine(engine, pdf_path, languages, limit):
+    """Body of the measuring subprocess"""
+    import render
+    import ocr_processor
+
+    pages = range(1, min(render.page_count(pdf_path), limit) + 1)
+    images = [image for _, image in render.iter_pages(pdf_path, pages, dpi=ocr_processor.OCR_DPI)]
+
+    if engine == 'pytesseract':
+        import pytesseract
+        recognize = lambda image: pytesseract.image_to_string(
+            image, lang=languages, config=ocr_processor.OCR_CONFIG
+        )
+    else:
+        import ocr_engine
+        backend = ocr_engine.ENGINES[engine]()
+        recognize = lambda image: backend.recognize(
+            image, languages, ocr_processor.OCR_CONFIG, ocr_processor.OCR_DPI
+        )
+
+    start = time.perf_counter()
+    characters = sum(len(recognize(image)) for image in images)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'engine': engine,
+        'pages': len(images),
+        'characters': characters,
+        'seconds': round(elapsed, 3),
+        'pages_per_sec': round(len(images) / elapsed, 2) if elapsed else None,
+    }))
+
+
+def main(pdf_path=None, languages='eng+ind', limit=20):
+    import bench_render
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if not pdf_path:
+            pdf_path = os.path.join(work_dir, 'fixture.pdf')
+            bench_render.make_fixture(pdf_path, limit)
+
+        env = dict(os.environ, PDF_TOOLS_OCR_CACHE='0')
+        print(f'{"engine":12} {"pages":>6} {"seconds":>8} {"pages/s":>8} {"chars":>8}')
+        for engine in ENGINES:
+            result = subprocess.run(
+                [sys.executable, __file__, '--run', engine, pdf_path, languages, str(limit)],
+                capture_output=True, text=True, cwd=SCRIPTS_DIR, env=env
+            )
+            lines = result.stdout.strip().splitlines()
+            if result.returncode != 0 or not lines:
+                error = (result.stderr.strip().splitlines() or ['failed'])[-1]
+                print(f'{engine:12} unavailable: {error}')
+                continue
+
+            row = json.loads(lines[-1])
+            print(f'{engine:12} {row["pages"]:6d} {row["seconds"]:8.2f} {row["pages_per_sec"]:8.2f} '
+                  f'{row["characters"]:8d}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--run':
+        run_engine(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]))
+    else:
+        pdf_path = sys.argv[1] if len(sys.argv) > 1 else None
+        languages = sys.argv[2] if len(sys.argv) > 2 else 'eng+ind'
+        limit = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+        main(pdf_path, languages, limit)
@@ -0,0 +1,103 @@
+"""
+Render Backend Benchmark
+Compares pages/sec and peak RSS of the fitz and poppler render backends.
+
+Each backend runs in its own interpreter so peak memory is not shared.
+Peak RSS of child processes (pdftoppm for poppler) is reported separately.
+
+Usage:
+    python bench_render.py [pdf_path] [dpi] [pages]
+
+Without a pdf_path a text-heavy fixture document is generated.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_fixture(path, pages=50):
+    import fitz
+
+    doc = fitz.open()
+    for page_number in range(1, pages + 1):
+        page = doc.new_page()
+        page.insert_textbox(
+            fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50),
+            f'Page {page_number}\n' + 'Lorem ipsum dolor sit amet, consectetur adipiscing. ' * 60,
+            fontsize=10
+        )
+        page.draw_rect(fitz.Rect(60, 600, 300, 760), color=(0, 0, 1), fill=(0.8, 0.9, 1))
+    doc.save(path)
+    doc.close()
+
+
+def _peak_rss_kb(who):
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_backend(backend, pdf_path, dpi, limit):
+    """Body of the measuring subprocess"""
+    import resource
+    import render
+
+    pages = range(1, min(render.page_count(pdf_path, backend), limit) + 1)
+
+    start = time.perf_counter()
+    rendered = 0
+    for _, image in render.iter_pages(pdf_path, pages, dpi=dpi, backend=backend):
+        image.tobytes()
+        rendered += 1
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'backend': backend,
+        'pages': rendered,
+        'seconds': round(elapsed, 3),
+        'pages_per_sec': round(rendered / elapsed, 2) if elapsed else None,
+        'peak_rss_mb': round(_peak_rss_kb(resource.RUSAGE_SELF) / 1024, 1),
+        'children_peak_rss_mb': round(_peak_rss_kb(resource.RUSAGE_CHILDREN) / 1024, 1),
+    }))
+
+
+def main(pdf_path=None, dpi=150, limit=50):
+    with tempfile.TemporaryDirectory() as work_dir:
+        if not pdf_path:
+            pdf_path = os.path.join(work_dir, 'fixture.pdf')
+            make_fixture(pdf_path, limit)
+
+        print(f'{"backend":10} {"pages":>6} {"seconds":>8} {"pages/s":>8} {"peak MB":>8} {"child MB":>9}')
+        for backend in ('fitz', 'poppler'):
+            result = subprocess.run(
+                [sys.executable, __file__, '--run', backend, pdf_path, str(dpi), str(limit)],
+                capture_output=True, text=True, cwd=SCRIPTS_DIR
+            )
+            lines = result.stdout.strip().splitlines()
+            if result.returncode != 0 or not lines:
+                error = (result.stderr.strip().splitlines() or ['failed'])[-1]
+                print(f'{backend:10} unavailable: {error}')
+                continue
+
+            row = json.loads(lines[-1])
+            print(f'{backend:10} {row["pages"]:6d} {row["seconds"]:8.2f} {row["pages_per_sec"]:8.2f} '
+                  f'{row["peak_rss_mb"]:8.1f} {row["children_peak_rss_mb"]:9.1f}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--run':
+        run_backend(sys.argv[2], sys.argv[3], int(sys.argv[4]), int(sys.argv[5]))
+    else:
+        pdf_path = sys.argv[1] if len(sys.argv) > 1 else None
+        dpi = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+        limit = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+        main(pdf_path, dpi, limit)
@@ -0,0 +1,126 @@
+"""
+Text Search Benchmark
+Compares replace_text with one page.search_for call per replacement per
+page, as it worked before text_search, against the single-pass matcher.
+
+Each replacer runs in its own interpreter so peak memory is not shared.
+
+Usage:
+    python bench_text_search.py [pdf_path] [replacements] [pages]
+
+Without a pdf_path a fixture document is generated. Each replacement
+targets a reference number found on one page only, so the time goes to
+finding text rather than to redacting it.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPLACERS = ('search_for', 'single-pass')
+
+
+def make_fixture(path, pages=300):
+    import fitz
+
+    doc = fitz.open()
+    for page_number in range(1, pages + 1):
+        page = doc.new_page()
+        page.insert_textbox(
+            fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50),
+            f'Invoice INV-{page_number:05d}\n' + 'The Supplier shall deliver the Goods to the Buyer. ' * 50,
+            fontsize=10
+        )
+    doc.save(path)
+    doc.close()
+
+
+def make_replacements(count):
+    return [
+        {'old_text': f'INV-{number:05d}', 'new_text': f'REF-{number:05d}'}
+        for number in range(1, count + 1)
+    ]
+
+
+def replace_per_string(input_path, output_path, replacements):
+    """The replacement loop as replace_text_in_pdf ran it before text_search"""
+    import fitz
+
+    doc = fitz.open(input_path)
+    total = 0
+    for page in doc:
+        page_replacements = 0
+        for replacement in replacements:
+            for inst in page.search_for(replacement['old_text']):
+                page.add_redact_annot(inst, text=replacement['new_text'], fill=(1, 1, 1))
+                page_replacements += 1
+        if page_replacements:
+            page.apply_redactions()
+        total += page_replacements
+    doc.save(output_path, garbage=4, deflate=True, clean=True)
+    doc.close()
+    return total
+
+
+def run_replacer(replacer, pdf_path, output_path, count):
+    """Body of the measuring subprocess"""
+    import resource
+    from bench_render import _peak_rss_kb
+
+    replacements = make_replacements(count)
+    start = time.perf_counter()
+    if replacer == 'search_for':
+        total = replace_per_string(pdf_path, output_path, replacements)
+        pages_modified = None
+    else:
+        import pdf_text_editor
+        result = pdf_text_editor.replace_text_in_pdf(pdf_path, output_path, replacements)
+        if result['type'] != 'success':
+            raise RuntimeError(result['message'])
+        total, pages_modified = result['total_replacements'], result['pages_modified']
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'replacer': replacer,
+        'replacements': total,
+        'pages_modified': pages_modified,
+        'seconds': round(elapsed, 3),
+        'peak_rss_mb': round(_peak_rss_kb(resource.RUSAGE_SELF) / 1024, 1),
+    }))
+
+
+def main(pdf_path=None, count=200, pages=300):
+    with tempfile.TemporaryDirectory() as work_dir:
+        if not pdf_path:
+            pdf_path = os.path.join(work_dir, 'fixture.pdf')
+            make_fixture(pdf_path, pages)
+
+        print(f'{count} replacements')
+        print(f'{"replacer":12} {"found":>7} {"seconds":>8} {"peak MB":>8}')
+        for replacer in REPLACERS:
+            output_path = os.path.join(work_dir, f'replaced_{replacer}.pdf')
+            result = subprocess.run(
+                [sys.executable, __file__, '--run', replacer, pdf_path, output_path, str(count)],
+                capture_output=True, text=True, cwd=SCRIPTS_DIR
+            )
+            lines = result.stdout.strip().splitlines()
+            if result.returncode != 0 or not lines:
+                error = (result.stderr.strip().splitlines() or ['failed'])[-1]
+                print(f'{replacer:12} unavailable: {error}')
+                continue
+
+            row = json.loads(lines[-1])
+            print(f'{replacer:12} {row["replacements"]:7d} {row["seconds"]:8.2f} {row["peak_rss_mb"]:8.1f}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--run':
+        run_replacer(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]))
+    else:
+        pdf_path = sys.argv[1] if len(sys.argv) > 1 and sys.argv[1] else None
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+        pages = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+        main(pdf_path, count, pages)
@@ -0,0 +1,114 @@
+"""
+Watermark Benchmark
+Compares pages/sec and output size of the shared form XObject watermark
+in pdf_watermark against the previous approach: a new reportlab canvas
+per page, re-parsed with PyPDF2 and merged into the page.
+
+Each stamper runs in its own interpreter so peak memory is not shared.
+
+Usage:
+    python bench_watermark.py [pdf_path] [pages]
+
+Without a pdf_path a text-heavy fixture document is generated.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+STAMPERS = ('per-page', 'form')
+TEXT = 'CONFIDENTIAL'
+
+
+def stamp_per_page(input_path, output_path):
+    """The watermark as add_watermark wrote it before pdf_watermark"""
+    import io
+    from PyPDF2 import PdfReader, PdfWriter
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+
+    reader = PdfReader(input_path)
+    writer = PdfWriter()
+
+    for page in reader.pages:
+        packet = io.BytesIO()
+        can = canvas.Canvas(packet, pagesize=letter)
+        can.setFont("Helvetica", 36)
+        can.setFillColorRGB(0.5, 0.5, 0.5, alpha=0.3)
+        can.drawCentredString(300, 400, TEXT)
+        can.save()
+        packet.seek(0)
+
+        watermark = PdfReader(packet)
+        page.merge_page(watermark.pages[0])
+        writer.add_page(page)
+
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+
+
+def run_stamper(stamper, pdf_path, output_path):
+    """Body of the measuring subprocess"""
+    import resource
+    from bench_render import _peak_rss_kb
+
+    start = time.perf_counter()
+    if stamper == 'per-page':
+        stamp_per_page(pdf_path, output_path)
+    else:
+        import pdf_watermark
+        pdf_watermark.add_watermark(pdf_path, output_path, TEXT)
+    elapsed = time.perf_counter() - start
+
+    import pikepdf
+    with pikepdf.open(output_path) as pdf:
+        pages = len(pdf.pages)
+
+    print(json.dumps({
+        'stamper': stamper,
+        'pages': pages,
+        'seconds': round(elapsed, 3),
+        'pages_per_sec': round(pages / elapsed, 2) if elapsed else None,
+        'peak_rss_mb': round(_peak_rss_kb(resource.RUSAGE_SELF) / 1024, 1),
+        'output_mb': round(os.path.getsize(output_path) / 1024 / 1024, 2),
+    }))
+
+
+def main(pdf_path=None, pages=1000):
+    import bench_render
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if not pdf_path:
+            pdf_path = os.path.join(work_dir, 'fixture.pdf')
+            bench_render.make_fixture(pdf_path, pages)
+
+        input_mb = os.path.getsize(pdf_path) / 1024 / 1024
+        print(f'input {input_mb:.2f} MB')
+        print(f'{"stamper":10} {"pages":>6} {"seconds":>8} {"pages/s":>8} {"peak MB":>8} {"output MB":>10}')
+        for stamper in STAMPERS:
+            output_path = os.path.join(work_dir, f'stamped_{stamper}.pdf')
+            result = subprocess.run(
+                [sys.executable, __file__, '--run', stamper, pdf_path, output_path],
+                capture_output=True, text=True, cwd=SCRIPTS_DIR
+            )
+            lines = result.stdout.strip().splitlines()
+            if result.returncode != 0 or not lines:
+                error = (result.stderr.strip().splitlines() or ['failed'])[-1]
+                print(f'{stamper:10} unavailable: {error}')
+                continue
+
+            row = json.loads(lines[-1])
+            print(f'{stamper:10} {row["pages"]:6d} {row["seconds"]:8.2f} {row["pages_per_sec"]:8.2f} '
+                  f'{row["peak_rss_mb"]:8.1f} {row["output_mb"]:10.2f}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--run':
+        run_stamper(sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        pdf_path = sys.argv[1] if len(sys.argv) > 1 else None
+        pages = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+        main(pdf_path, pages)
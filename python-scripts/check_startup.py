@@ -0,0 +1,174 @@
+"""
+Startup Budget Check
+Measures the cold-start cost of every script command and compares it with
+the budgets in startup_budget.json.
+
+Each command runs in a fresh interpreter against a tiny generated fixture,
+so the numbers are dominated by interpreter startup and imports. The check
+exits non-zero when a command goes over its wall-time or module budget.
+
+Usage:
+    python check_startup.py            check against the budget
+    python check_startup.py --update   re-measure and rewrite the budget
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import tempfile
+import subprocess
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BUDGET_PATH = os.path.join(SCRIPTS_DIR, 'startup_budget.json')
+RUNS = 3
+
+# Headroom applied when --update writes a new budget
+TIME_HEADROOM = 2.0
+MODULE_HEADROOM = 1.1
+
+MINIMAL_PDF = b"""%PDF-1.4
+1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj
+2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj
+3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] /Contents 4 0 R
+   /Resources << /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >> >> >> endobj
+4 0 obj << /Length 44 >> stream
+BT /F1 12 Tf 20 100 Td (Startup check) Tj ET
+endstream endobj
+trailer << /Root 1 0 R >>
+%%EOF
+"""
+
+
+def _write_png(path, width=8, height=8):
+    raw = b''.join(b'\x00' + b'\xff' * (width * 3) for _ in range(height))
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body))
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(raw)))
+        f.write(chunk(b'IEND', b''))
+
+
+def command_matrix(work_dir):
+    """Every (script, command, args) combination covered by the budget"""
+    pdf = os.path.join(work_dir, 'fixture.pdf')
+    png = os.path.join(work_dir, 'fixture.png')
+    out = lambda name: os.path.join(work_dir, name)
+
+    return [
+        ('pdf_editor.py', 'merge', [json.dumps([pdf, pdf]), out('merged.pdf')]),
+        ('pdf_editor.py', 'split', [pdf, work_dir, '[1]']),
+        ('pdf_editor.py', 'rotate', [pdf, out('rotated.pdf'), '{"1": 90}']),
+        ('pdf_editor.py', 'pipeline', [pdf, out('pipeline.pdf'), json.dumps([
+            {'op': 'rotate', 'pages': {'1': 90}}, {'op': 'delete', 'pages': [2]}
+        ])]),
+        ('pdf_editor.py', 'delete', [pdf, out('deleted.pdf'), '[2]']),
+        ('pdf_editor.py', 'reorder', [pdf, out('reordered.pdf'), '[1]']),
+        ('pdf_editor.py', 'watermark', [pdf, out('watermarked.pdf'), 'DRAFT']),
+        ('pdf_editor.py', 'encrypt', [pdf, out('encrypted.pdf'), 'secret']),
+        ('pdf_editor.py', 'decrypt', [pdf, out('decrypted.pdf'), '']),
+        ('pdf_editor.py', 'thumbnails', [pdf]),
+        ('pdf_editor.py', 'page_image', [pdf, '1']),
+        ('pdf_converter.py', 'get_thumbnails', [pdf]),
+        ('pdf_converter.py', 'stream_thumbnails', [pdf, '1', '50']),
+        ('pdf_converter.py', 'get_page_image', [pdf, '1']),
+        ('pdf_converter.py', 'pdf_to_images', [pdf, work_dir, 'png', '72']),
+        ('pdf_converter.py', 'images_to_pdf', [json.dumps([png]), out('images.pdf')]),
+        ('pdf_converter.py', 'pdf_to_word', [pdf, out('converted.docx')]),
+        ('ocr_processor.py', 'ocr_pdf', [pdf, 'eng', '[1]', 'txt']),
+        ('ocr_processor.py', 'ocr_image', [png, 'eng']),
+        ('ocr_processor.py', 'ocr_images', [json.dumps([png, png]), 'eng']),
+        ('ocr_processor.py', 'ocr_cache_stats', []),
+        ('pdf_text_editor.py', 'replace_text', [pdf, out('replaced.pdf'), '[]']),
+        ('pdf_text_editor.py', 'update_content', [pdf, out('updated.pdf'), 'Startup check']),
+        ('pdf_text_editor.py', 'overlay_text', [pdf, out('overlay.pdf'), 'Startup check']),
+        ('pdf_text_editor.py', 'extract_layout', [pdf, '1']),
+        ('search_index.py', 'index', [json.dumps([pdf]), '1']),
+        ('search_index.py', 'query', ['startup check']),
+    ]
+
+
+def measure(script, command, args):
+    """Return (best wall time in ms, number of imported modules)"""
+    argv = [os.path.join(SCRIPTS_DIR, script), command, *args]
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1', PDF_TOOLS_RENDER_CACHE='0', PDF_TOOLS_OCR_CACHE='0')
+
+    best = None
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *argv], capture_output=True, env=env)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+
+    # -X importtime writes one stderr line per imported module
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', *argv],
+        capture_output=True, text=True, env=env
+    )
+    modules = sum(
+        1 for line in result.stderr.splitlines()
+        if line.startswith('import time:') and 'cumulative' not in line
+    )
+    return round(best, 1), modules
+
+
+def main(update=False):
+    budget = {}
+    if os.path.exists(BUDGET_PATH):
+        with open(BUDGET_PATH, 'r', encoding='utf-8') as f:
+            budget = json.load(f)
+
+    failures = []
+    measured = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        with open(os.path.join(work_dir, 'fixture.pdf'), 'wb') as f:
+            f.write(MINIMAL_PDF)
+        _write_png(os.path.join(work_dir, 'fixture.png'))
+
+        for script, command, args in command_matrix(work_dir):
+            key = f'{script} {command}'
+            elapsed, modules = measure(script, command, args)
+            measured[key] = {'ms': elapsed, 'modules': modules}
+
+            limit = budget.get(key)
+            status = 'ok'
+            if not update:
+                if limit is None:
+                    status = 'NO BUDGET'
+                    failures.append(key)
+                elif elapsed > limit['max_ms'] or modules > limit['max_modules']:
+                    status = 'OVER BUDGET'
+                    failures.append(key)
+
+            limit_text = f"(budget {limit['max_ms']}ms / {limit['max_modules']})" if limit else ''
+            print(f'{key:40} {elapsed:8.1f}ms {modules:5d} modules  {status} {limit_text}')
+
+    if update:
+        new_budget = {
+            key: {
+                'max_ms': round(values['ms'] * TIME_HEADROOM),
+                'max_modules': int(values['modules'] * MODULE_HEADROOM) + 1
+            }
+            for key, values in measured.items()
+        }
+        with open(BUDGET_PATH, 'w', encoding='utf-8') as f:
+            json.dump(new_budget, f, indent=2)
+            f.write('\n')
+        print(f'Budget written to {BUDGET_PATH}')
+        return 0
+
+    if failures:
+        print(f'{len(failures)} command(s) over startup budget: {", ".join(failures)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(update='--update' in sys.argv[1:]))
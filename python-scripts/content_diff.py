@@ -0,0 +1,162 @@
+"""
+Content Diff
+Works out what changed between two versions of a document's extracted
+text, and on which pages, so an edit only touches the pages it changed.
+
+The content is what the editor shows: the OCR output as a JSON list of
+{"page", "text"}, the boxed 'txt' format with a page header before each
+page, or plain text. For the first two the pages are diffed one by one
+and every change is tied to its page; plain text has no page boundaries,
+so its changes are not tied to any page.
+
+Lines are aligned with difflib, so inserted and removed lines do not
+shift the lines after them. Within a changed run of lines the words are
+diffed again, and each changed run of words becomes one replacement:
+    changed words  -> {"old_text": old words, "new_text": new words}
+    removed words  -> {"old_text": old words, "new_text": ""}
+    added words    -> joined to the word before them (or after them at
+                      the start of a run), which is replaced by both
+A replacement whose old words occur more than once on the page takes in
+unchanged neighbouring words until it is unique there.
+
+Whole lines added with no old line to attach to have no position in the
+PDF and are counted as unplaced.
+"""
+import re
+import json
+import difflib
+
+PAGE_HEADER = re.compile(r'^\s*║\s*(\d+)\s*║\s*$')
+BOX_LINE = re.compile(r'^\s*[╔╚]═+[╗╝]\s*$')
+
+
+def split_pages(content):
+    """{page number: text} from JSON or boxed txt OCR output, or None for plain text"""
+    stripped = content.strip()
+    if stripped.startswith('['):
+        try:
+            entries = json.loads(stripped)
+        except ValueError:
+            entries = None
+        if isinstance(entries, list) and all(isinstance(entry, dict) and 'page' in entry for entry in entries):
+            return {int(entry['page']): entry.get('text') or '' for entry in entries}
+
+    pages = {}
+    page_number = None
+    for line in content.split('\n'):
+        header = PAGE_HEADER.match(line)
+        if header:
+            page_number = int(header.group(1))
+            pages[page_number] = []
+        elif page_number is not None and not BOX_LINE.match(line):
+            pages[page_number].append(line)
+    if not pages:
+        return None
+    return {number: '\n'.join(lines).strip('\n') for number, lines in pages.items()}
+
+
+def _word_changes(old_words, new_words, occurrences):
+    replacements = []
+    opcodes = difflib.SequenceMatcher(None, old_words, new_words, autojunk=False).get_opcodes()
+    for position, (tag, old_start, old_end, new_start, new_end) in enumerate(opcodes):
+        if tag == 'equal':
+            continue
+        # Changes are separated by equal runs, whose words may be borrowed
+        left = opcodes[position - 1][2] - opcodes[position - 1][1] if position > 0 else 0
+        right = opcodes[position + 1][2] - opcodes[position + 1][1] if position + 1 < len(opcodes) else 0
+
+        if tag == 'insert':
+            # Nothing to redact; rewrite a neighbouring word together with
+            # the added ones
+            if left:
+                old_start, new_start, left = old_start - 1, new_start - 1, left - 1
+            elif right:
+                old_end, new_end, right = old_end + 1, new_end + 1, right - 1
+            else:
+                continue
+
+        # Widen with unchanged neighbours until the old words are unique,
+        # so other occurrences on the page are left alone
+        while occurrences(old_words[old_start:old_end]) > 1 and (left or right):
+            if left:
+                old_start, new_start, left = old_start - 1, new_start - 1, left - 1
+            if right and occurrences(old_words[old_start:old_end]) > 1:
+                old_end, new_end, right = old_end + 1, new_end + 1, right - 1
+
+        replacements.append({
+            'old_text': ' '.join(old_words[old_start:old_end]),
+            'new_text': ' '.join(new_words[new_start:new_end])
+        })
+    return replacements
+
+
+def diff_text(old_text, new_text):
+    """
+    (replacements, unplaced) turning old_text into new_text, where
+    unplaced counts added lines that have no old text to attach to.
+    """
+    old_lines = [line.strip() for line in old_text.split('\n')]
+    new_lines = [line.strip() for line in new_text.split('\n')]
+    replacements = []
+    unplaced = 0
+    page_words = f' {" ".join(old_text.split())} '
+
+    def occurrences(words):
+        return page_words.count(f' {" ".join(words)} ')
+
+    # Edits are usually local; leaving the unchanged head and tail out
+    # keeps the diff fast on long texts
+    head = 0
+    while head < min(len(old_lines), len(new_lines)) and old_lines[head] == new_lines[head]:
+        head += 1
+    tail = 0
+    while (tail < min(len(old_lines), len(new_lines)) - head
+           and old_lines[-1 - tail] == new_lines[-1 - tail]):
+        tail += 1
+    old_lines = old_lines[head:len(old_lines) - tail]
+    new_lines = new_lines[head:len(new_lines) - tail]
+
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        if tag == 'insert':
+            unplaced += sum(1 for line in new_lines[new_start:new_end] if line)
+            continue
+        old_words = ' '.join(old_lines[old_start:old_end]).split()
+        new_words = ' '.join(new_lines[new_start:new_end]).split()
+        if old_words:
+            replacements.extend(_word_changes(old_words, new_words, occurrences))
+        else:
+            unplaced += sum(1 for line in new_lines[new_start:new_end] if line)
+
+    # The same change made in several places is one replacement
+    unique = {}
+    for replacement in replacements:
+        unique.setdefault(replacement['old_text'], replacement)
+    return list(unique.values()), unplaced
+
+
+def diff_content(old_content, new_content):
+    """
+    ({page number or None: replacements}, unplaced) for an edit of the
+    editor content; None holds changes that could not be tied to a page.
+    """
+    old_pages = split_pages(old_content)
+    new_pages = split_pages(new_content) if old_pages is not None else None
+
+    if old_pages is None or new_pages is None:
+        replacements, unplaced = diff_text(old_content, new_content)
+        return ({None: replacements} if replacements else {}), unplaced
+
+    changes = {}
+    unplaced = 0
+    for page_number, old_text in old_pages.items():
+        new_text = new_pages.get(page_number)
+        if new_text is None or new_text == old_text:
+            continue
+        replacements, page_unplaced = diff_text(old_text, new_text)
+        unplaced += page_unplaced
+        if replacements:
+            changes[page_number] = replacements
+    return changes, unplaced
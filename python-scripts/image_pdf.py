@@ -0,0 +1,354 @@
+"""
+Image to PDF Writer
+Builds a PDF from image files one at a time, writing each page to disk
+before the next image is opened, so memory does not grow with the number
+of inputs.
+
+Compressed data is embedded as it is wherever PDF can carry it:
+    JPEG  - copied byte for byte as a DCTDecode stream
+    PNG   - IDAT data copied as a FlateDecode stream with the PNG predictor
+            (gray, RGB and palette images without transparency or interlace)
+Anything else is decoded and stored losslessly with Flate, alpha as a soft
+mask. JBIG2 input is not supported since Pillow cannot read it.
+
+EXIF orientation is applied through the image placement matrix, leaving
+the image data untouched.
+"""
+import os
+import zlib
+import struct
+import hashlib
+
+CHUNK_SIZE = 1024 * 1024
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+EXIF_ORIENTATION = 0x0112
+
+# Resolution assumed for images without usable DPI metadata
+DEFAULT_DPI = 72
+
+# Named page sizes in points (portrait); pages follow the image's orientation
+PAGE_SIZES = {
+    'a4': (595.28, 841.89),
+    'a3': (841.89, 1190.55),
+    'letter': (612, 792),
+    'legal': (612, 1008),
+}
+
+JPEG_COLOR_SPACES = {'L': ('/DeviceGray', 1), 'RGB': ('/DeviceRGB', 3), 'CMYK': ('/DeviceCMYK', 4)}
+
+# EXIF orientation -> (a, b, c, d, e, f) taking the stored image's unit
+# square to the displayed one
+ORIENTATION_MATRICES = {
+    1: (1, 0, 0, 1, 0, 0),
+    2: (-1, 0, 0, 1, 1, 0),
+    3: (-1, 0, 0, -1, 1, 1),
+    4: (1, 0, 0, -1, 0, 1),
+    5: (0, -1, -1, 0, 1, 1),
+    6: (0, -1, 1, 0, 0, 1),
+    7: (0, 1, 1, 0, 0, 0),
+    8: (0, 1, -1, 0, 1, 0),
+}
+
+
+def _number(value):
+    return f'{value:.4f}'.rstrip('0').rstrip('.')
+
+
+def _image_dpi(image):
+    dpi = image.info.get('dpi')
+    if not dpi:
+        return DEFAULT_DPI
+    # JFIF headers without units report an aspect ratio such as (1, 1)
+    dpi = float(dpi[0])
+    return dpi if dpi >= 10 else DEFAULT_DPI
+
+
+def _file_chunks(path, start=0, length=None):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def _png_layout(path):
+    """
+    Return the IHDR fields, palette and IDAT chunk spans of a PNG whose data
+    PDF can use directly, or None when it has to be decoded instead.
+    """
+    with open(path, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            return None
+
+        header = palette = None
+        spans = []
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                return None
+            length, kind = struct.unpack('>I4s', chunk_header)
+
+            if kind == b'IHDR':
+                header = struct.unpack('>IIBBBBB', f.read(length))
+                f.seek(4, os.SEEK_CUR)
+            elif kind == b'PLTE':
+                palette = f.read(length)
+                f.seek(4, os.SEEK_CUR)
+            elif kind == b'tRNS':
+                # Transparency needs a soft mask, which means decoding
+                return None
+            elif kind == b'IDAT':
+                spans.append((f.tell(), length))
+                f.seek(length + 4, os.SEEK_CUR)
+            elif kind == b'IEND':
+                break
+            else:
+                f.seek(length + 4, os.SEEK_CUR)
+
+    if header is None or not spans:
+        return None
+    width, height, bit_depth, color_type, _, _, interlace = header
+    if interlace or color_type not in (0, 2, 3) or (color_type == 3 and palette is None):
+        return None
+
+    return {
+        'width': width,
+        'height': height,
+        'bit_depth': bit_depth,
+        'color_type': color_type,
+        'palette': palette,
+        'spans': spans,
+    }
+
+
+class ImagePdfWriter:
+    """
+    Writes a PDF with one image per page. Objects 1 and 2 (catalog and page
+    tree) are written last, once the page count is known.
+    """
+
+    def __init__(self, output_path, page_size='image', margin=0):
+        if isinstance(page_size, str) and page_size != 'image' and page_size not in PAGE_SIZES:
+            raise ValueError(f'Unknown page size: {page_size}')
+
+        self.page_size = page_size
+        self.margin = margin
+        self.offsets = {}
+        self.next_id = 3
+        self.pages = []
+        self.icc_profiles = {}
+        self.file = open(output_path, 'wb')
+        self.file.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+
+    def _reserve(self):
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def _begin(self, obj_id):
+        self.offsets[obj_id] = self.file.tell()
+        self.file.write(f'{obj_id} 0 obj\n'.encode('ascii'))
+
+    def _write_object(self, obj_id, body):
+        self._begin(obj_id)
+        self.file.write(body.encode('latin-1'))
+        self.file.write(b'\nendobj\n')
+
+    def _write_stream(self, obj_id, dictionary, length, chunks):
+        self._begin(obj_id)
+        self.file.write(f'<< {dictionary} /Length {length} >>\nstream\n'.encode('latin-1'))
+        written = 0
+        for chunk in chunks:
+            self.file.write(chunk)
+            written += len(chunk)
+        if written != length:
+            raise ValueError(f'Stream length changed while writing object {obj_id}')
+        self.file.write(b'\nendstream\nendobj\n')
+
+    def _color_space(self, device, components, icc_profile):
+        """Embedded ICC profiles are written once and shared between pages"""
+        if not icc_profile:
+            return device
+
+        digest = hashlib.sha1(icc_profile).hexdigest()
+        obj_id = self.icc_profiles.get(digest)
+        if obj_id is None:
+            obj_id = self.icc_profiles[digest] = self._reserve()
+            self._write_stream(
+                obj_id, f'/N {components} /Alternate {device}', len(icc_profile), [icc_profile]
+            )
+        return f'[/ICCBased {obj_id} 0 R]'
+
+    def _embed_jpeg(self, path, image):
+        device, components = JPEG_COLOR_SPACES[image.mode]
+        color_space = self._color_space(device, components, image.info.get('icc_profile'))
+        dictionary = (
+            f'/Type /XObject /Subtype /Image /Width {image.width} /Height {image.height} '
+            f'/ColorSpace {color_space} /BitsPerComponent 8 /Filter /DCTDecode'
+        )
+        # Adobe CMYK JPEGs store inverted ink values
+        if image.mode == 'CMYK' and 'adobe' in image.info:
+            dictionary += ' /Decode [1 0 1 0 1 0 1 0]'
+
+        obj_id = self._reserve()
+        self._write_stream(obj_id, dictionary, os.path.getsize(path), _file_chunks(path))
+        return obj_id
+
+    def _embed_png(self, path, layout, icc_profile):
+        colors = {0: 1, 2: 3, 3: 1}[layout['color_type']]
+        if layout['color_type'] == 3:
+            palette = layout['palette']
+            color_space = f'[/Indexed /DeviceRGB {len(palette) // 3 - 1} <{palette.hex()}>]'
+        else:
+            device = '/DeviceGray' if colors == 1 else '/DeviceRGB'
+            color_space = self._color_space(device, colors, icc_profile)
+
+        dictionary = (
+            f'/Type /XObject /Subtype /Image /Width {layout["width"]} /Height {layout["height"]} '
+            f'/ColorSpace {color_space} /BitsPerComponent {layout["bit_depth"]} /Filter /FlateDecode '
+            f'/DecodeParms << /Predictor 15 /Colors {colors} '
+            f'/BitsPerComponent {layout["bit_depth"]} /Columns {layout["width"]} >>'
+        )
+        chunks = (
+            chunk for start, length in layout['spans'] for chunk in _file_chunks(path, start, length)
+        )
+
+        obj_id = self._reserve()
+        self._write_stream(obj_id, dictionary, sum(length for _, length in layout['spans']), chunks)
+        return obj_id
+
+    def _embed_decoded(self, image):
+        if image.mode == 'P' and 'transparency' in image.info:
+            image = image.convert('RGBA')
+        elif image.mode == 'PA':
+            image = image.convert('RGBA')
+
+        alpha = None
+        if image.mode in ('RGBA', 'LA'):
+            alpha = image.getchannel('A')
+            image = image.convert('RGB' if image.mode == 'RGBA' else 'L')
+
+        if image.mode == '1':
+            device, bits = '/DeviceGray', 1
+        elif image.mode == 'L':
+            device, bits = '/DeviceGray', 8
+        elif image.mode == 'CMYK':
+            device, bits = '/DeviceCMYK', 8
+        else:
+            if image.mode != 'RGB':
+                image = image.convert('L' if image.mode in ('I', 'I;16', 'F') else 'RGB')
+            device, bits = ('/DeviceGray', 8) if image.mode == 'L' else ('/DeviceRGB', 8)
+
+        components = {'/DeviceGray': 1, '/DeviceRGB': 3, '/DeviceCMYK': 4}[device]
+        color_space = self._color_space(device, components, image.info.get('icc_profile'))
+        dictionary = (
+            f'/Type /XObject /Subtype /Image /Width {image.width} /Height {image.height} '
+            f'/ColorSpace {color_space} /BitsPerComponent {bits} /Filter /FlateDecode'
+        )
+
+        if alpha is not None:
+            mask_id = self._reserve()
+            data = zlib.compress(alpha.tobytes())
+            alpha = None
+            self._write_stream(
+                mask_id,
+                f'/Type /XObject /Subtype /Image /Width {image.width} /Height {image.height} '
+                f'/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode',
+                len(data), [data]
+            )
+            dictionary += f' /SMask {mask_id} 0 R'
+
+        obj_id = self._reserve()
+        data = zlib.compress(image.tobytes())
+        self._write_stream(obj_id, dictionary, len(data), [data])
+        return obj_id
+
+    def _page_box(self, width, height):
+        """Return (page width, page height, image box width, image box height) in points"""
+        if self.page_size == 'image':
+            return width + 2 * self.margin, height + 2 * self.margin, width, height
+
+        if isinstance(self.page_size, str):
+            page_width, page_height = PAGE_SIZES[self.page_size]
+            if width > height:
+                page_width, page_height = page_height, page_width
+        else:
+            page_width, page_height = self.page_size
+
+        scale = min(
+            (page_width - 2 * self.margin) / width,
+            (page_height - 2 * self.margin) / height
+        )
+        return page_width, page_height, width * scale, height * scale
+
+    def add_image(self, path):
+        """Append one page showing the image at path"""
+        from PIL import Image
+
+        with Image.open(path) as image:
+            orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+            if orientation not in ORIENTATION_MATRICES:
+                orientation = 1
+            dpi = _image_dpi(image)
+            width, height = image.size
+
+            layout = _png_layout(path) if image.format == 'PNG' else None
+            if image.format == 'JPEG' and image.mode in JPEG_COLOR_SPACES:
+                image_id = self._embed_jpeg(path, image)
+            elif layout is not None:
+                image_id = self._embed_png(path, layout, image.info.get('icc_profile'))
+            else:
+                image.seek(0)
+                image_id = self._embed_decoded(image)
+
+        if orientation >= 5:
+            width, height = height, width
+        page_width, page_height, box_width, box_height = self._page_box(
+            width * 72 / dpi, height * 72 / dpi
+        )
+        x = (page_width - box_width) / 2
+        y = (page_height - box_height) / 2
+
+        a, b, c, d, e, f = ORIENTATION_MATRICES[orientation]
+        matrix = ' '.join(_number(v) for v in (
+            a * box_width, b * box_height, c * box_width, d * box_height,
+            e * box_width + x, f * box_height + y
+        ))
+        content = f'q {matrix} cm /Im0 Do Q'.encode('ascii')
+
+        content_id = self._reserve()
+        self._write_stream(content_id, '', len(content), [content])
+
+        page_id = self._reserve()
+        self._write_object(
+            page_id,
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_number(page_width)} {_number(page_height)}] '
+            f'/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>'
+        )
+        self.pages.append(page_id)
+
+    def close(self):
+        """Write the page tree, catalog and cross-reference table"""
+        # A PDF needs at least one page to be opened
+        if not self.pages:
+            raise ValueError('No images to write')
+        kids = ' '.join(f'{page_id} 0 R' for page_id in self.pages)
+        self._write_object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>')
+        self._write_object(1, '<< /Type /Catalog /Pages 2 0 R >>')
+
+        xref_offset = self.file.tell()
+        self.file.write(f'xref\n0 {self.next_id}\n0000000000 65535 f \n'.encode('ascii'))
+        for obj_id in range(1, self.next_id):
+            self.file.write(f'{self.offsets[obj_id]:010d} 00000 n \n'.encode('ascii'))
+        self.file.write(
+            f'trailer\n<< /Size {self.next_id} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode('ascii')
+        )
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
@@ -0,0 +1,205 @@
+"""
+Layout Index
+Persistent index of page text with positions, so the editor can work on
+any part of a document without dumping all of its text first, and edit
+commands do not parse the same pages again on every run.
+
+A page layout is its text blocks, lines and spans with bounding boxes,
+baseline origins, fonts, sizes, colors and flags, as fitz reports them in
+"dict" mode. Layouts are stored zlib-compressed JSON per (file identity,
+page) in an SQLite file under the shared cache root, with coordinates
+rounded to 0.01pt. Since the key is the file's identity, a rewritten file
+never hits layouts of its earlier contents; those age out of the
+size-bounded cache.
+
+    layout = layout_index.page_layout(doc, pdf_path, page_number)
+    texts = layout_index.cached_texts(pdf_path)  # never extracts
+"""
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+
+import render_cache
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+# Bump when the stored layout changes shape
+FORMAT_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS layouts (
+    file_identity TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    layout BLOB NOT NULL,
+    text TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (file_identity, page)
+);
+CREATE INDEX IF NOT EXISTS layouts_last_used ON layouts (last_used);
+"""
+
+
+def _rounded(values):
+    return [round(value, 2) for value in values]
+
+
+def extract(page):
+    """Layout of a fitz page: size, rotation and its text blocks"""
+    import text_search
+
+    blocks = []
+    # Same flags as text_search, so an indexed page's text can stand in
+    # for its text page when searching
+    for block in page.get_text('dict', flags=text_search.textpage_flags())['blocks']:
+        lines = []
+        for line in block.get('lines', ()):
+            spans = [
+                {
+                    'text': span['text'],
+                    'bbox': _rounded(span['bbox']),
+                    'origin': _rounded(span['origin']),
+                    'font': span['font'],
+                    'size': round(span['size'], 2),
+                    'color': span['color'],
+                    'flags': span['flags'],
+                }
+                for span in line['spans']
+            ]
+            lines.append({'bbox': _rounded(line['bbox']), 'dir': _rounded(line['dir']), 'spans': spans})
+        if lines:
+            blocks.append({'bbox': _rounded(block['bbox']), 'lines': lines})
+
+    return {
+        'width': round(page.rect.width, 2),
+        'height': round(page.rect.height, 2),
+        'rotation': page.rotation,
+        'blocks': blocks,
+    }
+
+
+def layout_text(layout):
+    """Plain text of a layout, one line per text line"""
+    return '\n'.join(
+        ''.join(span['text'] for span in line['spans'])
+        for block in layout['blocks']
+        for line in block['lines']
+    )
+
+
+class LayoutIndex:
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or os.path.join(render_cache.cache_root(), 'layout.sqlite3')
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+
+    def get(self, file_identity, page):
+        """Stored layout of a page, or None"""
+        with self.lock, self.db:
+            row = self.db.execute(
+                'SELECT layout FROM layouts WHERE file_identity = ? AND page = ? AND version = ?',
+                (file_identity, page, FORMAT_VERSION)
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute(
+                'UPDATE layouts SET last_used = ? WHERE file_identity = ? AND page = ?',
+                (time.time(), file_identity, page)
+            )
+        return json.loads(zlib.decompress(row[0]))
+
+    def texts(self, file_identity):
+        """{page: plain text} of every stored page of a file"""
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT page, text FROM layouts WHERE file_identity = ? AND version = ?',
+                (file_identity, FORMAT_VERSION)
+            ).fetchall()
+        return dict(rows)
+
+    def put(self, file_identity, page, layout):
+        data = zlib.compress(json.dumps(layout, separators=(',', ':')).encode('utf-8'))
+        text = layout_text(layout)
+        size = len(data) + len(text.encode('utf-8'))
+
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO layouts (file_identity, page, version, layout, text, size, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (file_identity, page, FORMAT_VERSION, data, text, size, time.time())
+            )
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used pages until the index fits again"""
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM layouts').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        target = self.max_bytes * 0.9
+        rows = self.db.execute('SELECT file_identity, page, size FROM layouts ORDER BY last_used').fetchall()
+        evicted = []
+        for file_identity, page, size in rows:
+            if total <= target:
+                break
+            evicted.append((file_identity, page))
+            total -= size
+
+        self.db.executemany('DELETE FROM layouts WHERE file_identity = ? AND page = ?', evicted)
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM layouts')
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def enabled():
+    return os.environ.get('PDF_TOOLS_LAYOUT_CACHE', '1') != '0'
+
+
+def get_index():
+    """Process-wide index instance"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LayoutIndex()
+        return _index
+
+
+def page_layout(doc, pdf_path, page_number, file_identity=None):
+    """
+    Layout of a 1-based page of doc, an open fitz document of pdf_path,
+    from the index when it is there and extracted and stored otherwise.
+    Returns (layout, cached). The caller holds render.FITZ_LOCK.
+    """
+    if not enabled():
+        return extract(doc[page_number - 1]), False
+
+    file_identity = file_identity or render_cache.file_identity(pdf_path)
+    index = get_index()
+    layout = index.get(file_identity, page_number)
+    if layout is not None:
+        return layout, True
+
+    layout = extract(doc[page_number - 1])
+    index.put(file_identity, page_number, layout)
+    return layout, False
+
+
+def cached_texts(pdf_path):
+    """{page: plain text} for the pages of pdf_path already indexed; never extracts"""
+    if not enabled():
+        return {}
+    return get_index().texts(render_cache.file_identity(pdf_path))
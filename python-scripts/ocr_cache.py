@@ -0,0 +1,211 @@
+"""
+OCR Cache
+Persistent, size-bounded cache of tesseract output.
+
+Entries are keyed by a hash of the rendered page pixels plus the language
+string, DPI, tesseract config and the kind of output stored (plain text,
+word boxes, ...), so recognition never runs twice for the same input.
+A second table remembers which image a (file identity, page, DPI) rendered
+to, letting repeat runs skip rendering as well; these references go when
+the last entry for their image is evicted.
+
+The cache lives in an SQLite file under the shared cache root and is safe
+to use from several pool workers at once.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+import render_cache
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    image_key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE INDEX IF NOT EXISTS entries_image_key ON entries (image_key);
+CREATE TABLE IF NOT EXISTS page_refs (
+    file_identity TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    dpi INTEGER NOT NULL,
+    image_key TEXT NOT NULL,
+    PRIMARY KEY (file_identity, page, dpi)
+);
+CREATE INDEX IF NOT EXISTS page_refs_image_key ON page_refs (image_key);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def image_key(image):
+    """Content hash of a PIL image's pixels"""
+    digest = hashlib.sha256()
+    digest.update(f'{image.mode}:{image.size[0]}x{image.size[1]}:'.encode('ascii'))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def _entry_key(image_key, languages, dpi, config, kind):
+    return hashlib.sha256(f'{image_key}|{languages}|{dpi}|{config}|{kind}'.encode('utf-8')).hexdigest()
+
+
+class OcrCache:
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or os.path.join(render_cache.cache_root(), 'ocr.sqlite3')
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(entries)')]
+        if columns and 'image_key' not in columns:
+            # Entries from before image keys were stored cannot be tied to
+            # their page references, so that cache is started over
+            self.db.executescript('DROP TABLE entries; DROP TABLE page_refs; DROP TABLE IF EXISTS stats;')
+        self.db.executescript(SCHEMA)
+        with self.db:
+            # Running total of entry sizes, kept so put() need not sum them
+            self.db.execute(
+                "INSERT OR IGNORE INTO stats (name, value) SELECT 'bytes', COALESCE(SUM(size), 0) FROM entries"
+            )
+
+    def _count(self, name, amount=1):
+        self.db.execute(
+            'INSERT INTO stats (name, value) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+            (name, amount)
+        )
+
+    def _hit(self, key):
+        row = self.db.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self._count('misses')
+            return None
+
+        self.db.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+        self._count('hits')
+        return row[0]
+
+    def get(self, image_key, languages, dpi, config, kind='text'):
+        """Return the cached output for a rendered image, or None"""
+        with self.lock, self.db:
+            return self._hit(_entry_key(image_key, languages, dpi, config, kind))
+
+    def lookup_page(self, file_identity, page, dpi, languages, config, kind='text'):
+        """
+        Return cached output for a page of a file without rendering it, or
+        None when the page has not been recognized with these settings.
+        Misses here are not counted; the render-and-get path counts them.
+        """
+        with self.lock, self.db:
+            row = self.db.execute(
+                'SELECT image_key FROM page_refs WHERE file_identity = ? AND page = ? AND dpi = ?',
+                (file_identity, page, dpi)
+            ).fetchone()
+            if row is None:
+                return None
+
+            key = _entry_key(row[0], languages, dpi, config, kind)
+            if self.db.execute('SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone() is None:
+                return None
+            return self._hit(key)
+
+    def put(self, image_key, languages, dpi, config, value, kind='text'):
+        key = _entry_key(image_key, languages, dpi, config, kind)
+        size = len(value.encode('utf-8'))
+
+        with self.lock, self.db:
+            replaced = self.db.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            self.db.execute(
+                'INSERT OR REPLACE INTO entries (key, image_key, value, size, last_used) VALUES (?, ?, ?, ?, ?)',
+                (key, image_key, value, size, time.time())
+            )
+            self._count('bytes', size - (replaced[0] if replaced else 0))
+            self._evict()
+
+    def remember_page(self, file_identity, page, dpi, image_key):
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO page_refs (file_identity, page, dpi, image_key) VALUES (?, ?, ?, ?)',
+                (file_identity, page, dpi, image_key)
+            )
+
+    def _evict(self):
+        """
+        Drop least recently used entries until the cache fits again, and the
+        page references of images left without any entry
+        """
+        total = self.db.execute("SELECT value FROM stats WHERE name = 'bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        target = self.max_bytes * 0.9
+        evicted = []
+        images = set()
+        for key, image_key, size in self.db.execute('SELECT key, image_key, size FROM entries ORDER BY last_used'):
+            if total <= target:
+                break
+            evicted.append((key,))
+            images.add(image_key)
+            total -= size
+
+        self.db.executemany('DELETE FROM entries WHERE key = ?', evicted)
+        self.db.executemany(
+            'DELETE FROM page_refs WHERE image_key = ? '
+            'AND NOT EXISTS (SELECT 1 FROM entries WHERE entries.image_key = page_refs.image_key)',
+            [(image_key,) for image_key in images]
+        )
+        self.db.execute("UPDATE stats SET value = ? WHERE name = 'bytes'", (total,))
+        self._count('evictions', len(evicted))
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.db.execute('SELECT name, value FROM stats').fetchall())
+            entries = self.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+        hits = counters.get('hits', 0)
+        misses = counters.get('misses', 0)
+        return {
+            'entries': entries,
+            'bytes': counters.get('bytes', 0),
+            'max_bytes': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+            'evictions': counters.get('evictions', 0),
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM entries')
+            self.db.execute('DELETE FROM page_refs')
+            self.db.execute('DELETE FROM stats')
+            self._count('bytes', 0)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def enabled():
+    return os.environ.get('PDF_TOOLS_OCR_CACHE', '1') != '0'
+
+
+def get_cache():
+    """Process-wide cache instance; each pool worker opens its own"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OcrCache()
+        return _cache
@@ -0,0 +1,226 @@
+"""
+OCR Engines
+Text recognition behind a common interface, so pages are never written to
+temporary files on their way to tesseract.
+
+Two engines are available:
+    tesserocr  - binds libtesseract in-process; language models stay
+                 loaded between pages (default when installed)
+    cli        - runs the tesseract binary per image, piping the image
+                 through stdin and reading the text from stdout (fallback)
+
+tesserocr is in requirements.txt and installed for the bundle build; OCR
+results report the engine that ran, so a fallback to the CLI shows up.
+The engine can be forced with the PDF_TOOLS_OCR_ENGINE environment
+variable. Both take the same config string as the tesseract CLI, e.g.
+"--oem 3 --psm 6".
+
+Engines return either plain text (recognize) or word boxes (words), each
+word as {'text', 'left', 'top', 'width', 'height', 'conf', 'line'} in
+image pixels, where 'line' identifies the text line the word belongs to.
+"""
+import io
+import os
+import sys
+import shlex
+import threading
+import subprocess
+
+DEFAULT_ENGINE = 'tesserocr'
+TESSERACT_CMD = 'tesseract'
+
+
+def parse_config(config):
+    """Split a tesseract CLI config string into (oem, psm, variables)"""
+    oem = psm = None
+    variables = {}
+
+    tokens = shlex.split(config or '')
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token in ('--oem', '--psm', '-c') and index + 1 < len(tokens):
+            value = tokens[index + 1]
+            if token == '--oem':
+                oem = int(value)
+            elif token == '--psm':
+                psm = int(value)
+            else:
+                name, _, setting = value.partition('=')
+                variables[name] = setting
+            index += 2
+        else:
+            raise ValueError(f'Unsupported tesseract option: {token}')
+    return oem, psm, variables
+
+
+def _encodable(image):
+    # PNM only carries bilevel, gray and RGB pixels
+    return image if image.mode in ('1', 'L', 'RGB') else image.convert('RGB')
+
+
+class TesserocrEngine:
+    name = 'tesserocr'
+
+    def __init__(self):
+        import tesserocr
+        self.tesserocr = tesserocr
+        self.apis = {}
+        # A TessBaseAPI handles one image at a time
+        self.lock = threading.Lock()
+
+    def _api(self, languages, config):
+        key = (languages, config)
+        api = self.apis.get(key)
+        if api is None:
+            oem, psm, variables = parse_config(config)
+            options = {'lang': languages, 'variables': variables}
+            if os.environ.get('TESSDATA_PREFIX'):
+                options['path'] = os.environ['TESSDATA_PREFIX']
+            # tesserocr's OEM and PSM constants are the CLI's integers
+            if oem is not None:
+                options['oem'] = oem
+            if psm is not None:
+                options['psm'] = psm
+            api = self.apis[key] = self.tesserocr.PyTessBaseAPI(**options)
+        return api
+
+    def recognize(self, image, languages, config='', dpi=None):
+        with self.lock:
+            api = self._api(languages, config)
+            api.SetImage(image)
+            if dpi:
+                api.SetSourceResolution(int(dpi))
+            try:
+                return api.GetUTF8Text()
+            finally:
+                api.Clear()
+
+    def words(self, image, languages, config='', dpi=None):
+        RIL = self.tesserocr.RIL
+
+        with self.lock:
+            api = self._api(languages, config)
+            api.SetImage(image)
+            if dpi:
+                api.SetSourceResolution(int(dpi))
+            try:
+                api.Recognize()
+                words = []
+                block = line = 0
+                for item in self.tesserocr.iterate_level(api.GetIterator(), RIL.WORD):
+                    if item.IsAtBeginningOf(RIL.BLOCK):
+                        block += 1
+                    if item.IsAtBeginningOf(RIL.TEXTLINE):
+                        line += 1
+
+                    text = item.GetUTF8Text(RIL.WORD)
+                    box = item.BoundingBox(RIL.WORD)
+                    if not text or not text.strip() or box is None:
+                        continue
+                    x0, y0, x1, y1 = box
+                    words.append({
+                        'text': text.strip(),
+                        'left': x0, 'top': y0, 'width': x1 - x0, 'height': y1 - y0,
+                        'conf': round(item.Confidence(RIL.WORD), 2),
+                        'line': [block, 0, line]
+                    })
+                return words
+            finally:
+                api.Clear()
+
+    def close(self):
+        with self.lock:
+            for api in self.apis.values():
+                api.End()
+            self.apis.clear()
+
+
+class CliEngine:
+    name = 'cli'
+
+    def __init__(self):
+        self.command = os.environ.get('TESSERACT_CMD') or TESSERACT_CMD
+
+    def _run(self, image, languages, config, dpi, configfiles=()):
+        buffer = io.BytesIO()
+        _encodable(image).save(buffer, format='PPM')
+
+        argv = [self.command, 'stdin', 'stdout', '-l', languages, *shlex.split(config or '')]
+        if dpi:
+            argv += ['--dpi', str(int(dpi))]
+        argv += configfiles
+
+        options = {}
+        if sys.platform == 'win32':
+            options['creationflags'] = 0x08000000  # CREATE_NO_WINDOW
+
+        try:
+            result = subprocess.run(argv, input=buffer.getvalue(), capture_output=True, **options)
+        except FileNotFoundError:
+            raise RuntimeError('Tesseract is not installed or not on PATH')
+
+        if result.returncode != 0:
+            message = result.stderr.decode('utf-8', 'replace').strip()
+            raise RuntimeError(f'Tesseract failed: {message}')
+        return result.stdout.decode('utf-8')
+
+    def recognize(self, image, languages, config='', dpi=None):
+        return self._run(image, languages, config, dpi)
+
+    def words(self, image, languages, config='', dpi=None):
+        # TSV columns: level page block par line word left top width height conf text
+        words = []
+        for row in self._run(image, languages, config, dpi, ['tsv']).splitlines()[1:]:
+            fields = row.split('\t')
+            if len(fields) < 12 or fields[0] != '5' or not fields[11].strip():
+                continue
+            words.append({
+                'text': fields[11].strip(),
+                'left': int(fields[6]), 'top': int(fields[7]),
+                'width': int(fields[8]), 'height': int(fields[9]),
+                'conf': float(fields[10]),
+                'line': [int(fields[2]), int(fields[3]), int(fields[4])]
+            })
+        return words
+
+    def close(self):
+        pass
+
+
+ENGINES = {
+    'tesserocr': TesserocrEngine,
+    'cli': CliEngine,
+}
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def engine_name(name=None):
+    """Name of the engine get_engine(name) returns, without starting it"""
+    name = name or os.environ.get('PDF_TOOLS_OCR_ENGINE') or DEFAULT_ENGINE
+    if name == 'tesserocr':
+        import importlib.util
+        if importlib.util.find_spec('tesserocr') is None:
+            return 'cli'
+    return name
+
+
+def get_engine(name=None):
+    """Return an engine instance, falling back to the CLI if tesserocr is missing"""
+    name = name or os.environ.get('PDF_TOOLS_OCR_ENGINE') or DEFAULT_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f'Unknown OCR engine: {name}')
+
+    with _engines_lock:
+        if name not in _engines:
+            try:
+                _engines[name] = ENGINES[name]()
+            except ImportError:
+                if name == 'cli':
+                    raise
+                _engines[name] = None
+        engine = _engines[name]
+
+    return engine if engine is not None else get_engine('cli')
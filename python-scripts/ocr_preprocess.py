@@ -0,0 +1,271 @@
+"""
+OCR Preprocessing
+Cleans up rendered pages before they reach tesseract.
+
+Stages run in order: grayscale, text-height measurement (choosing the DPI
+to recognize at), border removal, deskew, crop to content and adaptive
+binarization. Every stage is a whole-array NumPy/OpenCV operation; nothing
+loops over pixels in Python.
+"""
+import time
+
+import cv2
+import numpy as np
+
+# Part of the OCR cache key; bump whenever the output of prepare() changes
+CACHE_TAG = 'preprocess-v1'
+
+# Median glyph height, in pixels, that tesseract recognizes best
+TARGET_GLYPH_HEIGHT = 24
+MIN_DPI = 100
+MAX_DPI = 400
+# Ignore DPI changes smaller than this fraction of the current DPI
+MIN_DPI_CHANGE = 0.15
+
+MIN_GLYPHS = 10
+MIN_SKEW = 0.1
+MAX_SKEW = 10.0
+
+# Rows or columns at the page edge inked at least this much are scan borders
+BORDER_INK_RATIO = 0.8
+CROP_PADDING = 10
+# Ink components smaller than this many pixels are noise
+MIN_SPECK_AREA = 4
+
+BINARIZE_BLOCK = 31
+BINARIZE_OFFSET = 15
+
+
+class StageTimer:
+    """Collects the wall time of consecutive stages in milliseconds"""
+
+    def __init__(self):
+        self.timings = {}
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = round((now - self.last) * 1000, 2)
+        self.last = now
+
+
+def to_gray(image):
+    """Convert a PIL image to a single-channel uint8 array"""
+    array = np.asarray(image)
+    if array.ndim == 2:
+        return array if array.dtype == np.uint8 else array.astype(np.uint8)
+
+    code = cv2.COLOR_RGBA2GRAY if array.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+    return cv2.cvtColor(array, code)
+
+
+def ink_mask(gray):
+    """Otsu-thresholded mask with ink as 255 and paper as 0"""
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    return mask
+
+
+def glyph_height(mask):
+    """Median height of glyph-sized connected components, or None"""
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+
+    # Drop specks, rules, and pictures
+    glyphs = heights[
+        (heights >= 3)
+        & (heights <= mask.shape[0] // 10)
+        & (widths <= mask.shape[1] // 10)
+    ]
+    if glyphs.size < MIN_GLYPHS:
+        return None
+    return float(np.median(glyphs))
+
+
+def choose_dpi(mask, dpi):
+    """DPI at which the page's median glyph reaches TARGET_GLYPH_HEIGHT"""
+    height = glyph_height(mask)
+    if height is None:
+        return dpi
+
+    target = int(np.clip(round(dpi * TARGET_GLYPH_HEIGHT / height), MIN_DPI, MAX_DPI))
+    return dpi if abs(target - dpi) < dpi * MIN_DPI_CHANGE else target
+
+
+def skew_angle(mask):
+    """Rotation in degrees that levels the inked area, or 0.0"""
+    points = cv2.findNonZero(mask)
+    if points is None:
+        return 0.0
+
+    angle = cv2.minAreaRect(points)[2]
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+
+    # Tiny angles are noise; large ones are usually a misreading of the layout
+    if abs(angle) < MIN_SKEW or abs(angle) > MAX_SKEW:
+        return 0.0
+    return angle
+
+
+def deskew(gray, mask, angle):
+    """Rotate the page and its ink mask by angle degrees; returns the 2x3 matrix too"""
+    height, width = gray.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    if not angle:
+        return gray, mask, matrix
+
+    gray = cv2.warpAffine(
+        gray, matrix, (width, height),
+        flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE
+    )
+    mask = cv2.warpAffine(mask, matrix, (width, height), flags=cv2.INTER_NEAREST)
+    return gray, mask, matrix
+
+
+def _edge_run(flags):
+    """Number of leading True values"""
+    return len(flags) if flags.all() else int(np.argmin(flags))
+
+
+def strip_borders(gray, mask):
+    """
+    Remove near-solid ink bands along the edges left by scanners and
+    return (gray, mask, (left, top)) with the mask also cleared of specks
+    and (left, top) the offset of the kept area.
+    """
+    height, width = mask.shape
+    rows = mask.mean(axis=1) >= 255 * BORDER_INK_RATIO
+    cols = mask.mean(axis=0) >= 255 * BORDER_INK_RATIO
+
+    top = _edge_run(rows)
+    bottom = height - _edge_run(rows[::-1])
+    left = _edge_run(cols)
+    right = width - _edge_run(cols[::-1])
+    if top < bottom and left < right:
+        gray, mask = gray[top:bottom, left:right], mask[top:bottom, left:right]
+        height, width = mask.shape
+    else:
+        top = left = 0
+
+    # Whiten the long slivers that remain where a band faded out gradually,
+    # and drop specks from the mask so they cannot stretch skew or crop
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    x, y = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+    w, h = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+    sliver = ((x == 0) | (y == 0) | (x + w == width) | (y + h == height)) \
+        & ((w > width // 10) | (h > height // 10))
+    speck = stats[:, cv2.CC_STAT_AREA] < MIN_SPECK_AREA
+    sliver[0] = speck[0] = False
+
+    if sliver.any():
+        gray = np.where(sliver[labels], 255, gray).astype(np.uint8)
+    return gray, np.where((sliver | speck)[labels], 0, mask).astype(np.uint8), (left, top)
+
+
+def crop_content(gray, mask):
+    """Crop to the inked area plus padding; returns (gray, (left, top))"""
+    points = cv2.findNonZero(mask)
+    if points is None:
+        return gray, (0, 0)
+
+    height, width = mask.shape
+    x, y, w, h = cv2.boundingRect(points)
+    left, top = max(x - CROP_PADDING, 0), max(y - CROP_PADDING, 0)
+    return gray[top:min(y + h + CROP_PADDING, height), left:min(x + w + CROP_PADDING, width)], (left, top)
+
+
+def _translation(dx, dy):
+    return np.array([[1, 0, dx], [0, 1, dy], [0, 0, 1]], dtype=float)
+
+
+def map_boxes(boxes, matrix):
+    """
+    Map (left, top, width, height) boxes from prepared-image pixels back to
+    the pixels of the image given to prepare(), using info['matrix'].
+    """
+    if not boxes:
+        return []
+
+    inverse = np.linalg.inv(np.asarray(matrix, dtype=float))
+    boxes = np.asarray(boxes, dtype=float)
+    x0, y0 = boxes[:, 0], boxes[:, 1]
+    x1, y1 = x0 + boxes[:, 2], y0 + boxes[:, 3]
+
+    # Map all four corners and keep their bounding box
+    xs = np.stack([x0, x1, x1, x0], axis=1)
+    ys = np.stack([y0, y0, y1, y1], axis=1)
+    mapped_x = inverse[0, 0] * xs + inverse[0, 1] * ys + inverse[0, 2]
+    mapped_y = inverse[1, 0] * xs + inverse[1, 1] * ys + inverse[1, 2]
+
+    left, top = mapped_x.min(axis=1), mapped_y.min(axis=1)
+    return np.stack(
+        [left, top, mapped_x.max(axis=1) - left, mapped_y.max(axis=1) - top], axis=1
+    ).round(2).tolist()
+
+
+def binarize(gray):
+    return cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+        BINARIZE_BLOCK, BINARIZE_OFFSET
+    )
+
+
+def prepare(image, dpi, rerender=None):
+    """
+    Run the pipeline on a PIL image rendered at dpi and return
+    (prepared PIL image, info) where info holds the DPI recognized at, the
+    skew corrected, the 3x3 matrix taking input pixels to prepared pixels
+    and per-stage timings in milliseconds. rerender(dpi)
+    should return a fresh render when the text height calls for another
+    resolution; without it the image is resampled instead.
+    """
+    from PIL import Image
+
+    timer = StageTimer()
+    matrix = np.eye(3)
+
+    gray = to_gray(image)
+    timer.lap('grayscale')
+
+    mask = ink_mask(gray)
+    target_dpi = choose_dpi(mask, dpi)
+    timer.lap('measure')
+
+    if target_dpi != dpi:
+        if rerender is not None:
+            gray = to_gray(rerender(target_dpi))
+        else:
+            scale = target_dpi / dpi
+            interpolation = cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
+        matrix = np.diag([target_dpi / dpi, target_dpi / dpi, 1.0]) @ matrix
+        mask = ink_mask(gray)
+        dpi = target_dpi
+        timer.lap('rescale')
+
+    # Borders go first so they cannot dominate the skew estimate
+    gray, mask, (left, top) = strip_borders(gray, mask)
+    matrix = _translation(-left, -top) @ matrix
+    timer.lap('strip_borders')
+
+    angle = skew_angle(mask)
+    gray, mask, rotation = deskew(gray, mask, angle)
+    matrix = np.vstack([rotation, [0, 0, 1]]) @ matrix
+    timer.lap('deskew')
+
+    gray, (left, top) = crop_content(gray, mask)
+    matrix = _translation(-left, -top) @ matrix
+    timer.lap('crop')
+
+    binary = binarize(gray)
+    timer.lap('binarize')
+
+    return Image.fromarray(binary), {
+        'dpi': dpi,
+        'skew': round(angle, 2),
+        'matrix': matrix.tolist(),
+        'timings': timer.timings,
+    }
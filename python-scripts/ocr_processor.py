@@ -1,78 +1,545 @@
 import sys
 import json
-import pytesseract
-from pdf2image import convert_from_path
-from PIL import Image
 import os
+import unicodedata
 
-def ocr_pdf(pdf_path, languages='eng+ind', pages=None, output_format='txt'):
-    try:
-        if pages:
-            images = convert_from_path(pdf_path, first_page=min(pages), last_page=max(pages), dpi=100)
-        else:
-            images = convert_from_path(pdf_path, dpi=100)
+import page_ranges
+import ocr_cache
+import ocr_engine
+import render_cache
+
+OCR_CONFIG = r'--oem 3 --psm 6'
+OCR_DPI = 100
+# Resolution assumed when preprocessing images without DPI metadata
+IMAGE_DPI = 300
+
+# 'hybrid' trusts a usable embedded text layer and only OCRs the rest;
+# 'ocr' recognizes every page
+OCR_MODES = ('hybrid', 'ocr')
+
+# Thresholds for accepting a page's embedded text layer
+MIN_TEXT_CHARS = 20
+MAX_BAD_GLYPH_RATIO = 0.1
+MIN_ALNUM_RATIO = 0.5
+SCAN_IMAGE_COVERAGE = 0.5
+MIN_TEXT_COVERAGE = 0.05
+
+# Pages of a searchable PDF held in memory before they are appended to the output
+WRITE_BATCH_PAGES = 16
+
+def _clean_text(text):
+    cleaned_text = '\n'.join(line.rstrip() for line in text.split('\n'))
+    return '\n'.join(line for line in cleaned_text.split('\n') if line.strip())
+
+def _format_results(results, output_format):
+    if output_format == 'txt':
+        formatted_pages = []
+        for r in results:
+            if r['text']:
+                page_num = str(r['page']).center(55)
+                header = f"\n╔{'═' * 55}╗\n║{page_num}║\n╚{'═' * 55}╝\n"
+                formatted_pages.append(f"{header}\n{r['text']}")
+        return '\n\n'.join(formatted_pages)
+    else:
+        return json.dumps(
+            [{'page': r['page'], 'text': r['text'], 'method': r['method']} for r in results],
+            ensure_ascii=False
+        )
+
+def _emit(event):
+    print(json.dumps(event, ensure_ascii=False), flush=True)
+
+def _init_ocr_worker():
+    # The pool provides the parallelism; keep each tesseract single-threaded
+    # so N workers do not fight over N * cores OpenMP threads
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+def _cache_config(config, preprocess):
+    if not preprocess:
+        return config
+    
+    import ocr_preprocess
+    return f'{config} {ocr_preprocess.CACHE_TAG}'
+
+def _recognize(image, languages, dpi=OCR_DPI, config=OCR_CONFIG, key=None, preprocess=False, rerender=None,
+               postprocess=_clean_text, words=False):
+    """
+    Return (text, timings) for an image, serving repeat inputs from the OCR
+    cache. The key covers the pixels, languages, DPI, config and whether
+    preprocessing ran, never the output format. With preprocess the image
+    is cleaned up first, and rerender(dpi) is used when the measured text
+    height calls for another resolution. dpi is None for images of unknown
+    resolution. With words, the word boxes in the given image's pixels are
+    returned in place of the text.
+    """
+    import time
+    
+    kind = 'words' if words else 'text'
+    cache = ocr_cache.get_cache() if ocr_cache.enabled() else None
+    cache_config = _cache_config(config, preprocess)
+    if cache is not None:
+        key = key or ocr_cache.image_key(image)
+        cached = cache.get(key, languages, dpi or 0, cache_config, kind)
+        if cached is not None:
+            return (json.loads(cached) if words else cached), {}
+    
+    timings = {}
+    if preprocess:
+        import ocr_preprocess
+        
+        image, info = ocr_preprocess.prepare(image, dpi or IMAGE_DPI, rerender)
+        timings = info['timings']
+        dpi_used = info['dpi']
+    else:
+        dpi_used = dpi
+    
+    start = time.perf_counter()
+    engine = ocr_engine.get_engine()
+    if words:
+        result = engine.words(image, languages, config, dpi_used)
+        if preprocess and result:
+            boxes = ocr_preprocess.map_boxes(
+                [[w['left'], w['top'], w['width'], w['height']] for w in result], info['matrix']
+            )
+            for word, (left, top, width, height) in zip(result, boxes):
+                word.update(left=left, top=top, width=width, height=height)
+    else:
+        result = postprocess(engine.recognize(image, languages, config, dpi_used))
+    timings['recognize'] = round((time.perf_counter() - start) * 1000, 2)
+    
+    if cache is not None:
+        cache.put(key, languages, dpi or 0, cache_config, json.dumps(result) if words else result, kind)
+    return result, timings
+
+def _words_to_text(words):
+    lines = []
+    current = None
+    for word in words:
+        if word['line'] != current:
+            lines.append([])
+            current = word['line']
+        lines[-1].append(word['text'])
+    return '\n'.join(' '.join(line) for line in lines)
+
+def _add_text_layer(page, words, dpi):
+    """
+    Write tesseract's words onto a page as invisible text (render mode 3),
+    each word scaled to fill its box, so the page becomes searchable and
+    selectable without changing how it looks. Word boxes are pixels of a
+    render at dpi, which share the displayed page's orientation.
+    """
+    import fitz
+    
+    font = fitz.Font('helv')
+    scale = 72 / dpi
+    shape = page.new_shape()
+    for word in words:
+        rect = fitz.Rect(
+            word['left'], word['top'], word['left'] + word['width'], word['top'] + word['height']
+        ) * fitz.Matrix(scale, scale)
+        if rect.is_empty:
+            continue
         
-        results = []
+        fontsize = rect.height / (font.ascender - font.descender)
+        length = font.text_length(word['text'], fontsize=fontsize)
+        if not length:
+            continue
         
-        for idx, image in enumerate(images, start=1):
-            custom_config = r'--oem 3 --psm 6'
-            text = pytesseract.image_to_string(image, lang=languages, config=custom_config)
-            
-            cleaned_text = '\n'.join(line.rstrip() for line in text.split('\n'))
-            cleaned_text = '\n'.join(line for line in cleaned_text.split('\n') if line.strip())
-            
-            results.append({
-                'page': idx,
-                'text': cleaned_text
-            })
+        origin = fitz.Point(rect.x0, rect.y1 + font.descender * fontsize)
+        shape.insert_text(
+            origin, word['text'], fontsize=fontsize, fontname='helv', render_mode=3,
+            morph=(origin, fitz.Matrix(rect.width / length, 1))
+        )
+    shape.commit()
+
+def _is_bad_glyph(char):
+    # Replacement, control, private-use and unassigned characters come from
+    # fonts without a usable ToUnicode map
+    return char == '\ufffd' or unicodedata.category(char) in ('Cc', 'Co', 'Cn', 'Cs')
+
+def usable_text_layer(page):
+    """Return the page's embedded text if it can stand in for OCR, else None"""
+    text = page.get_text('text')
+    glyphs = [c for c in text if not c.isspace()]
+    if len(glyphs) < MIN_TEXT_CHARS:
+        return None
+    
+    if sum(1 for c in glyphs if _is_bad_glyph(c)) / len(glyphs) > MAX_BAD_GLYPH_RATIO:
+        return None
+    if sum(1 for c in glyphs if c.isalnum()) / len(glyphs) < MIN_ALNUM_RATIO:
+        return None
+    
+    # A sliver of text (a stamp, a page number) over a full-page scan does
+    # not cover the content, so the page still needs recognition
+    page_area = page.rect.get_area()
+    text_area = sum(
+        (page.rect & block[:4]).get_area()
+        for block in page.get_text('blocks') if block[6] == 0
+    )
+    image_area = sum(
+        (page.rect & info['bbox']).get_area()
+        for info in page.get_image_info()
+    )
+    if image_area > SCAN_IMAGE_COVERAGE * page_area and text_area < MIN_TEXT_COVERAGE * page_area:
+        return None
+    
+    return _clean_text(text)
+
+def _process_page(pdf_path, page_number, languages, mode, preprocess=False, words=False):
+    """
+    Return (method, text, timings, words) for one page, using the embedded
+    text layer in hybrid mode when it is usable. words holds the word boxes
+    when requested for an OCR'd page and is None otherwise. Runs inline or
+    inside a pool worker.
+    """
+    import render
+    
+    if mode == 'hybrid':
+        with render.open_document(pdf_path) as doc:
+            text = usable_text_layer(doc[page_number - 1])
+        if text is not None:
+            return 'text', text, {}, None
+    
+    rerender = lambda dpi: render.render_page(pdf_path, page_number, dpi)
+    
+    def finish(result, timings):
+        if words:
+            return 'ocr', _words_to_text(result), timings, result
+        return 'ocr', result, timings, None
+    
+    if not ocr_cache.enabled():
+        image = render.render_page(pdf_path, page_number, OCR_DPI)
+        return finish(*_recognize(image, languages, preprocess=preprocess, rerender=rerender, words=words))
+    
+    # A page recognized before with these settings needs no rendering at all
+    cache = ocr_cache.get_cache()
+    identity = render_cache.file_identity(pdf_path)
+    cache_config = _cache_config(OCR_CONFIG, preprocess)
+    kind = 'words' if words else 'text'
+    cached = cache.lookup_page(identity, page_number, OCR_DPI, languages, cache_config, kind)
+    if cached is not None:
+        return finish(json.loads(cached) if words else cached, {})
+    
+    image = render.render_page(pdf_path, page_number, OCR_DPI)
+    key = ocr_cache.image_key(image)
+    result, timings = _recognize(image, languages, key=key, preprocess=preprocess, rerender=rerender, words=words)
+    cache.remember_page(identity, page_number, OCR_DPI, key)
+    return finish(result, timings)
+
+def cached_page_ocr(pdf_path, page_number, languages):
+    """
+    Return (text, words) a page of pdf_path was recognized to before, with
+    or without preprocessing, or None. Never renders or recognizes; words
+    are in pixels at OCR_DPI, or None when only the text was kept.
+    """
+    if not ocr_cache.enabled():
+        return None
+    
+    cache = ocr_cache.get_cache()
+    identity = render_cache.file_identity(pdf_path)
+    for preprocess in (False, True):
+        cache_config = _cache_config(OCR_CONFIG, preprocess)
+        cached = cache.lookup_page(identity, page_number, OCR_DPI, languages, cache_config, 'words')
+        if cached is not None:
+            words = json.loads(cached)
+            return _words_to_text(words), words
+        cached = cache.lookup_page(identity, page_number, OCR_DPI, languages, cache_config, 'text')
+        if cached is not None:
+            return cached, None
+    return None
+
+class _SearchablePdfWriter:
+    """
+    Copies the selected pages of a PDF into a new document in page order,
+    adding text layers from word boxes. Pages arrive in any order; each is
+    copied once all earlier pages are in, and every WRITE_BATCH_PAGES
+    copied pages are appended to a temporary file next to the output with
+    an incremental save. Memory therefore holds at most one batch of pages
+    plus the word boxes of pages waiting for an earlier one; save() moves
+    the finished file into place.
+    """
+    
+    def __init__(self, pdf_path, page_numbers, output_path):
+        import fitz
+        import render
         
-        if output_format == 'txt':
-            formatted_pages = []
-            for r in results:
-                if r['text']:
-                    page_num = str(r['page']).center(55)
-                    separator = '─' * 55
-                    header = f"\n╔{'═' * 55}╗\n║{page_num}║\n╚{'═' * 55}╝\n"
-                    formatted_pages.append(f"{header}\n{r['text']}")
-            return '\n\n'.join(formatted_pages)
+        self.lock = render.FITZ_LOCK
+        self.page_numbers = page_numbers
+        self.output_path = output_path
+        self.temp_path = output_path + '.tmp'
+        self.pending = {}
+        self.written = 0
+        self.started = False
+        with self.lock:
+            self.source = fitz.open(pdf_path)
+            self.batch = fitz.open()
+    
+    def add(self, page_number, words):
+        self.pending[page_number] = words
+        while self.written < len(self.page_numbers) and self.page_numbers[self.written] in self.pending:
+            number = self.page_numbers[self.written]
+            page_words = self.pending.pop(number)
+            with self.lock:
+                # Copying keeps the original content streams and images as they are
+                self.batch.insert_pdf(self.source, from_page=number - 1, to_page=number - 1)
+                if page_words:
+                    _add_text_layer(self.batch[-1], page_words, OCR_DPI)
+            self.written += 1
+            if self.batch.page_count >= WRITE_BATCH_PAGES:
+                self._flush()
+    
+    def _flush(self):
+        import fitz
+        
+        with self.lock:
+            if not self.batch.page_count:
+                return
+            if not self.started:
+                self.batch.save(self.temp_path, garbage=3, deflate=True)
+                self.started = True
+            else:
+                # Reopened per batch so the pages already written are not kept loaded
+                output = fitz.open(self.temp_path)
+                try:
+                    output.insert_pdf(self.batch)
+                    output.saveIncr()
+                finally:
+                    output.close()
+            self.batch.close()
+            self.batch = fitz.open()
+    
+    def save(self):
+        self._flush()
+        os.replace(self.temp_path, self.output_path)
+        render_cache.invalidate(self.output_path)
+    
+    def close(self):
+        with self.lock:
+            self.batch.close()
+            self.source.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+def ocr_pdf_pages(pdf_path, languages='eng+ind', pages=None, workers=None, mode='hybrid', preprocess=False,
+                  output_path=None):
+    """
+    Recognize the selected pages of a PDF (a list of page numbers or a spec
+    such as "1-10,250") on a pool of worker processes and return
+    [{'page', 'text', 'method', 'timings'}] in page order, where method is
+    'text' for pages served from the embedded text layer and 'ocr' for
+    tesseract, and timings holds the milliseconds spent per stage (empty
+    for cache hits). Each finished page is printed as a 'page' event
+    followed by a 'progress' event.
+    
+    With output_path, a searchable copy of the selected pages is written
+    there: original page content plus an invisible text layer on OCR'd
+    pages. Pages are appended in order as soon as they and every page
+    before them have finished, and reach the file in batches of
+    WRITE_BATCH_PAGES.
+    """
+    import render
+    
+    if mode not in OCR_MODES:
+        raise ValueError(f'Unknown OCR mode: {mode}')
+    
+    # Only the selected pages are rendered, never the span between them
+    page_numbers = page_ranges.parse_pages(pages or None, render.page_count(pdf_path))
+    workers = max(1, min(workers or os.cpu_count() or 1, len(page_numbers)))
+    words = output_path is not None
+    finished = {}
+    writer = _SearchablePdfWriter(pdf_path, page_numbers, output_path) if words else None
+    
+    def page_finished(page_number, method, text, timings, page_words):
+        finished[page_number] = (method, text, timings)
+        if writer is not None:
+            writer.add(page_number, page_words)
+        _emit({'type': 'page', 'page': page_number, 'method': method, 'text': text, 'timings': timings})
+        _emit({
+            'type': 'progress',
+            'progress': (len(finished) / len(page_numbers)) * 100,
+            'completed': len(finished),
+            'total': len(page_numbers)
+        })
+    
+    try:
+        if workers == 1:
+            for page_number in page_numbers:
+                page_finished(page_number, *_process_page(pdf_path, page_number, languages, mode, preprocess, words))
         else:
-            return json.dumps(results, ensure_ascii=False)
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor, as_completed
             
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_ocr_worker
+            )
+            try:
+                futures = {
+                    executor.submit(_process_page, pdf_path, page_number, languages, mode, preprocess, words): page_number
+                    for page_number in page_numbers
+                }
+                for future in as_completed(futures):
+                    page_finished(futures[future], *future.result())
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+        
+        if writer is not None:
+            writer.save()
+    finally:
+        if writer is not None:
+            writer.close()
+    
+    return [
+        {
+            'page': page_number,
+            'text': finished[page_number][1],
+            'method': finished[page_number][0],
+            'timings': finished[page_number][2]
+        }
+        for page_number in page_numbers
+    ]
+
+def ocr_pdf(pdf_path, languages='eng+ind', pages=None, output_format='txt', workers=None, mode='hybrid', preprocess=False,
+            output_path=None):
+    """
+    Return the OCR result as 'txt' or 'json'; for 'pdf', write a searchable
+    PDF to output_path and return that path.
+    """
+    try:
+        if output_format == 'pdf':
+            if not output_path:
+                raise ValueError('Searchable PDF output needs an output path')
+            ocr_pdf_pages(pdf_path, languages, pages, workers, mode, preprocess, output_path)
+            return output_path
+        
+        results = ocr_pdf_pages(pdf_path, languages, pages, workers, mode, preprocess)
+        return _format_results(results, output_format)
     except Exception as e:
         raise Exception(str(e))
 
-def ocr_image(image_path, languages='eng+ind'):
+def _method_summary(results):
+    summary = {'text': [], 'ocr': []}
+    for r in results:
+        summary[r['method']].append(r['page'])
+    return summary
+
+def _timing_summary(results):
+    """Total milliseconds per stage across all pages"""
+    totals = {}
+    for r in results:
+        for stage, ms in r['timings'].items():
+            totals[stage] = round(totals.get(stage, 0) + ms, 2)
+    return totals
+
+def _ocr_image(image_path, languages, preprocess):
+    from PIL import Image
+    
+    image = Image.open(image_path)
+    # Standalone images use tesseract's default config; the DPI comes from
+    # the file's metadata when it has any
+    dpi = int(image.info.get('dpi', (0,))[0]) or None
+    return _recognize(image, languages, dpi=dpi, config='', preprocess=preprocess, postprocess=str.strip)
+
+def ocr_image(image_path, languages='eng+ind', preprocess=False):
     try:
-        image = Image.open(image_path)
-        text = pytesseract.image_to_string(image, lang=languages)
-        return text.strip()
+        return _ocr_image(image_path, languages, preprocess)[0]
     except Exception as e:
         raise Exception(str(e))
 
+def ocr_images(image_paths, languages='eng+ind', preprocess=False):
+    """
+    Recognize a batch of images with one engine, so the language models
+    are loaded once, and return [{'image', 'text', 'timings'}] in input
+    order. Progress is printed after each image.
+    """
+    results = []
+    for index, image_path in enumerate(image_paths, start=1):
+        text, timings = _ocr_image(image_path, languages, preprocess)
+        results.append({'image': image_path, 'text': text, 'timings': timings})
+        _emit({
+            'type': 'progress',
+            'progress': (index / len(image_paths)) * 100,
+            'completed': index,
+            'total': len(image_paths)
+        })
+    return results
+
+def run_command(command, args):
+    """Execute one CLI command and return the JSON it would print"""
+    if command == 'ocr_pdf':
+        pdf_path = args[0]
+        languages = args[1] if len(args) > 1 else 'eng+ind'
+        pages = page_ranges.parse_pages_arg(args[2]) if len(args) > 2 else None
+        output_format = args[3] if len(args) > 3 else 'txt'
+        workers = int(args[4]) if len(args) > 4 and args[4] else None
+        mode = args[5] if len(args) > 5 and args[5] else 'hybrid'
+        preprocess = len(args) > 6 and args[6].lower() in ('1', 'true')
+        output_path = args[7] if len(args) > 7 and args[7] else None
+        
+        if output_format == 'pdf':
+            if not output_path:
+                raise ValueError('Searchable PDF output needs an output path')
+            
+            results = ocr_pdf_pages(pdf_path, languages, pages, workers, mode, preprocess, output_path)
+            return json.dumps({
+                'type': 'success',
+                'message': f'Searchable PDF saved to {output_path}',
+                'output': output_path,
+                'methods': _method_summary(results),
+                'engine': ocr_engine.engine_name(),
+                'timings': _timing_summary(results)
+            })
+        
+        results = ocr_pdf_pages(pdf_path, languages, pages, workers, mode, preprocess)
+        return json.dumps({
+            'type': 'success',
+            'data': _format_results(results, output_format),
+            'methods': _method_summary(results),
+            'engine': ocr_engine.engine_name(),
+            'timings': _timing_summary(results)
+        })
+    
+    elif command == 'ocr_image':
+        image_path = args[0]
+        languages = args[1] if len(args) > 1 else 'eng+ind'
+        preprocess = len(args) > 2 and args[2].lower() in ('1', 'true')
+        
+        result, timings = _ocr_image(image_path, languages, preprocess)
+        return json.dumps({'type': 'success', 'data': result, 'engine': ocr_engine.engine_name(), 'timings': timings})
+    
+    elif command == 'ocr_images':
+        image_paths = json.loads(args[0])
+        languages = args[1] if len(args) > 1 else 'eng+ind'
+        preprocess = len(args) > 2 and args[2].lower() in ('1', 'true')
+        
+        results = ocr_images(image_paths, languages, preprocess)
+        return json.dumps({
+            'type': 'success',
+            'data': results,
+            'engine': ocr_engine.engine_name(),
+            'timings': _timing_summary(results)
+        })
+    
+    elif command == 'ocr_cache_stats':
+        return json.dumps({'type': 'success', 'data': ocr_cache.get_cache().stats()})
+    
+    elif command == 'ocr_cache_clear':
+        ocr_cache.get_cache().clear()
+        return json.dumps({'type': 'success', 'message': 'OCR cache cleared'})
+    
+    raise ValueError(f'Unknown command: {command}')
+
 if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+    
     if len(sys.argv) < 2:
         print(json.dumps({'type': 'error', 'message': 'Missing arguments'}))
         sys.exit(1)
     
     try:
-        command = sys.argv[1]
-        
-        if command == 'ocr_pdf':
-            pdf_path = sys.argv[2]
-            languages = sys.argv[3] if len(sys.argv) > 3 else 'eng+ind'
-            pages = json.loads(sys.argv[4]) if len(sys.argv) > 4 else None
-            output_format = sys.argv[5] if len(sys.argv) > 5 else 'txt'
-            
-            result = ocr_pdf(pdf_path, languages, pages, output_format)
-            print(json.dumps({'type': 'success', 'data': result}))
-        
-        elif command == 'ocr_image':
-            image_path = sys.argv[2]
-            languages = sys.argv[3] if len(sys.argv) > 3 else 'eng+ind'
-            
-            result = ocr_image(image_path, languages)
-            print(json.dumps({'type': 'success', 'data': result}))
-    
+        print(run_command(sys.argv[1], sys.argv[2:]))
     except Exception as e:
         print(json.dumps({'type': 'error', 'message': str(e)}))
         sys.exit(1)
@@ -0,0 +1,76 @@
+"""
+Page Ranges
+Parsing of page selections shared by the script commands.
+
+A selection can be None (every page), a list of page numbers, or a spec
+string such as "1-10,250,400-410" where "400-" runs to the last page.
+Page numbers are 1-based; results are sorted and free of duplicates.
+"""
+import json
+
+
+def _parse_spec(spec, total_pages):
+    pages = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+
+        if '-' in part:
+            start_text, end_text = (piece.strip() for piece in part.split('-', 1))
+            start = int(start_text) if start_text else 1
+            if end_text:
+                end = int(end_text)
+            elif total_pages is not None:
+                end = total_pages
+            else:
+                raise ValueError(f'Open page range needs a page count: {part}')
+            if end < start:
+                raise ValueError(f'Invalid page range: {part}')
+            # Check the ends before expanding, so '1-999999999' fails fast
+            # instead of building a set of a billion pages
+            if start < 1:
+                raise ValueError(f'Invalid page number: {start}')
+            if total_pages is not None and end > total_pages:
+                raise ValueError(f'Invalid page number: {end}')
+            pages.update(range(start, end + 1))
+        else:
+            pages.add(int(part))
+    return pages
+
+
+def parse_pages(selection, total_pages=None):
+    """Return the sorted list of page numbers described by selection"""
+    if selection is None or selection == '':
+        if total_pages is None:
+            raise ValueError('Selecting every page needs a page count')
+        return list(range(1, total_pages + 1))
+
+    if isinstance(selection, int):
+        pages = {selection}
+    elif isinstance(selection, str):
+        pages = _parse_spec(selection, total_pages)
+    else:
+        pages = set()
+        for item in selection:
+            if isinstance(item, str):
+                pages.update(_parse_spec(item, total_pages))
+            else:
+                pages.add(int(item))
+
+    invalid = [page for page in pages if page < 1 or (total_pages is not None and page > total_pages)]
+    if invalid:
+        raise ValueError(f'Invalid page number: {min(invalid) if min(invalid) < 1 else max(invalid)}')
+
+    return sorted(pages)
+
+
+def parse_pages_arg(arg):
+    """
+    Decode a CLI page argument: JSON (a list or null) as sent by the app,
+    or a plain spec string typed by a user.
+    """
+    try:
+        return json.loads(arg)
+    except ValueError:
+        return arg
@@ -1,132 +1,230 @@
 import sys
 import json
-from pdf2docx import Converter
-from PyPDF2 import PdfReader, PdfWriter
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from PIL import Image
-from pdf2image import convert_from_path
 import os
-import io
-import base64
 
-def get_pdf_thumbnails(pdf_path):
-    try:
+import render
+import render_cache
+import page_ranges
 
-        from concurrent.futures import ThreadPoolExecutor
-        import multiprocessing
-        
-        reader = PdfReader(pdf_path)
-        total_pages = len(reader.pages)
-        
-        max_initial_pages = 20
-        pages_to_load = min(total_pages, max_initial_pages)
-        
-        images = convert_from_path(
-            pdf_path, 
-            dpi=72,  
-            first_page=1, 
-            last_page=pages_to_load,
-            thread_count=multiprocessing.cpu_count() 
-        )
-        
-        thumbnails = []
-        
-        def process_thumbnail(idx_image):
-            idx, image = idx_image
-            thumbnail = image.copy()
-            thumbnail.thumbnail((150, 212), Image.Resampling.LANCZOS)
-            
-            buffered = io.BytesIO()
-            thumbnail.save(buffered, format="JPEG", quality=75, optimize=True)
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            
-            return {
-                'page': idx,
-                'thumbnail': f'data:image/jpeg;base64,{img_str}'
-            }
-        
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            results = list(executor.map(process_thumbnail, enumerate(images, start=1)))
+# Heavy dependencies (pdf2docx pulls in OpenCV and NumPy) are imported inside
+# the functions that use them to keep per-command startup small.
+
+THUMBNAIL_BOX = (150, 212)
+
+# pdf_to_images: file extension -> PIL format, and the options each accepts
+IMAGE_FORMATS = {'png': 'png', 'jpg': 'jpeg', 'jpeg': 'jpeg', 'webp': 'webp', 'tiff': 'tiff', 'tif': 'tiff'}
+ENCODER_OPTIONS = {
+    'png': ('compress_level', 'optimize'),
+    'jpeg': ('quality', 'optimize', 'progressive', 'subsampling'),
+    'webp': ('quality', 'lossless', 'method'),
+    'tiff': ('compression',),
+}
+EXPORT_WORKERS = 4
+EXPORT_QUEUE_PER_WORKER = 2
+
+def get_pdf_thumbnails(pdf_path, start=1, count=20):
+    try:
+        total_pages = render.page_count(pdf_path)
+        pages = range(max(start, 1), min(total_pages, start + count - 1) + 1)
         
-        thumbnails = sorted(results, key=lambda x: x['page'])
+        thumbnails = [
+            {'page': page, 'thumbnail': render.data_url(data, 'jpeg')}
+            for page, data in render.iter_thumbnails(
+                pdf_path, pages, THUMBNAIL_BOX, 'jpeg', quality=75, optimize=True
+            )
+        ]
         
         return json.dumps({
             'type': 'success', 
             'thumbnails': thumbnails,
             'total_pages': total_pages,
-            'loaded_pages': pages_to_load
+            'loaded_pages': len(pages)
         })
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
 
-def get_pdf_page_image(pdf_path, page_number, scale=1.0):
+def stream_pdf_thumbnails(pdf_path, start=1, count=50):
+    """
+    Print one NDJSON line per thumbnail as soon as it is rendered and return
+    a summary line. Only one page image is held in memory at a time, so any
+    range of any document can be requested.
+    """
     try:
-        dpi = int(150 * scale)
-        images = convert_from_path(
-            pdf_path, 
-            first_page=page_number, 
-            last_page=page_number,
-            dpi=dpi
-        )
+        total_pages = render.page_count(pdf_path)
+        pages = range(max(start, 1), min(total_pages, start + count - 1) + 1)
         
-        if not images:
-            return json.dumps({'type': 'error', 'message': 'Page not found'})
+        for page, data in render.iter_thumbnails(
+            pdf_path, pages, THUMBNAIL_BOX, 'jpeg', quality=75, optimize=True
+        ):
+            print(json.dumps({
+                'type': 'thumbnail',
+                'page': page,
+                'thumbnail': render.data_url(data, 'jpeg')
+            }), flush=True)
         
-        buffered = io.BytesIO()
-        images[0].save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        next_start = pages.stop if pages.stop <= total_pages else None
+        return json.dumps({
+            'type': 'success',
+            'total_pages': total_pages,
+            'start': pages.start,
+            'loaded_pages': len(pages),
+            'next_start': next_start
+        })
+    except Exception as e:
+        return json.dumps({'type': 'error', 'message': str(e)})
+
+def get_pdf_page_image(pdf_path, page_number, scale=1.0):
+    try:
+        data = render.page_image(pdf_path, page_number, int(150 * scale))
         
         return json.dumps({
             'type': 'success',
-            'image': f'data:image/png;base64,{img_str}'
+            'image': render.data_url(data, 'png')
         })
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
 
-def pdf_to_word(pdf_path, output_path):
+def _convert_to_word(pdf_path, output_path):
+    """Body of the pdf_to_word child process"""
+    from pdf2docx import Converter
+    
+    # The child inherits the worker's stdout, which carries its protocol
+    sys.stdout = sys.stderr
+    cv = Converter(pdf_path)
     try:
-        cv = Converter(pdf_path)
         cv.convert(output_path)
+    finally:
         cv.close()
+
+def pdf_to_word(pdf_path, output_path):
+    """
+    Convert with pdf2docx in a process of its own: it calls PyMuPDF all
+    through a long conversion, and in this process that would mean holding
+    render.FITZ_LOCK, and stalling every render, until it finished.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            executor.submit(_convert_to_word, pdf_path, output_path).result()
+        render_cache.invalidate(output_path)
         return json.dumps({'type': 'success', 'output': output_path})
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
 
-def pdf_to_images(pdf_path, output_dir, format='png', dpi=200):
+def _encoder_options(format, options):
+    """Validate per-format encoder options such as JPEG quality"""
+    allowed = ENCODER_OPTIONS.get(format)
+    if allowed is None:
+        raise ValueError(f'Unsupported image format: {format}')
+    
+    unknown = sorted(set(options or {}) - set(allowed))
+    if unknown:
+        raise ValueError(f'Unsupported {format} option: {", ".join(unknown)}')
+    return dict(options or {})
+
+def pdf_to_images(pdf_path, output_dir, format='png', dpi=200, pages=None, options=None, workers=None):
+    """
+    Render the selected pages one at a time and hand each bitmap to a small
+    thread pool that encodes and writes it. The renderer waits whenever the
+    pool has EXPORT_QUEUE_PER_WORKER pages per worker in flight, so memory
+    is bounded by the pool size rather than the page count. A progress
+    event is printed as each file is written.
+    """
+    import threading
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    
     try:
-        from pdf2image import convert_from_path
+        extension = format.lower()
+        fmt = IMAGE_FORMATS.get(extension)
+        if fmt is None:
+            raise ValueError(f'Unsupported image format: {format}')
+        encoder_options = _encoder_options(fmt, options)
+        
+        page_numbers = page_ranges.parse_pages(pages or None, render.page_count(pdf_path))
+        workers = max(1, min(workers or EXPORT_WORKERS, len(page_numbers)))
+        in_flight = threading.BoundedSemaphore(workers * EXPORT_QUEUE_PER_WORKER)
+        completed = [0]
         
-        images = convert_from_path(pdf_path, dpi=dpi)
-        output_files = []
+        def write_page(page_number, image):
+            try:
+                output_file = os.path.join(output_dir, f'page_{page_number}.{extension}')
+                data = render.encode(image, fmt, **encoder_options)
+                image = None
+                with open(output_file, 'wb') as f:
+                    f.write(data)
+                return page_number, output_file
+            finally:
+                in_flight.release()
         
-        for idx, image in enumerate(images, start=1):
-            output_file = os.path.join(output_dir, f'page_{idx}.{format}')
-            image.save(output_file, format.upper())
-            output_files.append(output_file)
+        def report(done):
+            # Progress is printed here, on the request's thread: under the
+            # worker daemon stdout is bound to it and the pool threads'
+            # output would never reach the app
+            for page_number, output_file in sorted(future.result() for future in done):
+                completed[0] += 1
+                print(json.dumps({
+                    'type': 'progress',
+                    'progress': (completed[0] / len(page_numbers)) * 100,
+                    'completed': completed[0],
+                    'total': len(page_numbers),
+                    'page': page_number,
+                    'file': output_file
+                }), flush=True)
+        
+        futures = []
+        pending = set()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for page_number, image in render.iter_pages(pdf_path, page_numbers, dpi=dpi):
+                in_flight.acquire()
+                future = executor.submit(write_page, page_number, image)
+                image = None
+                futures.append(future)
+                pending.add(future)
+                done = {future for future in pending if future.done()}
+                pending -= done
+                report(done)
             
-            progress = (idx / len(images)) * 100
-            print(json.dumps({
-                'type': 'progress',
-                'progress': progress
-            }), flush=True)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                report(done)
         
+        output_files = [future.result()[1] for future in futures]
         return json.dumps({'type': 'success', 'files': output_files})
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
 
-def images_to_pdf(image_paths, output_path):
+def images_to_pdf(image_paths, output_path, page_size='image', margin=0):
+    """
+    Write one page per image, embedding JPEG and PNG data without
+    re-encoding it and holding at most one image in memory. page_size is
+    'image' (page matches the image at its DPI), a name such as 'a4', or
+    [width, height] in points; margin is in points.
+    """
+    import image_pdf
+    
     try:
-        images = []
-        for img_path in image_paths:
-            img = Image.open(img_path)
-            if img.mode == 'RGBA':
-                img = img.convert('RGB')
-            images.append(img)
+        if not image_paths:
+            raise ValueError('No images to convert')
         
-        if images:
-            images[0].save(output_path, save_all=True, append_images=images[1:])
+        writer = image_pdf.ImagePdfWriter(output_path, page_size, margin)
+        try:
+            for index, image_path in enumerate(image_paths, start=1):
+                writer.add_image(image_path)
+                print(json.dumps({
+                    'type': 'progress',
+                    'progress': (index / len(image_paths)) * 100,
+                    'completed': index,
+                    'total': len(image_paths)
+                }), flush=True)
+            writer.close()
+        except Exception:
+            writer.abort()
+            os.remove(output_path)
+            raise
         
+        render_cache.invalidate(output_path)
         return json.dumps({'type': 'success', 'output': output_path})
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
@@ -135,6 +233,7 @@ def word_to_pdf(docx_path, output_path):
     try:
         import docx2pdf
         docx2pdf.convert(docx_path, output_path)
+        render_cache.invalidate(output_path)
         return json.dumps({'type': 'success', 'output': output_path})
     except ImportError:
         return json.dumps({
@@ -144,41 +243,69 @@ def word_to_pdf(docx_path, output_path):
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
 
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print(json.dumps({'type': 'error', 'message': 'Missing arguments'}))
-        sys.exit(1)
-    
-    command = sys.argv[1]
-    
+def run_command(command, args):
+    """Execute one CLI command and return the JSON it would print"""
     if command == 'get_thumbnails':
-        pdf_path = sys.argv[2]
-        print(get_pdf_thumbnails(pdf_path))
+        pdf_path = args[0]
+        start = int(args[1]) if len(args) > 1 else 1
+        count = int(args[2]) if len(args) > 2 else 20
+        return get_pdf_thumbnails(pdf_path, start, count)
+    
+    elif command == 'stream_thumbnails':
+        pdf_path = args[0]
+        start = int(args[1]) if len(args) > 1 else 1
+        count = int(args[2]) if len(args) > 2 else 50
+        return stream_pdf_thumbnails(pdf_path, start, count)
     
     elif command == 'get_page_image':
-        pdf_path = sys.argv[2]
-        page_number = int(sys.argv[3])
-        scale = float(sys.argv[4]) if len(sys.argv) > 4 else 1.0
-        print(get_pdf_page_image(pdf_path, page_number, scale))
+        pdf_path = args[0]
+        page_number = int(args[1])
+        scale = float(args[2]) if len(args) > 2 else 1.0
+        return get_pdf_page_image(pdf_path, page_number, scale)
     
     elif command == 'pdf_to_word':
-        pdf_path = sys.argv[2]
-        output_path = sys.argv[3]
-        print(pdf_to_word(pdf_path, output_path))
+        pdf_path = args[0]
+        output_path = args[1]
+        return pdf_to_word(pdf_path, output_path)
     
     elif command == 'pdf_to_images':
-        pdf_path = sys.argv[2]
-        output_dir = sys.argv[3]
-        format = sys.argv[4] if len(sys.argv) > 4 else 'png'
-        dpi = int(sys.argv[5]) if len(sys.argv) > 5 else 200
-        print(pdf_to_images(pdf_path, output_dir, format, dpi))
+        pdf_path = args[0]
+        output_dir = args[1]
+        format = args[2] if len(args) > 2 else 'png'
+        dpi = int(args[3]) if len(args) > 3 else 200
+        pages = page_ranges.parse_pages_arg(args[4]) if len(args) > 4 and args[4] else None
+        options = json.loads(args[5]) if len(args) > 5 and args[5] else None
+        workers = int(args[6]) if len(args) > 6 and args[6] else None
+        return pdf_to_images(pdf_path, output_dir, format, dpi, pages, options, workers)
     
     elif command == 'images_to_pdf':
-        image_paths = json.loads(sys.argv[2])
-        output_path = sys.argv[3]
-        print(images_to_pdf(image_paths, output_path))
+        image_paths = json.loads(args[0])
+        output_path = args[1]
+        page_size = args[2] if len(args) > 2 and args[2] else 'image'
+        if page_size.startswith('['):
+            page_size = json.loads(page_size)
+        margin = float(args[3]) if len(args) > 3 and args[3] else 0
+        return images_to_pdf(image_paths, output_path, page_size, margin)
     
     elif command == 'word_to_pdf':
-        docx_path = sys.argv[2]
-        output_path = sys.argv[3]
-        print(word_to_pdf(docx_path, output_path))
+        docx_path = args[0]
+        output_path = args[1]
+        return word_to_pdf(docx_path, output_path)
+    
+    raise ValueError(f'Unknown command: {command}')
+
+if __name__ == '__main__':
+    # Only frozen builds need it, and importing multiprocessing costs startup
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+    
+    if len(sys.argv) < 2:
+        print(json.dumps({'type': 'error', 'message': 'Missing arguments'}))
+        sys.exit(1)
+    
+    try:
+        print(run_command(sys.argv[1], sys.argv[2:]))
+    except Exception as e:
+        print(json.dumps({'type': 'error', 'message': str(e)}))
+        sys.exit(1)
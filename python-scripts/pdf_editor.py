@@ -4,35 +4,26 @@ Handles PDF manipulation operations
 """
 import sys
 import json
-import subprocess
-from PyPDF2 import PdfReader, PdfWriter, PdfMerger
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.utils import ImageReader
-from PIL import Image
-from pdf2image import convert_from_path
-import pikepdf
-import io
 import os
-import base64
 
-def get_pdf_thumbnails(pdf_path, output_dir=None):
+import render
+import page_ranges
+import render_cache
+
+# Heavy dependencies are imported inside the functions that use them so a
+# command only pays for the libraries it actually needs at startup.
+
+def get_pdf_thumbnails(pdf_path, output_dir=None, start=1, count=None):
     try:
-        images = convert_from_path(pdf_path, dpi=150, first_page=1, last_page=None)
-        thumbnails = []
+        total_pages = render.page_count(pdf_path)
+        last_page = total_pages if count is None else min(total_pages, start + count - 1)
         
-        for idx, image in enumerate(images, start=1):
-            thumbnail = image.copy()
-            thumbnail.thumbnail((200, 283), Image.Resampling.LANCZOS)
-            
-            buffered = io.BytesIO()
-            thumbnail.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            
-            thumbnails.append({
-                'page': idx,
-                'thumbnail': f'data:image/png;base64,{img_str}'
-            })
+        thumbnails = [
+            {'page': page, 'thumbnail': render.data_url(data, 'png')}
+            for page, data in render.iter_thumbnails(
+                pdf_path, range(max(start, 1), last_page + 1), (200, 283), 'png'
+            )
+        ]
         
         return json.dumps({'type': 'success', 'thumbnails': thumbnails})
     except Exception as e:
@@ -41,70 +32,95 @@ def get_pdf_thumbnails(pdf_path, output_dir=None):
 def get_pdf_page_image(pdf_path, page_number, dpi=150):
     """Get a single page as base64 encoded image for preview"""
     try:
-        # Convert only the specific page
-        images = convert_from_path(
-            pdf_path, 
-            first_page=page_number, 
-            last_page=page_number,
-            dpi=dpi
-        )
-        
-        if not images:
-            return json.dumps({'type': 'error', 'message': 'Failed to convert page'})
-        
-        image = images[0]
-        
-        # Convert to base64
-        buffered = io.BytesIO()
-        image.save(buffered, format='PNG')
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        data = render.page_image(pdf_path, page_number, dpi)
         
         return json.dumps({
             'type': 'success',
             'page': page_number,
-            'image': f'data:image/png;base64,{img_str}'
+            'image': render.data_url(data, 'png')
         })
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
 
-def merge_pdfs(input_paths, output_path):
+def merge_pdfs(input_paths, output_path, outlines=True, links=True):
+    """
+    Merge PDFs with pikepdf, storing fonts, images and ICC profiles shared
+    between inputs once. Inputs are read as the output is written rather
+    than loaded up front. A progress event is printed per input.
+    """
+    import pdf_merge
+    
     try:
-        merger = PdfMerger()
-        
-        for pdf_path in input_paths:
-            merger.append(pdf_path)
-        
-        merger.write(output_path)
-        merger.close()
+        result = pdf_merge.merge(
+            input_paths, output_path, outlines, links,
+            on_input=pdf_merge.progress_printer(len(input_paths))
+        )
+        render_cache.invalidate(output_path)
         
-        return json.dumps({'type': 'success', 'output': output_path})
+        return json.dumps({'type': 'success', 'output': output_path, **result})
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
 
-def split_pdf(input_path, output_dir, pages):
+def split_pdf(input_path, output_dir, value, mode='pages', workers=None):
+    """
+    Split a PDF by mode (see pdf_split.SPLIT_MODES); value is the page
+    list, range spec, chunk size, bookmark level or maximum file size in
+    bytes. Outputs are written in parallel and keep only the objects
+    their pages use.
+    """
+    import pdf_split
+    
     try:
-        reader = PdfReader(input_path)
-        output_files = []
-        
-        for page_num in pages:
-            if page_num < 1 or page_num > len(reader.pages):
-                continue
-            
-            writer = PdfWriter()
-            writer.add_page(reader.pages[page_num - 1])
-            
-            output_file = os.path.join(output_dir, f'page_{page_num}.pdf')
-            with open(output_file, 'wb') as f:
-                writer.write(f)
-            
-            output_files.append(output_file)
+        outputs = pdf_split.split(
+            input_path, output_dir, mode, value, workers,
+            on_output=pdf_split.progress_printer()
+        )
+        for output in outputs:
+            render_cache.invalidate(output['file'])
         
-        return json.dumps({'type': 'success', 'files': output_files})
+        return json.dumps({
+            'type': 'success',
+            'files': [output['file'] for output in outputs],
+            'outputs': outputs
+        })
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
 
-def rotate_pages(input_path, output_path, rotations):
+def _edit_incrementally(input_path, output_path, edit):
+    """
+    Apply edit(doc) to a fitz document and append the changes to a copy
+    of the input instead of rewriting it; see pdf_incremental.
+    """
+    import pdf_incremental
+    
+    with render.FITZ_LOCK:
+        doc = pdf_incremental.open_document(input_path, output_path, incremental=True)
+        try:
+            edit(doc)
+        except Exception:
+            doc.close()
+            raise
+        save_mode = pdf_incremental.save_document(doc, output_path, incremental=True)
+    render_cache.invalidate(output_path)
+    
+    return json.dumps({'type': 'success', 'output': output_path, 'save_mode': save_mode})
+
+def rotate_pages(input_path, output_path, rotations, incremental=False):
     try:
+        from pdf_pipeline import normalize_rotations
+        
+        # Page numbers arrive as JSON object keys, i.e. strings
+        rotations = normalize_rotations(rotations)
+        if incremental:
+            def rotate(doc):
+                for page_num, angle in rotations.items():
+                    if 1 <= page_num <= len(doc):
+                        page = doc[page_num - 1]
+                        page.set_rotation((page.rotation + angle) % 360)
+            return _edit_incrementally(input_path, output_path, rotate)
+        
+        from PyPDF2 import PdfReader, PdfWriter
+        
         reader = PdfReader(input_path)
         writer = PdfWriter()
         
@@ -116,13 +132,21 @@ def rotate_pages(input_path, output_path, rotations):
         
         with open(output_path, 'wb') as f:
             writer.write(f)
+        render_cache.invalidate(output_path)
         
         return json.dumps({'type': 'success', 'output': output_path})
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
 
-def delete_pages(input_path, output_path, pages_to_delete):
+def delete_pages(input_path, output_path, pages_to_delete, incremental=False):
     try:
+        if incremental:
+            return _edit_incrementally(input_path, output_path, lambda doc: doc.delete_pages(
+                sorted({page_num - 1 for page_num in pages_to_delete if 1 <= page_num <= len(doc)})
+            ))
+        
+        from PyPDF2 import PdfReader, PdfWriter
+        
         reader = PdfReader(input_path)
         writer = PdfWriter()
         
@@ -133,6 +157,7 @@ def delete_pages(input_path, output_path, pages_to_delete):
         
         with open(output_path, 'wb') as f:
             writer.write(f)
+        render_cache.invalidate(output_path)
         
         return json.dumps({'type': 'success', 'output': output_path})
     except Exception as e:
@@ -141,6 +166,8 @@ def delete_pages(input_path, output_path, pages_to_delete):
 def reorder_pages(input_path, output_path, page_order):
     """Reorder PDF pages according to the given order"""
     try:
+        from PyPDF2 import PdfReader, PdfWriter
+        
         reader = PdfReader(input_path)
         writer = PdfWriter()
         
@@ -155,37 +182,24 @@ def reorder_pages(input_path, output_path, page_order):
         
         with open(output_path, 'wb') as f:
             writer.write(f)
+        render_cache.invalidate(output_path)
         
         return json.dumps({'type': 'success', 'output': output_path})
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
 
-def add_watermark(input_path, output_path, watermark_text, position='center'):
+def add_watermark(input_path, output_path, watermark_text, position='center', options=None):
+    """
+    Stamp a text or image watermark on every page. It is built once per
+    page size and shared by all pages; see pdf_watermark for options.
+    """
+    import pdf_watermark
+    
     try:
-        reader = PdfReader(input_path)
-        writer = PdfWriter()
-        
-        for page in reader.pages:
-            packet = io.BytesIO()
-            can = canvas.Canvas(packet, pagesize=letter)
-            
-            can.setFont("Helvetica", 36)
-            can.setFillColorRGB(0.5, 0.5, 0.5, alpha=0.3)
-            
-            if position == 'center':
-                can.drawCentredString(300, 400, watermark_text)
-            
-            can.save()
-            packet.seek(0)
-            
-            watermark = PdfReader(packet)
-            page.merge_page(watermark.pages[0])
-            writer.add_page(page)
-        
-        with open(output_path, 'wb') as f:
-            writer.write(f)
+        pages, forms = pdf_watermark.add_watermark(input_path, output_path, watermark_text, position, options)
+        render_cache.invalidate(output_path)
         
-        return json.dumps({'type': 'success', 'output': output_path})
+        return json.dumps({'type': 'success', 'output': output_path, 'pages': pages, 'forms': forms})
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
 
@@ -201,11 +215,14 @@ def compress_pdf(input_path, output_path, quality='75'):
 
 def encrypt_pdf(input_path, output_path, password):
     try:
+        import pikepdf
+        
         with pikepdf.open(input_path) as pdf:
             pdf.save(output_path, encryption=pikepdf.Encryption(
                 owner=password,
                 user=password
             ))
+        render_cache.invalidate(output_path)
         
         return json.dumps({'type': 'success', 'output': output_path})
     except Exception as e:
@@ -213,15 +230,25 @@ def encrypt_pdf(input_path, output_path, password):
 
 def decrypt_pdf(input_path, output_path, password):
     try:
+        import pikepdf
+        
         with pikepdf.open(input_path, password=password) as pdf:
             pdf.save(output_path)
+        render_cache.invalidate(output_path)
         
         return json.dumps({'type': 'success', 'output': output_path})
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
 
-def reorder_pages(input_path, output_path, page_order):
+def reorder_pages(input_path, output_path, page_order, incremental=False):
     try:
+        from PyPDF2 import PdfReader, PdfWriter
+        
+        if incremental:
+            return _edit_incrementally(input_path, output_path, lambda doc: doc.select(
+                [page_num - 1 for page_num in page_order if 1 <= page_num <= len(doc)]
+            ))
+        
         reader = PdfReader(input_path)
         writer = PdfWriter()
         
@@ -231,84 +258,123 @@ def reorder_pages(input_path, output_path, page_order):
         
         with open(output_path, 'wb') as f:
             writer.write(f)
+        render_cache.invalidate(output_path)
         
         return json.dumps({'type': 'success', 'output': output_path})
     except Exception as e:
         return json.dumps({'type': 'error', 'message': str(e)})
 
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print(json.dumps({'type': 'error', 'message': 'Missing arguments'}))
-        sys.exit(1)
-    
-    command = sys.argv[1]
+def run_pipeline(input_path, output_path, steps):
+    """
+    Apply a list of operations (see pdf_pipeline) in one open/save cycle,
+    checking the whole plan before any of them runs.
+    """
+    import pdf_pipeline
     
+    try:
+        result = pdf_pipeline.run(input_path, output_path, steps)
+        render_cache.invalidate(output_path)
+        
+        return json.dumps({'type': 'success', 'output': output_path, **result})
+    except Exception as e:
+        return json.dumps({'type': 'error', 'message': str(e)})
+
+def run_command(command, args):
+    """Execute one CLI command and return the JSON it would print"""
     if command == 'merge':
-        input_paths = json.loads(sys.argv[2])
-        output_path = sys.argv[3]
-        print(merge_pdfs(input_paths, output_path))
+        input_paths = json.loads(args[0])
+        output_path = args[1]
+        outlines = not (len(args) > 2 and args[2].lower() in ('0', 'false'))
+        links = not (len(args) > 3 and args[3].lower() in ('0', 'false'))
+        return merge_pdfs(input_paths, output_path, outlines, links)
     
     elif command == 'split':
-        input_path = sys.argv[2]
-        output_dir = sys.argv[3]
-        pages = json.loads(sys.argv[4])
-        print(split_pdf(input_path, output_dir, pages))
+        input_path = args[0]
+        output_dir = args[1]
+        value = page_ranges.parse_pages_arg(args[2])
+        mode = args[3] if len(args) > 3 and args[3] else 'pages'
+        workers = int(args[4]) if len(args) > 4 and args[4] else None
+        return split_pdf(input_path, output_dir, value, mode, workers)
     
     elif command == 'rotate':
-        input_path = sys.argv[2]
-        output_path = sys.argv[3]
-        rotations = json.loads(sys.argv[4])
-        print(rotate_pages(input_path, output_path, rotations))
+        input_path = args[0]
+        output_path = args[1]
+        rotations = json.loads(args[2])
+        incremental = len(args) > 3 and args[3].lower() in ('1', 'true', 'incremental')
+        return rotate_pages(input_path, output_path, rotations, incremental)
+    
+    elif command == 'pipeline':
+        input_path = args[0]
+        output_path = args[1]
+        steps = json.loads(args[2])
+        return run_pipeline(input_path, output_path, steps)
     
     elif command == 'delete':
-        input_path = sys.argv[2]
-        output_path = sys.argv[3]
-        pages_to_delete = json.loads(sys.argv[4])
-        print(delete_pages(input_path, output_path, pages_to_delete))
+        input_path = args[0]
+        output_path = args[1]
+        pages_to_delete = json.loads(args[2])
+        incremental = len(args) > 3 and args[3].lower() in ('1', 'true', 'incremental')
+        return delete_pages(input_path, output_path, pages_to_delete, incremental)
     
     elif command == 'reorder':
-        input_path = sys.argv[2]
-        output_path = sys.argv[3]
-        page_order = json.loads(sys.argv[4])
-        print(reorder_pages(input_path, output_path, page_order))
+        input_path = args[0]
+        output_path = args[1]
+        page_order = json.loads(args[2])
+        incremental = len(args) > 3 and args[3].lower() in ('1', 'true', 'incremental')
+        return reorder_pages(input_path, output_path, page_order, incremental)
     
     elif command == 'watermark':
-        input_path = sys.argv[2]
-        output_path = sys.argv[3]
-        text = sys.argv[4]
-        position = sys.argv[5] if len(sys.argv) > 5 else 'center'
-        print(add_watermark(input_path, output_path, text, position))
+        input_path = args[0]
+        output_path = args[1]
+        text = args[2]
+        position = args[3] if len(args) > 3 and args[3] else 'center'
+        options = json.loads(args[4]) if len(args) > 4 and args[4] else None
+        return add_watermark(input_path, output_path, text, position, options)
     
     elif command == 'compress':
-        input_path = sys.argv[2]
-        output_path = sys.argv[3]
-        quality = sys.argv[4] if len(sys.argv) > 4 else 'medium'
-        print(compress_pdf(input_path, output_path, quality))
+        input_path = args[0]
+        output_path = args[1]
+        quality = args[2] if len(args) > 2 else 'medium'
+        return compress_pdf(input_path, output_path, quality)
     
     elif command == 'encrypt':
-        input_path = sys.argv[2]
-        output_path = sys.argv[3]
-        password = sys.argv[4]
-        print(encrypt_pdf(input_path, output_path, password))
+        input_path = args[0]
+        output_path = args[1]
+        password = args[2]
+        return encrypt_pdf(input_path, output_path, password)
     
     elif command == 'decrypt':
-        input_path = sys.argv[2]
-        output_path = sys.argv[3]
-        password = sys.argv[4]
-        print(decrypt_pdf(input_path, output_path, password))
+        input_path = args[0]
+        output_path = args[1]
+        password = args[2]
+        return decrypt_pdf(input_path, output_path, password)
     
     elif command == 'thumbnails':
-        pdf_path = sys.argv[2]
-        print(get_pdf_thumbnails(pdf_path))
-    
-    elif command == 'reorder':
-        input_path = sys.argv[2]
-        output_path = sys.argv[3]
-        page_order = json.loads(sys.argv[4])
-        print(reorder_pages(input_path, output_path, page_order))
+        pdf_path = args[0]
+        start = int(args[1]) if len(args) > 1 else 1
+        count = int(args[2]) if len(args) > 2 else None
+        return get_pdf_thumbnails(pdf_path, start=start, count=count)
     
     elif command == 'page_image':
-        pdf_path = sys.argv[2]
-        page_number = int(sys.argv[3])
-        dpi = int(sys.argv[4]) if len(sys.argv) > 4 else 150
-        print(get_pdf_page_image(pdf_path, page_number, dpi))
+        pdf_path = args[0]
+        page_number = int(args[1])
+        dpi = int(args[2]) if len(args) > 2 else 150
+        return get_pdf_page_image(pdf_path, page_number, dpi)
+    
+    raise ValueError(f'Unknown command: {command}')
+
+if __name__ == '__main__':
+    # Only frozen builds need it, and importing multiprocessing costs startup
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+    
+    if len(sys.argv) < 2:
+        print(json.dumps({'type': 'error', 'message': 'Missing arguments'}))
+        sys.exit(1)
+    
+    try:
+        print(run_command(sys.argv[1], sys.argv[2:]))
+    except Exception as e:
+        print(json.dumps({'type': 'error', 'message': str(e)}))
+        sys.exit(1)
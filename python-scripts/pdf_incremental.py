@@ -0,0 +1,75 @@
+"""
+Incremental Save
+Opening and saving of fitz documents for edits that may be appended to
+the file instead of rewriting it.
+
+A full save garbage-collects, recompresses and rewrites every object,
+so its cost follows the size of the document. An incremental save
+leaves the existing bytes alone and appends only the objects an edit
+changed, so its cost follows the size of the edit. Incremental mode is
+opt-in; the full save remains the one to use for a final, optimized
+export.
+
+In incremental mode a different output path first receives a plain byte
+copy of the input, and the document is opened from that copy. Documents
+MuPDF had to repair on open fall back to a full save.
+
+Earlier revisions stay in the file, including text removed by the
+redactions the text editor uses to replace words. MuPDF therefore
+reports a redacted document as not incrementally saveable; these are
+edits rather than security redactions, so that check is not applied
+here. A full save drops the old revisions before a file is shared.
+"""
+import os
+import shutil
+
+FULL_SAVE_OPTIONS = {'garbage': 4, 'deflate': True, 'clean': True}
+
+
+def is_enabled(arg):
+    """Decode the optional CLI flag that turns incremental mode on"""
+    return str(arg).lower() in ('1', 'true', 'incremental')
+
+
+def open_document(input_path, output_path, incremental=False):
+    """Open the document to edit; callers hold render.FITZ_LOCK around each of their own calls on it"""
+    import fitz
+    import render
+
+    if incremental and os.path.abspath(input_path) != os.path.abspath(output_path):
+        shutil.copyfile(input_path, output_path)
+        input_path = output_path
+    with render.FITZ_LOCK:
+        return fitz.open(input_path)
+
+
+def save_document(doc, output_path, incremental=False):
+    """Save and close doc; returns 'incremental' or 'full' for the result JSON"""
+    import render
+
+    with render.FITZ_LOCK:
+        return _save(doc, output_path, incremental)
+
+
+def _save(doc, output_path, incremental):
+    if incremental and not doc.is_repaired:
+        doc.saveIncr()
+        doc.close()
+        return 'incremental'
+
+    if os.path.abspath(doc.name) != os.path.abspath(output_path):
+        doc.save(output_path, **FULL_SAVE_OPTIONS)
+        doc.close()
+        return 'full'
+
+    # The document was opened from output_path, which cannot be rewritten
+    # while it is being read
+    temp_path = output_path + '.tmp'
+    try:
+        doc.save(temp_path, **FULL_SAVE_OPTIONS)
+        doc.close()
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return 'full'
@@ -0,0 +1,360 @@
+"""
+PDF Merge
+Merges PDFs with pikepdf, sharing identical resources between inputs.
+
+Pages are copied object by object; stream data stays in the source files
+until the output is written, so memory does not grow with input size.
+Fonts, images, ICC profiles and the other indirect objects that page
+resources point to are hashed by content as they are copied. When two
+inputs carry the same object, every page ends up referencing a single
+copy. This matters for statement batches, where each file embeds the same
+logo and fonts.
+
+Outlines are carried over with their destinations remapped to the merged
+page numbers. Link annotations with explicit destinations keep working
+as they are. Named destinations do not survive a merge, so they are
+rewritten as explicit ones.
+"""
+import os
+import json
+import hashlib
+import tempfile
+
+# qpdf reads source streams only when the output is written, so every
+# input stays open until then. Longer lists are merged in groups first to
+# stay under per-process file limits.
+MAX_OPEN_INPUTS = 256
+
+RESOURCE_CATEGORIES = ('/Font', '/XObject', '/ColorSpace', '/Pattern', '/Shading', '/ExtGState')
+
+
+class ResourceDeduplicator:
+    """
+    Maps each indirect object reachable from page resources to the first
+    copy with the same content, hashing dictionaries, arrays and streams
+    recursively so objects that differ only in where they live compare equal.
+
+    Copying a page loads its streams into memory, so resources already in
+    the merged document are detached from the source page before the copy
+    and the shared copy is attached to the merged page afterwards.
+    """
+
+    def __init__(self):
+        self.canonical = {}
+        self.digests = {}
+        self.visited = set()
+        self.shared = 0
+
+    def _digest(self, obj, memo, active=()):
+        import pikepdf
+
+        if not isinstance(obj, pikepdf.Object):
+            return repr(obj).encode('utf-8')
+
+        if obj.is_indirect:
+            objgen = obj.objgen
+            if objgen in memo:
+                return memo[objgen]
+            if objgen in active:
+                # Reference cycle; identity is the best we can do
+                return f'cycle:{objgen}'.encode('ascii')
+            active = active + (objgen,)
+
+        digest = hashlib.sha256()
+        if isinstance(obj, pikepdf.Stream):
+            digest.update(b'stream')
+            for key in sorted(obj.keys()):
+                if key != '/Length':
+                    digest.update(key.encode('utf-8') + self._digest(obj[key], memo, active))
+            digest.update(obj.read_raw_bytes())
+        elif isinstance(obj, pikepdf.Dictionary):
+            digest.update(b'dict')
+            for key in sorted(obj.keys()):
+                digest.update(key.encode('utf-8') + self._digest(obj[key], memo, active))
+        elif isinstance(obj, pikepdf.Array):
+            digest.update(b'array')
+            for item in obj:
+                digest.update(self._digest(item, memo, active))
+        else:
+            digest.update(obj.unparse())
+
+        value = digest.digest()
+        if obj.is_indirect:
+            memo[obj.objgen] = value
+        return value
+
+    def _entries(self, pages):
+        for index, page in enumerate(pages):
+            resources = page.obj.get('/Resources')
+            if resources is None:
+                continue
+            for category in RESOURCE_CATEGORIES:
+                entries = resources.get(category)
+                if entries is None:
+                    continue
+                for name in list(entries.keys()):
+                    yield index, category, entries, name
+
+    def detach(self, source_pages):
+        """
+        Hash the resources of pages about to be copied and remove those the
+        merged document already holds. Returns the plan attach() needs.
+        """
+        memo = {}
+        plan = []
+        for index, category, entries, name in self._entries(source_pages):
+            item = entries[name]
+            if not item.is_indirect:
+                continue
+            digest = self._digest(item, memo)
+            if digest in self.canonical:
+                del entries[name]
+            plan.append((index, category, name, digest))
+        return plan
+
+    def attach(self, merged_pages, plan):
+        """Point copied pages at shared resources and share inside new ones"""
+        import pikepdf
+
+        for index, category, name, digest in plan:
+            resources = merged_pages[index].obj.Resources
+            if category not in resources:
+                resources[category] = pikepdf.Dictionary()
+            entries = resources[category]
+
+            item = entries.get(name)
+            canonical = self.canonical.setdefault(digest, item) if item is not None else self.canonical[digest]
+            if item is None or item.objgen != canonical.objgen:
+                entries[name] = canonical
+                self.shared += 1
+            else:
+                self.share(item)
+
+        # Direct entries, such as inline color space arrays, still hold references
+        for _, _, entries, name in self._entries(merged_pages):
+            item = entries[name]
+            if not item.is_indirect:
+                replacement = self.share(item)
+                if replacement is not item:
+                    entries[name] = replacement
+
+    def share(self, obj):
+        """Return the shared copy of obj, sharing its children when obj is new"""
+        import pikepdf
+
+        if not isinstance(obj, (pikepdf.Dictionary, pikepdf.Array, pikepdf.Stream)):
+            return obj
+
+        if obj.is_indirect:
+            if obj.objgen in self.visited:
+                return obj
+            canonical = self.canonical.setdefault(self._digest(obj, self.digests), obj)
+            if canonical.objgen != obj.objgen:
+                self.shared += 1
+                return canonical
+            self.visited.add(obj.objgen)
+
+        children = enumerate(obj) if isinstance(obj, pikepdf.Array) else ((key, obj[key]) for key in list(obj.keys()))
+        for key, item in list(children):
+            replacement = self.share(item)
+            if replacement is not item:
+                obj[key] = replacement
+        return obj
+
+
+def _page_index(source):
+    return {page.obj.objgen: index for index, page in enumerate(source.pages)}
+
+
+def named_destinations(source):
+    """Named destinations of a document as {name: explicit destination}"""
+    import pikepdf
+
+    names = {}
+    root = source.Root
+    if '/Dests' in root:
+        for name, value in root.Dests.items():
+            names[name.lstrip('/')] = value
+    if '/Names' in root and '/Dests' in root.Names:
+        for name, value in pikepdf.NameTree(root.Names.Dests).items():
+            names[str(name)] = value
+
+    explicit = {}
+    for name, value in names.items():
+        if isinstance(value, pikepdf.Dictionary):
+            value = value.get('/D')
+        if isinstance(value, pikepdf.Array) and len(value):
+            explicit[name] = value
+    return explicit
+
+
+def _resolve(destination, named):
+    """Explicit destination array for a destination that may be a name"""
+    import pikepdf
+
+    if isinstance(destination, (pikepdf.Name, pikepdf.String)):
+        return named.get(str(destination).lstrip('/'))
+    if isinstance(destination, pikepdf.Array) and len(destination):
+        return destination
+    return None
+
+
+def _outline_destination(item, named):
+    import pikepdf
+
+    destination = item.destination
+    if destination is None and item.action is not None and item.action.get('/S') == pikepdf.Name.GoTo:
+        destination = item.action.get('/D')
+    return _resolve(destination, named)
+
+
+def _remap(destination, source_pages, merged, offset):
+    """Destination pointing at the merged copy of its page, or None"""
+    import pikepdf
+
+    if destination is None:
+        return None
+    target = destination[0]
+    if isinstance(target, int):
+        page_number = target
+    elif isinstance(target, pikepdf.Dictionary):
+        page_number = source_pages.get(target.objgen)
+    else:
+        page_number = None
+    if page_number is None or page_number >= len(merged.pages) - offset:
+        return None
+    return pikepdf.Array([merged.pages[offset + page_number].obj] + list(destination)[1:])
+
+
+def _copy_outline(items, source_pages, named, merged, offset):
+    """Rebuild outline items so they point at pages of the merged document"""
+    from pikepdf import OutlineItem
+
+    copies = []
+    for item in items:
+        destination = _remap(_outline_destination(item, named), source_pages, merged, offset)
+        copy = OutlineItem(item.title, destination) if destination is not None else OutlineItem(item.title)
+        copy.is_closed = item.is_closed
+        copy.children.extend(_copy_outline(item.children, source_pages, named, merged, offset))
+        copies.append(copy)
+    return copies
+
+
+def _rewrite_links(pages, named, source_pages, merged, offset, remove_links):
+    """Replace named link destinations with explicit ones, or drop internal links"""
+    import pikepdf
+
+    for page in pages:
+        annotations = page.obj.get('/Annots')
+        if annotations is None:
+            continue
+
+        kept = []
+        for annotation in annotations:
+            if annotation.get('/Subtype') != pikepdf.Name.Link:
+                kept.append(annotation)
+                continue
+
+            action = annotation.get('/A')
+            internal = '/Dest' in annotation or (
+                action is not None and action.get('/S') == pikepdf.Name.GoTo
+            )
+            if not internal:
+                kept.append(annotation)
+                continue
+            if remove_links:
+                continue
+
+            # Explicit destinations were remapped by the page copy itself
+            holder, key = (annotation, '/Dest') if '/Dest' in annotation else (action, '/D')
+            if isinstance(holder.get(key), (pikepdf.Name, pikepdf.String)):
+                destination = _remap(_resolve(holder[key], named), source_pages, merged, offset)
+                if destination is not None:
+                    holder[key] = destination
+            kept.append(annotation)
+
+        if len(kept) != len(annotations):
+            page.obj.Annots = pikepdf.Array(kept)
+
+
+def _merge_open(input_paths, output_path, outlines, links, on_input):
+    import pikepdf
+
+    merged = pikepdf.new()
+    deduplicator = ResourceDeduplicator()
+    outline_items = []
+    sources = []
+
+    try:
+        for index, input_path in enumerate(input_paths, start=1):
+            source = pikepdf.open(input_path, access_mode=pikepdf.AccessMode.stream)
+            sources.append(source)
+            offset = len(merged.pages)
+
+            plan = deduplicator.detach(source.pages)
+            merged.pages.extend(source.pages)
+            copied = merged.pages[offset:]
+            deduplicator.attach(copied, plan)
+
+            named = named_destinations(source) if outlines or links else {}
+            source_pages = _page_index(source)
+            _rewrite_links(copied, named, source_pages, merged, offset, remove_links=not links)
+            if outlines:
+                with source.open_outline() as outline:
+                    outline_items.extend(_copy_outline(outline.root, source_pages, named, merged, offset))
+
+            on_input(index, input_path)
+
+        if outline_items:
+            with merged.open_outline() as outline:
+                outline.root.extend(outline_items)
+
+        merged.save(output_path, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+        return {'pages': len(merged.pages), 'shared_objects': deduplicator.shared}
+    finally:
+        merged.close()
+        for source in sources:
+            source.close()
+
+
+def merge(input_paths, output_path, outlines=True, links=True, on_input=None):
+    """
+    Merge input_paths into output_path and return {'pages', 'shared_objects'}.
+    on_input(completed, path) is called as each input is copied. With
+    outlines False bookmarks are dropped; with links False link annotations
+    pointing inside the document are dropped.
+    """
+    on_input = on_input or (lambda completed, path: None)
+    if len(input_paths) <= MAX_OPEN_INPUTS:
+        return _merge_open(input_paths, output_path, outlines, links, on_input)
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.TemporaryDirectory(dir=output_dir) as work_dir:
+        parts = []
+        shared = 0
+        for start in range(0, len(input_paths), MAX_OPEN_INPUTS):
+            group = input_paths[start:start + MAX_OPEN_INPUTS]
+            part = os.path.join(work_dir, f'part_{len(parts):04d}.pdf')
+            result = _merge_open(
+                group, part, outlines, links,
+                lambda completed, path: on_input(start + completed, path)
+            )
+            shared += result['shared_objects']
+            parts.append(part)
+
+        result = merge(parts, output_path, outlines, links)
+        result['shared_objects'] += shared
+        return result
+
+
+def progress_printer(total):
+    """on_input callback printing the JSON progress events the app listens for"""
+    def report(completed, path):
+        print(json.dumps({
+            'type': 'progress',
+            'progress': (completed / total) * 100,
+            'completed': completed,
+            'total': total,
+            'file': path
+        }), flush=True)
+    return report
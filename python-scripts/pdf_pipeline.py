@@ -0,0 +1,179 @@
+"""
+PDF Pipeline
+Applies a list of page operations to a PDF in one open/save cycle.
+
+A plan is a JSON list of steps, each an object with an "op" and its
+parameters:
+    {"op": "decrypt", "password": "..."}            first step only
+    {"op": "rotate", "pages": {"1": 90, "3": -90}}  angles add to the current rotation
+    {"op": "delete", "pages": [2, 5]}
+    {"op": "reorder", "order": [3, 1, 2]}           pages left out are dropped
+    {"op": "watermark", "text": "...", "position": "center", "options": {...}}
+    {"op": "encrypt", "password": "..."}            last step only
+
+Page numbers are 1-based and refer to the document as it stands when the
+step runs, after earlier deletes and reorders. The whole plan is checked
+against the page count before any step runs, so a bad step late in the
+plan fails the command without doing any work.
+"""
+import time
+
+
+def normalize_rotations(rotations):
+    """
+    Turn {page: angle} as decoded from JSON, where keys are strings, into
+    {int page: int angle}, rejecting angles that are not multiples of 90.
+    """
+    normalized = {}
+    for page, angle in dict(rotations).items():
+        page, angle = int(page), int(angle)
+        if angle % 90:
+            raise ValueError(f'Rotation must be a multiple of 90 degrees: {angle}')
+        normalized[page] = angle
+    return normalized
+
+
+def _check_pages(pages, page_count):
+    for page in pages:
+        if not 1 <= page <= page_count:
+            raise ValueError(f'invalid page number {page} (document has {page_count} pages)')
+
+
+def _validate_decrypt(step, page_count, index, total):
+    if index != 0:
+        raise ValueError('decrypt must be the first step')
+    return page_count
+
+
+def _validate_rotate(step, page_count, index, total):
+    _check_pages(normalize_rotations(step['pages']), page_count)
+    return page_count
+
+
+def _validate_delete(step, page_count, index, total):
+    pages = {int(page) for page in step['pages']}
+    _check_pages(pages, page_count)
+    if len(pages) >= page_count:
+        raise ValueError('cannot delete every page')
+    return page_count - len(pages)
+
+
+def _validate_reorder(step, page_count, index, total):
+    order = [int(page) for page in step['order']]
+    _check_pages(order, page_count)
+    if not order:
+        raise ValueError('order is empty')
+    if len(set(order)) != len(order):
+        raise ValueError('a page is listed more than once')
+    return len(order)
+
+
+def _validate_watermark(step, page_count, index, total):
+    import pdf_watermark
+
+    position = step.get('position') or 'center'
+    if position not in pdf_watermark.POSITIONS:
+        raise ValueError(f'Unknown watermark position: {position}')
+    if not step.get('text') and not (step.get('options') or {}).get('image'):
+        raise ValueError('needs text or an image')
+    return page_count
+
+
+def _validate_encrypt(step, page_count, index, total):
+    if index != total - 1:
+        raise ValueError('encrypt must be the last step')
+    if not step.get('password'):
+        raise ValueError('password is empty')
+    return page_count
+
+
+def _apply_rotate(pdf, step, save_options):
+    for page, angle in normalize_rotations(step['pages']).items():
+        pdf.pages[page - 1].rotate(angle, relative=True)
+
+
+def _apply_delete(pdf, step, save_options):
+    for page in sorted({int(page) for page in step['pages']}, reverse=True):
+        del pdf.pages[page - 1]
+
+
+def _apply_reorder(pdf, step, save_options):
+    pages = list(pdf.pages)
+    ordered = [pages[int(page) - 1] for page in step['order']]
+    del pdf.pages[:]
+    for page in ordered:
+        pdf.pages.append(page)
+
+
+def _apply_watermark(pdf, step, save_options):
+    import pdf_watermark
+
+    stamper = pdf_watermark.Stamper(pdf, step.get('text') or '', step.get('position') or 'center', step.get('options'))
+    for page in pdf.pages:
+        stamper.stamp(page)
+
+
+def _apply_encrypt(pdf, step, save_options):
+    import pikepdf
+
+    save_options['encryption'] = pikepdf.Encryption(owner=step['password'], user=step['password'])
+
+
+# op -> (validate, apply); decrypt is applied when the file is opened
+OPERATIONS = {
+    'decrypt': (_validate_decrypt, None),
+    'rotate': (_validate_rotate, _apply_rotate),
+    'delete': (_validate_delete, _apply_delete),
+    'reorder': (_validate_reorder, _apply_reorder),
+    'watermark': (_validate_watermark, _apply_watermark),
+    'encrypt': (_validate_encrypt, _apply_encrypt),
+}
+
+
+def validate(steps, page_count):
+    """Check every step of the plan; returns the final page count"""
+    if not isinstance(steps, list) or not steps:
+        raise ValueError('The pipeline needs at least one step')
+
+    for index, step in enumerate(steps):
+        op = step.get('op') if isinstance(step, dict) else None
+        if op not in OPERATIONS:
+            raise ValueError(f'Step {index + 1}: unknown operation {op!r}')
+        try:
+            page_count = OPERATIONS[op][0](step, page_count, index, len(steps))
+        except KeyError as e:
+            raise ValueError(f'Step {index + 1} ({op}): missing {e.args[0]!r}')
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'Step {index + 1} ({op}): {e}')
+    return page_count
+
+
+def run(input_path, output_path, steps):
+    """
+    Validate and apply steps, writing the result to output_path once.
+    Returns per-step timings in milliseconds and the final page count.
+    """
+    import pikepdf
+
+    start = time.perf_counter()
+    password = steps[0].get('password', '') if steps and isinstance(steps[0], dict) \
+        and steps[0].get('op') == 'decrypt' else ''
+
+    with pikepdf.open(input_path, password=password, allow_overwriting_input=True) as pdf:
+        validate(steps, len(pdf.pages))
+        timings = {'open': round((time.perf_counter() - start) * 1000, 2)}
+
+        step_timings = []
+        save_options = {}
+        for step in steps:
+            step_start = time.perf_counter()
+            apply = OPERATIONS[step['op']][1]
+            if apply is not None:
+                apply(pdf, step, save_options)
+            step_timings.append({'op': step['op'], 'ms': round((time.perf_counter() - step_start) * 1000, 2)})
+
+        save_start = time.perf_counter()
+        pdf.save(output_path, **save_options)
+        timings['save'] = round((time.perf_counter() - save_start) * 1000, 2)
+
+        return {'pages': len(pdf.pages), 'steps': step_timings, 'timings': timings}
@@ -0,0 +1,395 @@
+"""
+PDF Split
+Splits a PDF into several files with pikepdf.
+
+Modes:
+    pages      - one file per listed page
+    ranges     - one file per range of a spec such as "1-3,4-10,11-"
+    chunk      - files of a fixed number of pages
+    bookmarks  - one file per outline entry at a given level, named after it
+    size       - consecutive pages packed into files of at most N bytes
+
+The input is parsed once to plan the outputs, which are then written by a
+pool of processes. Each worker opens the input a single time and writes
+many outputs from it. Every output holds only the objects its pages use:
+resource entries a page's content never names are left out, and links
+pointing at pages outside the output are dropped instead of pulling those
+pages in.
+"""
+import os
+import re
+import json
+
+import page_ranges
+
+SPLIT_MODES = ('pages', 'ranges', 'chunk', 'bookmarks', 'size')
+RESOURCE_CATEGORIES = ('/Font', '/XObject', '/ColorSpace', '/Pattern', '/Shading', '/ExtGState', '/Properties')
+
+# Names in content streams, including inside strings; extra names only
+# make pruning keep an entry it could have dropped
+NAME_PATTERN = re.compile(rb'/([^\s/\[\]()<>{}%]*)')
+NAME_ESCAPE = re.compile(r'#([0-9A-Fa-f]{2})')
+
+# Starting a worker costs more than writing a few small files
+MIN_OUTPUTS_PER_WORKER = 8
+
+# Rough serialized size of a PDF object besides its stream data
+OBJECT_OVERHEAD = 64
+
+
+def _content_names(page):
+    import pikepdf
+
+    contents = page.obj.get('/Contents')
+    if contents is None:
+        return set()
+
+    streams = contents if isinstance(contents, pikepdf.Array) else [contents]
+    names = set()
+    for stream in streams:
+        for raw in NAME_PATTERN.findall(stream.read_bytes()):
+            name = NAME_ESCAPE.sub(lambda match: chr(int(match.group(1), 16)), raw.decode('latin-1'))
+            names.add('/' + name)
+    return names
+
+
+def _pruned_resources(page):
+    """Direct copy of the page resources without entries the content never names"""
+    import pikepdf
+
+    resources = page.obj.get('/Resources')
+    if resources is None:
+        return None
+
+    names = _content_names(page)
+    pruned = pikepdf.Dictionary()
+    for key, value in resources.items():
+        if key in RESOURCE_CATEGORIES and isinstance(value, pikepdf.Dictionary):
+            pruned[key] = pikepdf.Dictionary({name: value[name] for name in names if name in value})
+        else:
+            pruned[key] = value
+    return pruned
+
+
+def _link_target(annotation):
+    import pikepdf
+
+    destination = annotation.get('/Dest')
+    action = annotation.get('/A')
+    if destination is None and action is not None and action.get('/S') == pikepdf.Name.GoTo:
+        destination = action.get('/D')
+    if isinstance(destination, pikepdf.Array) and len(destination) and isinstance(destination[0], pikepdf.Dictionary):
+        return destination[0].objgen
+    return None
+
+
+def _kept_annotations(page, included):
+    """Annotations of page minus links to pages not in included, or None if unchanged"""
+    import pikepdf
+
+    annotations = page.obj.get('/Annots')
+    if annotations is None:
+        return None
+
+    kept = [
+        annotation for annotation in annotations
+        if annotation.get('/Subtype') != pikepdf.Name.Link
+        or _link_target(annotation) in (None, *included)
+    ]
+    return pikepdf.Array(kept) if len(kept) != len(annotations) else None
+
+
+def write_output(source_pages, page_indexes, output_path):
+    """
+    Write the pages at page_indexes (0-based) to output_path. source_pages
+    is list(pdf.pages) of the open input; indexing pdf.pages directly
+    walks the page tree on every lookup.
+    """
+    import pikepdf
+
+    pages = [source_pages[index] for index in page_indexes]
+    included = {page.obj.objgen for page in pages}
+
+    # Swap in pruned resources and annotations for the copy, then restore
+    # them, since they may be shared with pages of other outputs
+    originals = []
+    for page in pages:
+        original = {key: page.obj.get(key) for key in ('/Resources', '/Annots')}
+        resources = _pruned_resources(page)
+        annotations = _kept_annotations(page, included)
+        if resources is not None:
+            page.obj.Resources = resources
+        if annotations is not None:
+            page.obj.Annots = annotations
+        originals.append((page, original))
+
+    try:
+        with pikepdf.new() as output:
+            output.pages.extend(pages)
+            output.save(output_path, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+    finally:
+        for page, original in originals:
+            for key, value in original.items():
+                if value is not None:
+                    page.obj[key] = value
+    return os.path.getsize(output_path)
+
+
+def _safe_name(title):
+    name = re.sub(r'[^\w\- ]+', '_', title).strip(' _')
+    return name[:80] or 'untitled'
+
+
+def _outline_starts(source, level):
+    """(page index, title) of outline entries at level, in page order"""
+    import pikepdf
+    import pdf_merge
+
+    named = pdf_merge.named_destinations(source)
+    page_index = {page.obj.objgen: index for index, page in enumerate(source.pages)}
+    starts = []
+
+    def visit(items, depth):
+        for item in items:
+            if depth == level:
+                destination = item.destination
+                if destination is None and item.action is not None and item.action.get('/S') == pikepdf.Name.GoTo:
+                    destination = item.action.get('/D')
+                if isinstance(destination, (pikepdf.Name, pikepdf.String)):
+                    destination = named.get(str(destination).lstrip('/'))
+                if isinstance(destination, pikepdf.Array) and len(destination):
+                    target = destination[0]
+                    index = target if isinstance(target, int) else page_index.get(target.objgen)
+                    if index is not None:
+                        starts.append((index, item.title))
+            else:
+                visit(item.children, depth + 1)
+
+    with source.open_outline() as outline:
+        visit(outline.root, 1)
+    return sorted(starts, key=lambda start: start[0])
+
+
+def _page_objects(page, sizes, children):
+    """Object ids reachable from a page's pruned resources and contents"""
+    import pikepdf
+
+    def walk(obj, found):
+        if isinstance(obj, pikepdf.Object) and obj.is_indirect:
+            objgen = obj.objgen
+            if objgen in found:
+                return
+            found.add(objgen)
+            if objgen in children:
+                for child in children[objgen]:
+                    walk(child, found)
+                return
+
+            items = []
+            collect(obj, items)
+            children[objgen] = items
+            size = OBJECT_OVERHEAD
+            if isinstance(obj, pikepdf.Stream):
+                size += int(obj.get('/Length', 0))
+            sizes[objgen] = size
+            for child in items:
+                walk(child, found)
+        else:
+            items = []
+            collect(obj, items)
+            for child in items:
+                walk(child, found)
+
+    def collect(obj, items):
+        # Direct children of obj, stopping at pages so /P and /Parent do not
+        # drag the whole document in
+        if isinstance(obj, pikepdf.Array):
+            values = list(obj)
+        elif isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)):
+            values = [obj[key] for key in obj.keys() if key not in ('/P', '/Parent')]
+        else:
+            return
+        for value in values:
+            if isinstance(value, pikepdf.Dictionary) and value.get('/Type') == pikepdf.Name.Page:
+                continue
+            if isinstance(value, (pikepdf.Array, pikepdf.Dictionary, pikepdf.Stream)):
+                items.append(value)
+
+    found = set()
+    walk(_pruned_resources(page) or pikepdf.Dictionary(), found)
+    walk(page.obj.get('/Contents'), found)
+    return found
+
+
+def _plan_by_size(source, max_bytes):
+    """Group consecutive pages so each group's estimated size stays under max_bytes"""
+    sizes, children = {}, {}
+    groups = []
+    current, objects, total = [], set(), 0
+
+    for index, page in enumerate(source.pages):
+        page_objects = _page_objects(page, sizes, children)
+        added = sum(sizes[objgen] for objgen in page_objects - objects)
+        if current and total + added > max_bytes:
+            groups.append(current)
+            current, objects, total = [], set(), 0
+            added = sum(sizes[objgen] for objgen in page_objects)
+        current.append(index)
+        objects |= page_objects
+        total += added
+
+    if current:
+        groups.append(current)
+    return groups
+
+
+def plan(source, mode, value):
+    """List of (file name, 0-based page indexes) for a split of an open source"""
+    total = len(source.pages)
+
+    if mode == 'pages':
+        numbers = [number for number in page_ranges.parse_pages(value) if 1 <= number <= total]
+        return [(f'page_{number}.pdf', [number - 1]) for number in numbers]
+
+    if mode == 'ranges':
+        parts = value if isinstance(value, list) else str(value).split(',')
+        outputs = []
+        for part in parts:
+            numbers = page_ranges.parse_pages(str(part), total)
+            if numbers:
+                outputs.append((f'pages_{numbers[0]}-{numbers[-1]}.pdf', [number - 1 for number in numbers]))
+        return outputs
+
+    if mode == 'chunk':
+        size = int(value)
+        if size < 1:
+            raise ValueError(f'Invalid chunk size: {value}')
+        return [
+            (f'pages_{start + 1}-{min(start + size, total)}.pdf', list(range(start, min(start + size, total))))
+            for start in range(0, total, size)
+        ]
+
+    if mode == 'bookmarks':
+        starts = _outline_starts(source, int(value or 1))
+        if not starts:
+            raise ValueError('The document has no bookmarks at that level')
+        if starts[0][0] > 0:
+            starts.insert(0, (0, 'start'))
+
+        outputs = []
+        for number, (start, title) in enumerate(starts, start=1):
+            end = starts[number][0] if number < len(starts) else total
+            if end > start:
+                outputs.append((f'{number:03d}_{_safe_name(title)}.pdf', list(range(start, end))))
+        return outputs
+
+    if mode == 'size':
+        max_bytes = int(value)
+        groups = _plan_by_size(source, max_bytes)
+        return [(f'part_{number:03d}.pdf', group) for number, group in enumerate(groups, start=1)]
+
+    raise ValueError(f'Unknown split mode: {mode}')
+
+
+def _unique_names(outputs):
+    """
+    Suffix repeated file names, such as two ranges covering the same pages,
+    so no two outputs are written to the same file
+    """
+    used = set()
+    unique = []
+    for name, page_indexes in outputs:
+        stem, ext = os.path.splitext(name)
+        candidate, number = name, 1
+        while candidate in used:
+            number += 1
+            candidate = f'{stem}_{number}{ext}'
+        used.add(candidate)
+        unique.append((candidate, page_indexes))
+    return unique
+
+
+_worker_source = None
+_worker_pages = None
+
+
+def _init_split_worker(input_path):
+    global _worker_source, _worker_pages
+    import pikepdf
+    _worker_source = pikepdf.open(input_path)
+    _worker_pages = list(_worker_source.pages)
+
+
+def _write_planned(page_indexes, output_path):
+    return output_path, write_output(_worker_pages, page_indexes, output_path)
+
+
+def split(input_path, output_dir, mode='pages', value=None, workers=None, on_output=None):
+    """
+    Split input_path into output_dir and return a list of
+    {'file', 'pages', 'size'} in plan order. on_output(completed, total,
+    result) is called as each file is written.
+    """
+    import pikepdf
+
+    on_output = on_output or (lambda completed, total, result: None)
+    os.makedirs(output_dir, exist_ok=True)
+
+    with pikepdf.open(input_path) as source:
+        outputs = [
+            (os.path.join(output_dir, name), page_indexes)
+            for name, page_indexes in _unique_names(plan(source, mode, value))
+        ]
+        planned = dict(outputs)
+        workers = max(1, min(workers or os.cpu_count() or 1, -(-len(outputs) // MIN_OUTPUTS_PER_WORKER)))
+
+        results = {}
+
+        def finished(output_path, size):
+            page_indexes = planned[output_path]
+            results[output_path] = {
+                'file': output_path,
+                'pages': [index + 1 for index in page_indexes],
+                'size': size
+            }
+            on_output(len(results), len(outputs), results[output_path])
+
+        if workers == 1:
+            source_pages = list(source.pages)
+            for output_path, page_indexes in outputs:
+                finished(output_path, write_output(source_pages, page_indexes, output_path))
+
+    if workers > 1:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_split_worker,
+            initargs=(input_path,)
+        )
+        try:
+            futures = [
+                executor.submit(_write_planned, page_indexes, output_path)
+                for output_path, page_indexes in outputs
+            ]
+            for future in as_completed(futures):
+                finished(*future.result())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    return [results[output_path] for output_path, _ in outputs]
+
+
+def progress_printer():
+    """on_output callback printing the JSON progress events the app listens for"""
+    def report(completed, total, result):
+        print(json.dumps({
+            'type': 'progress',
+            'progress': (completed / total) * 100,
+            'completed': completed,
+            'total': total,
+            'file': result['file']
+        }), flush=True)
+    return report
@@ -7,44 +7,117 @@ import fitz  # PyMuPDF
 import json
 import sys
 import os
+import time
 from typing import List, Dict, Tuple, Optional
 
+import render_cache
+import pdf_incremental
 
-def replace_text_in_pdf(input_path: str, output_path: str, replacements: List[Dict[str, str]]) -> Dict:
-    try:
-        doc = fitz.open(input_path)
-        total_replacements = 0
-        page_details = []
-        
-        for page_num in range(len(doc)):
+# Font MuPDF writes redaction replacement text in, and its default size
+REDACTION_FONT = 'helv'
+REDACTION_FONT_SIZE = 11
+REDACTION_FIT = 0.98
+
+
+def _redaction_font_size(text: str, rect, font_size: Optional[float]) -> float:
+    """
+    The replaced text's size, shrunk until text fits the rect; MuPDF
+    silently leaves out redaction text that does not fit.
+    """
+    font_size = font_size or REDACTION_FONT_SIZE
+    width = fitz.get_text_length(text, fontname=REDACTION_FONT, fontsize=font_size) if text else 0
+    # Text exactly as wide as the rect is dropped as well, so leave a margin
+    if width > rect.width * REDACTION_FIT:
+        font_size *= rect.width * REDACTION_FIT / width
+    return min(font_size, rect.height)
+
+
+def apply_replacements(doc, replacements: List[Dict[str, str]], match_case: bool = False,
+                       whole_word: bool = False, pages: Optional[List[int]] = None,
+                       page_texts: Optional[Dict[int, str]] = None) -> List[Dict]:
+    """
+    Replace every occurrence of each old_text with its new_text, finding
+    all of them in one pass per page (see text_search). Only the given
+    1-based pages are read when pages is set. page_texts holds the plain
+    text of pages already in the layout index, which then need no text
+    extraction unless they match. Returns {'page', 'replacements'} for
+    each page that changed.
+    """
+    import render
+    import text_search
+    
+    matcher = text_search.Matcher(
+        [replacement.get('old_text', '') for replacement in replacements],
+        match_case=match_case,
+        whole_word=whole_word
+    )
+    page_details = []
+    with render.FITZ_LOCK:
+        page_count = len(doc)
+    page_nums = range(page_count) if pages is None else [page - 1 for page in pages if 1 <= page <= page_count]
+    
+    # The lock is taken per page, so renders of other documents are not
+    # held up for the whole edit
+    for page_num in page_nums:
+        with render.FITZ_LOCK:
             page = doc[page_num]
-            page_replacements = 0
+            matches = text_search.search_page(page, matcher, (page_texts or {}).get(page_num + 1))
+            if not matches:
+                continue
             
-            for replacement in replacements:
-                old_text = replacement.get('old_text', '')
-                new_text = replacement.get('new_text', '')
-                
-                if not old_text:
-                    continue
-                
-                text_instances = page.search_for(old_text)
-                
-                for inst in text_instances:
-                    page.add_redact_annot(inst, text=new_text, fill=(1, 1, 1))
-                    page_replacements += 1
+            for index, rects, font_size in matches:
+                new_text = replacements[index].get('new_text', '')
+                # A match spanning lines is redacted line by line, with the
+                # new text going where the old text started
+                for rect_index, rect in enumerate(rects):
+                    text = new_text if rect_index == 0 else ''
+                    page.add_redact_annot(rect, text=text, fontsize=_redaction_font_size(text, rect, font_size),
+                                          fill=(1, 1, 1))
             
-            if page_replacements > 0:
-                page.apply_redactions()
-                page_details.append({
-                    'page': page_num + 1,
-                    'replacements': page_replacements
-                })
-            
-            total_replacements += page_replacements
+            page.apply_redactions()
+        page_details.append({
+            'page': page_num + 1,
+            'replacements': len(matches)
+        })
+    
+    return page_details
+
+
+def _sharded(workers: Optional[int], incremental: bool) -> bool:
+    """
+    Whether to spread the pages over worker processes (see text_shards);
+    workers of None or 1 edits in this process, 0 uses one worker per CPU.
+    An incremental save appends to the input, so it always runs here.
+    """
+    return workers is not None and workers != 1 and not incremental
+
+
+def replace_text_in_pdf(input_path: str, output_path: str, replacements: List[Dict[str, str]],
+                         incremental: bool = False, match_case: bool = False,
+                         whole_word: bool = False, workers: Optional[int] = None) -> Dict:
+    try:
+        import layout_index
         
-        # Save modified PDF
-        doc.save(output_path, garbage=4, deflate=True, clean=True)
-        doc.close()
+        if _sharded(workers, incremental):
+            import text_shards
+            
+            page_details = text_shards.run(input_path, output_path, 'replace', {
+                'replacements': replacements,
+                'match_case': match_case,
+                'whole_word': whole_word
+            }, workers)
+            save_mode = 'full'
+        else:
+            doc = pdf_incremental.open_document(input_path, output_path, incremental)
+            page_details = apply_replacements(
+                doc, replacements, match_case, whole_word,
+                page_texts=layout_index.cached_texts(input_path)
+            )
+            
+            # Save modified PDF
+            save_mode = pdf_incremental.save_document(doc, output_path, incremental)
+        total_replacements = sum(detail['replacements'] for detail in page_details)
+        render_cache.invalidate(output_path)
         
         return {
             'type': 'success',
@@ -52,7 +125,8 @@ def replace_text_in_pdf(input_path: str, output_path: str, replacements: List[Di
             'total_replacements': total_replacements,
             'pages_modified': len(page_details),
             'page_details': page_details,
-            'output_path': output_path
+            'output_path': output_path,
+            'save_mode': save_mode
         }
         
     except Exception as e:
@@ -62,67 +136,103 @@ def replace_text_in_pdf(input_path: str, output_path: str, replacements: List[Di
         }
 
 
-def update_pdf_content(input_path: str, output_path: str, new_content: str) -> Dict:
+def _insert_line(shape, point, text, span, usable_fonts):
+    """
+    Queue text on shape in the span's font, falling back to the default
+    font when the span's font is not one fitz can insert by name.
+    """
+    color = fitz.sRGB_to_pdf(span["color"])
+    font_name = span["font"]
+    
+    if usable_fonts.get(font_name, True):
+        try:
+            shape.insert_text(point, text, fontsize=span["size"], fontname=font_name, color=color)
+            usable_fonts[font_name] = True
+            return
+        except Exception:
+            usable_fonts[font_name] = False
+    
+    shape.insert_text(point, text, fontsize=span["size"], color=color)
+
+
+def update_pdf_content(input_path: str, output_path: str, new_content: str, incremental: bool = False) -> Dict:
+    """
+    Replace the document's text line by line with the lines of new_content.
+    Each page's layout comes from the layout index, all of its lines are
+    redacted together and the new lines are drawn in one batch at the
+    original baselines, in the font, size and color of each line's first
+    span.
+    """
     try:
-        doc = fitz.open(input_path)
+        import layout_index
+        import render
+        
+        file_identity = render_cache.file_identity(input_path)
+        doc = pdf_incremental.open_document(input_path, output_path, incremental)
         new_lines = new_content.split('\n')
         line_index = 0
+        page_details = []
+        usable_fonts = {}
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            
-            # Get text blocks with position information
-            blocks = page.get_text("dict")["blocks"]
+        with render.FITZ_LOCK:
+            page_count = len(doc)
+        
+        for page_num in range(page_count):
+            if line_index >= len(new_lines):
+                break
             
-            for block in blocks:
-                if "lines" not in block:
-                    continue
+            start = time.perf_counter()
+            with render.FITZ_LOCK:
+                page = doc[page_num]
                 
-                for line in block["lines"]:
-                    if line_index >= len(new_lines):
-                        break
-                    
-                    for span in line["spans"]:
-                        original_rect = fitz.Rect(span["bbox"])
-                        font_size = span["size"]
-                        font_name = span["font"]
-                        color = span["color"]
+                # Positions are all read before the page changes
+                layout, _ = layout_index.page_layout(doc, input_path, page_num + 1, file_identity)
+                rewrites = []
+                for block in layout["blocks"]:
+                    for line in block.get("lines", []):
+                        if line_index >= len(new_lines):
+                            break
+                        spans = line["spans"]
+                        if not spans:
+                            continue
                         
-                        page.add_redact_annot(original_rect, fill=(1, 1, 1))
-                        page.apply_redactions()
-                        
-                        if line_index < len(new_lines):
-                            new_text = new_lines[line_index]
-                            
-                            insert_point = fitz.Point(original_rect.x0, original_rect.y1)
-                            
-                            try:
-                                page.insert_text(
-                                    insert_point,
-                                    new_text,
-                                    fontsize=font_size,
-                                    fontname=font_name,
-                                    color=color
-                                )
-                            except:
-                                page.insert_text(
-                                    insert_point,
-                                    new_text,
-                                    fontsize=font_size,
-                                    color=color
-                                )
-                            
-                            line_index += 1
+                        # One redaction per line: each added annotation makes
+                        # the next one slower to add
+                        rect = fitz.Rect(spans[0]["bbox"])
+                        for span in spans[1:]:
+                            rect |= span["bbox"]
+                        page.add_redact_annot(rect, fill=(1, 1, 1))
+                        rewrites.append((fitz.Point(spans[0]["origin"]), new_lines[line_index], spans[0]))
+                        line_index += 1
+                
+                if not rewrites:
+                    continue
+                
+                page.apply_redactions()
+                shape = page.new_shape()
+                for point, text, span in rewrites:
+                    if text:
+                        _insert_line(shape, point, text, span, usable_fonts)
+                shape.commit()
+            
+            page_details.append({
+                'page': page_num + 1,
+                'lines': len(rewrites),
+                'ms': round((time.perf_counter() - start) * 1000, 2)
+            })
         
         # Save modified PDF
-        doc.save(output_path, garbage=4, deflate=True, clean=True)
-        doc.close()
+        save_mode = pdf_incremental.save_document(doc, output_path, incremental)
+        render_cache.invalidate(output_path)
         
         return {
             'type': 'success',
             'message': 'PDF content updated successfully',
             'lines_processed': line_index,
-            'output_path': output_path
+            'pages_modified': len(page_details),
+            'page_details': page_details,
+            'output_path': output_path,
+            'save_mode': save_mode
         }
         
     except Exception as e:
@@ -132,44 +242,60 @@ def update_pdf_content(input_path: str, output_path: str, new_content: str) -> D
         }
 
 
-def overlay_text_on_pdf(input_path: str, output_path: str, new_content: str) -> Dict:
+def overlay_page(page, lines: List[str]) -> None:
+    """Blank the page's margins-in area and write lines over it"""
+    rect = page.rect
+    
+    white_rect = fitz.Rect(50, 50, rect.width - 50, rect.height - 50)
+    page.draw_rect(white_rect, color=(1, 1, 1), fill=(1, 1, 1))
+    
+    y_position = 70
+    line_height = 14
+    
+    for line in lines:
+        if y_position > rect.height - 70:
+            break
+        
+        insert_point = fitz.Point(60, y_position)
+        page.insert_text(
+            insert_point,
+            line,
+            fontsize=11,
+            fontname="helv",
+            color=(0, 0, 0)
+        )
+        y_position += line_height
+
+
+def overlay_text_on_pdf(input_path: str, output_path: str, new_content: str, incremental: bool = False,
+                        workers: Optional[int] = None) -> Dict:
 
     try:
-        doc = fitz.open(input_path)
         new_lines = new_content.split('\n')
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            
-            rect = page.rect
+        if _sharded(workers, incremental):
+            import text_shards
             
-            white_rect = fitz.Rect(50, 50, rect.width - 50, rect.height - 50)
-            page.draw_rect(white_rect, color=(1, 1, 1), fill=(1, 1, 1))
+            text_shards.run(input_path, output_path, 'overlay', {'lines': new_lines}, workers)
+            save_mode = 'full'
+        else:
+            import render
             
-            y_position = 70
-            line_height = 14
+            doc = pdf_incremental.open_document(input_path, output_path, incremental)
+            with render.FITZ_LOCK:
+                page_count = len(doc)
+            for page_num in range(page_count):
+                with render.FITZ_LOCK:
+                    overlay_page(doc[page_num], new_lines)
             
-            for line in new_lines:
-                if y_position > rect.height - 70:
-                    break
-                
-                insert_point = fitz.Point(60, y_position)
-                page.insert_text(
-                    insert_point,
-                    line,
-                    fontsize=11,
-                    fontname="helv",
-                    color=(0, 0, 0)
-                )
-                y_position += line_height
-        
-        doc.save(output_path, garbage=4, deflate=True, clean=True)
-        doc.close()
+            save_mode = pdf_incremental.save_document(doc, output_path, incremental)
+        render_cache.invalidate(output_path)
         
         return {
             'type': 'success',
             'message': 'Text overlay applied successfully',
-            'output_path': output_path
+            'output_path': output_path,
+            'save_mode': save_mode
         }
         
     except Exception as e:
@@ -179,12 +305,18 @@ def overlay_text_on_pdf(input_path: str, output_path: str, new_content: str) ->
         }
 
 
-def smart_replace_pdf_text(input_path: str, output_path: str, old_content: str, new_content: str) -> Dict:
+def smart_replace_pdf_text(input_path: str, output_path: str, old_content: str, new_content: str,
+                           incremental: bool = False, workers: Optional[int] = None) -> Dict:
     """
-    Smart text replacement using word-level diff detection.
-    Finds specific words/phrases that changed and replaces only those.
+    Smart text replacement using a line and word diff of the editor content
+    (see content_diff). When the content carries page numbers, only the
+    pages whose text changed are searched and redacted, each for its own
+    changes.
     """
     try:
+        import content_diff
+        import layout_index
+        
         # If content is identical, no changes needed
         if old_content.strip() == new_content.strip():
             return {
@@ -193,75 +325,39 @@ def smart_replace_pdf_text(input_path: str, output_path: str, old_content: str,
                 'total_replacements': 0
             }
         
-        doc = fitz.open(input_path)
-        
-        old_words = old_content.split()
-        new_words = new_content.split()
+        changes, unplaced = content_diff.diff_content(old_content, new_content)
         
-
-        replacements = []
-        seen_replacements = set()
-        
-        old_lines = old_content.split('\n')
-        new_lines = new_content.split('\n')
-        
-        for i in range(min(len(old_lines), len(new_lines))):
-            old_line = old_lines[i].strip()
-            new_line = new_lines[i].strip()
+        if _sharded(workers, incremental) and None in changes:
+            # Changes tied to pages are few; only a search of every page
+            # is worth spreading out
+            import text_shards
             
-            if old_line != new_line and old_line and new_line:
-                prefix_len = 0
-                while (prefix_len < min(len(old_line), len(new_line)) and 
-                       old_line[prefix_len] == new_line[prefix_len]):
-                    prefix_len += 1
-                
-                suffix_len = 0
-                while (suffix_len < min(len(old_line) - prefix_len, len(new_line) - prefix_len) and
-                       old_line[-(suffix_len+1)] == new_line[-(suffix_len+1)]):
-                    suffix_len += 1
-                
-                old_changed = old_line[prefix_len:len(old_line)-suffix_len if suffix_len > 0 else len(old_line)].strip()
-                new_changed = new_line[prefix_len:len(new_line)-suffix_len if suffix_len > 0 else len(new_line)].strip()
-                
-                if old_changed and old_changed not in seen_replacements:
-                    replacements.append({
-                        'old_text': old_changed,
-                        'new_text': new_changed
-                    })
-                    seen_replacements.add(old_changed)
-        
-        total_replacements = 0
-        pages_modified = 0
-        
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            page_replacements = 0
-            
-            for replacement in replacements:
-                old_text = replacement['old_text']
-                new_text = replacement['new_text']
-                
-                text_instances = page.search_for(old_text)
-                
-                for inst in text_instances:
-                    page.add_redact_annot(inst, text=new_text, fill=(1, 1, 1))
-                    page_replacements += 1
-            
-            if page_replacements > 0:
-                page.apply_redactions()
-                pages_modified += 1
+            page_details = text_shards.run(input_path, output_path, 'changes', {'changes': changes}, workers)
+            save_mode = 'full'
+        else:
+            doc = pdf_incremental.open_document(input_path, output_path, incremental)
+            page_texts = layout_index.cached_texts(input_path)
+            page_details = []
+            for page, replacements in sorted(changes.items(), key=lambda item: item[0] or 0):
+                page_details.extend(apply_replacements(
+                    doc, replacements, match_case=True, whole_word=True,
+                    pages=None if page is None else [page], page_texts=page_texts
+                ))
             
-            total_replacements += page_replacements
-        
-        doc.save(output_path, garbage=4, deflate=True, clean=True)
-        doc.close()
+            save_mode = pdf_incremental.save_document(doc, output_path, incremental)
+        total_replacements = sum(detail['replacements'] for detail in page_details)
+        pages_modified = len(page_details)
+        render_cache.invalidate(output_path)
         
         return {
             'type': 'success',
             'message': f'PDF updated successfully. {total_replacements} replacements made.',
             'total_replacements': total_replacements,
             'pages_modified': pages_modified,
-            'output_path': output_path
+            'page_details': page_details,
+            'unplaced_lines': unplaced,
+            'output_path': output_path,
+            'save_mode': save_mode
         }
         
     except Exception as e:
@@ -271,62 +367,138 @@ def smart_replace_pdf_text(input_path: str, output_path: str, old_content: str,
         }
 
 
+def extract_layout(pdf_path: str, pages=None) -> Dict:
+    """
+    Print one NDJSON 'layout' line per requested page (a list or a spec
+    such as "1-20"; all by default) as soon as it is ready and return a
+    summary. Pages come from the layout index when they
+    are there; the document is only opened for pages that are not.
+    """
+    import render
+    import page_ranges
+    import layout_index
+    
+    try:
+        total_pages = render.page_count(pdf_path)
+        page_numbers = page_ranges.parse_pages(pages or None, total_pages)
+        file_identity = render_cache.file_identity(pdf_path)
+        doc = None
+        cached_pages = 0
+        
+        try:
+            for page_number in page_numbers:
+                layout = layout_index.get_index().get(file_identity, page_number) if layout_index.enabled() else None
+                cached = layout is not None
+                if not cached:
+                    with render.FITZ_LOCK:
+                        doc = doc or fitz.open(pdf_path)
+                        layout, _ = layout_index.page_layout(doc, pdf_path, page_number, file_identity)
+                cached_pages += cached
+                
+                print(json.dumps({'type': 'layout', 'page': page_number, 'cached': cached, **layout},
+                                 ensure_ascii=False), flush=True)
+        finally:
+            if doc is not None:
+                with render.FITZ_LOCK:
+                    doc.close()
+        
+        return {
+            'type': 'success',
+            'total_pages': total_pages,
+            'pages': len(page_numbers),
+            'cached_pages': cached_pages
+        }
+        
+    except Exception as e:
+        return {
+            'type': 'error',
+            'message': f'Failed to extract layout: {str(e)}'
+        }
+
+
+def run_command(command: str, args: List[str]) -> str:
+    """Execute one CLI command and return the JSON it would print"""
+    if command == 'replace_text':
+        input_path = args[0]
+        output_path = args[1]
+        replacements = json.loads(args[2])
+        incremental = len(args) > 3 and pdf_incremental.is_enabled(args[3])
+        options = json.loads(args[4]) if len(args) > 4 and args[4] else {}
+        
+        result = replace_text_in_pdf(
+            input_path, output_path, replacements, incremental,
+            match_case=bool(options.get('match_case')),
+            whole_word=bool(options.get('whole_word')),
+            workers=options.get('workers')
+        )
+        return json.dumps(result)
+        
+    elif command == 'update_content':
+        input_path = args[0]
+        output_path = args[1]
+        new_content = args[2]
+        incremental = len(args) > 3 and pdf_incremental.is_enabled(args[3])
+        
+        result = update_pdf_content(input_path, output_path, new_content, incremental)
+        return json.dumps(result)
+        
+    elif command == 'smart_replace':
+        input_path = args[0]
+        output_path = args[1]
+        old_content_file = args[2]
+        new_content_file = args[3]
+        incremental = len(args) > 4 and pdf_incremental.is_enabled(args[4])
+        workers = int(args[5]) if len(args) > 5 and args[5] else None
+        
+        with open(old_content_file, 'r', encoding='utf-8') as f:
+            old_content = f.read()
+        with open(new_content_file, 'r', encoding='utf-8') as f:
+            new_content = f.read()
+        
+        result = smart_replace_pdf_text(input_path, output_path, old_content, new_content, incremental, workers)
+        
+        try:
+            os.remove(old_content_file)
+            os.remove(new_content_file)
+        except:
+            pass
+        
+        return json.dumps(result)
+        
+    elif command == 'overlay_text':
+        input_path = args[0]
+        output_path = args[1]
+        new_content = args[2]
+        incremental = len(args) > 3 and pdf_incremental.is_enabled(args[3])
+        workers = int(args[4]) if len(args) > 4 and args[4] else None
+        
+        result = overlay_text_on_pdf(input_path, output_path, new_content, incremental, workers)
+        return json.dumps(result)
+    
+    elif command == 'extract_layout':
+        import page_ranges
+        
+        pdf_path = args[0]
+        pages = page_ranges.parse_pages_arg(args[1]) if len(args) > 1 and args[1] else None
+        
+        result = extract_layout(pdf_path, pages)
+        return json.dumps(result)
+    
+    raise ValueError(f'Unknown command: {command}')
+
+
 if __name__ == '__main__':
+    # Only frozen builds need it, and importing multiprocessing costs startup
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+    
     if len(sys.argv) < 2:
         print(json.dumps({'type': 'error', 'message': 'No command provided'}))
         sys.exit(1)
     
-    command = sys.argv[1]
-    
     try:
-        if command == 'replace_text':
-            input_path = sys.argv[2]
-            output_path = sys.argv[3]
-            replacements = json.loads(sys.argv[4])
-            
-            result = replace_text_in_pdf(input_path, output_path, replacements)
-            print(json.dumps(result))
-            
-        elif command == 'update_content':
-            input_path = sys.argv[2]
-            output_path = sys.argv[3]
-            new_content = sys.argv[4]
-            
-            result = update_pdf_content(input_path, output_path, new_content)
-            print(json.dumps(result))
-            
-        elif command == 'smart_replace':
-            input_path = sys.argv[2]
-            output_path = sys.argv[3]
-            old_content_file = sys.argv[4]
-            new_content_file = sys.argv[5]
-            
-            with open(old_content_file, 'r', encoding='utf-8') as f:
-                old_content = f.read()
-            with open(new_content_file, 'r', encoding='utf-8') as f:
-                new_content = f.read()
-            
-            result = smart_replace_pdf_text(input_path, output_path, old_content, new_content)
-            print(json.dumps(result))
-            
-            try:
-                os.remove(old_content_file)
-                os.remove(new_content_file)
-            except:
-                pass
-            
-        elif command == 'overlay_text':
-            input_path = sys.argv[2]
-            output_path = sys.argv[3]
-            new_content = sys.argv[4]
-            
-            result = overlay_text_on_pdf(input_path, output_path, new_content)
-            print(json.dumps(result))
-            
-        else:
-            print(json.dumps({'type': 'error', 'message': f'Unknown command: {command}'}))
-            sys.exit(1)
-            
+        print(run_command(sys.argv[1], sys.argv[2:]))
     except Exception as e:
         print(json.dumps({'type': 'error', 'message': str(e)}))
         sys.exit(1)
@@ -0,0 +1,177 @@
+"""
+PDF Watermark
+Stamps a text or image watermark on every page with pikepdf.
+
+The watermark is drawn with reportlab once per distinct visible page size
+and embedded as a form XObject. Pages only gain a few bytes of content
+calling it, and the streams doing so are shared as well, so the output
+holds one copy of the watermark however many pages there are. Rotated
+pages get the watermark upright as the reader sees them.
+
+Options:
+    font_size  text size in points (36)
+    color      text color as [r, g, b] in 0..1 ([0.5, 0.5, 0.5])
+    opacity    0..1 (0.3)
+    rotation   degrees counter-clockwise (0)
+    image      path of an image to use instead of text
+    scale      image width as a fraction of the page width (0.5)
+    margin     distance from the page edge for edge positions (36)
+"""
+import io
+
+POSITIONS = {
+    'center': (0.5, 0.5),
+    'top': (0.5, 1), 'bottom': (0.5, 0),
+    'left': (0, 0.5), 'right': (1, 0.5),
+    'top-left': (0, 1), 'top-right': (1, 1),
+    'bottom-left': (0, 0), 'bottom-right': (1, 0),
+}
+
+DEFAULT_OPTIONS = {
+    'font_size': 36,
+    'color': [0.5, 0.5, 0.5],
+    'opacity': 0.3,
+    'rotation': 0,
+    'image': None,
+    'scale': 0.5,
+    'margin': 36,
+}
+
+FONT_NAME = 'Helvetica'
+# Height of Helvetica capitals as a fraction of the font size
+CAP_HEIGHT = 0.72
+
+
+def _content_size(text, options, page_width):
+    """Unrotated (width, height) of the watermark in points"""
+    if options['image']:
+        from PIL import Image
+        with Image.open(options['image']) as image:
+            image_width, image_height = image.size
+        width = page_width * options['scale']
+        return width, width * image_height / image_width
+
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    return stringWidth(text, FONT_NAME, options['font_size']), options['font_size'] * CAP_HEIGHT
+
+
+def build_page(text, position, options, width, height):
+    """A one-page PDF of the given size holding only the watermark"""
+    import math
+    from reportlab.pdfgen import canvas
+
+    if position not in POSITIONS:
+        raise ValueError(f'Unknown watermark position: {position}')
+
+    content_width, content_height = _content_size(text, options, width)
+    angle = math.radians(options['rotation'])
+    # Extent of the rotated watermark, used to keep edge positions on the page
+    extent_x = abs(content_width * math.cos(angle)) + abs(content_height * math.sin(angle))
+    extent_y = abs(content_width * math.sin(angle)) + abs(content_height * math.cos(angle))
+
+    fraction_x, fraction_y = POSITIONS[position]
+    margin = options['margin']
+    center_x = margin + extent_x / 2 + fraction_x * (width - 2 * margin - extent_x)
+    center_y = margin + extent_y / 2 + fraction_y * (height - 2 * margin - extent_y)
+
+    buffer = io.BytesIO()
+    can = canvas.Canvas(buffer, pagesize=(width, height))
+    can.setFillAlpha(options['opacity'])
+    can.translate(center_x, center_y)
+    can.rotate(options['rotation'])
+
+    if options['image']:
+        can.drawImage(
+            options['image'], -content_width / 2, -content_height / 2,
+            content_width, content_height, mask='auto'
+        )
+    else:
+        can.setFont(FONT_NAME, options['font_size'])
+        can.setFillColorRGB(*options['color'])
+        can.drawCentredString(0, -content_height / 2, text)
+
+    can.showPage()
+    can.save()
+    return buffer.getvalue()
+
+
+def _placement(box, rotate):
+    """Matrix drawing a form built at the visible size upright on a page"""
+    llx, lly, urx, ury = box
+    return {
+        0: (1, 0, 0, 1, llx, lly),
+        90: (0, 1, -1, 0, urx, lly),
+        180: (-1, 0, 0, -1, urx, ury),
+        270: (0, -1, 1, 0, llx, ury),
+    }[rotate]
+
+
+class Stamper:
+    """Builds watermark forms on demand and stamps them onto pages of pdf"""
+
+    def __init__(self, pdf, text, position='center', options=None):
+        import pikepdf
+
+        self.pdf = pdf
+        self.text = text
+        self.position = position
+        self.options = {**DEFAULT_OPTIONS, **(options or {})}
+        self.forms = {}
+        self.stamps = {}
+        # Isolates the page's own graphics state from the watermark
+        self.push = pdf.make_stream(b'q\n')
+
+    def _form(self, width, height):
+        import pikepdf
+
+        key = (round(width, 2), round(height, 2))
+        if key not in self.forms:
+            data = build_page(self.text, self.position, self.options, width, height)
+            with pikepdf.open(io.BytesIO(data)) as watermark:
+                form = watermark.pages[0].as_form_xobject()
+                self.forms[key] = self.pdf.copy_foreign(form)
+        return self.forms[key]
+
+    def stamp(self, page):
+        import pikepdf
+
+        box = [float(value) for value in page.cropbox]
+        rotate = int(page.obj.get('/Rotate', 0)) % 360
+        width, height = box[2] - box[0], box[3] - box[1]
+        if rotate in (90, 270):
+            width, height = height, width
+
+        form = self._form(width, height)
+        resources = page.obj.get('/Resources')
+        if resources is None:
+            resources = page.obj.Resources = pikepdf.Dictionary()
+        if '/XObject' not in resources:
+            resources.XObject = pikepdf.Dictionary()
+
+        name = '/Watermark'
+        while name in resources.XObject and resources.XObject[name].objgen != form.objgen:
+            name += '_'
+        resources.XObject[name] = form
+
+        key = (form.objgen, tuple(box), rotate, name)
+        if key not in self.stamps:
+            matrix = ' '.join(f'{value:g}' for value in _placement(box, rotate))
+            self.stamps[key] = self.pdf.make_stream(f'Q q {matrix} cm {name} Do Q\n'.encode('ascii'))
+
+        page.contents_add(self.push, prepend=True)
+        page.contents_add(self.stamps[key])
+
+
+def add_watermark(input_path, output_path, text, position='center', options=None):
+    """
+    Stamp every page of input_path and save to output_path. Returns
+    (pages stamped, watermark forms built).
+    """
+    import pikepdf
+
+    with pikepdf.open(input_path, allow_overwriting_input=True) as pdf:
+        stamper = Stamper(pdf, text, position, options)
+        for page in pdf.pages:
+            stamper.stamp(page)
+        pdf.save(output_path, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+        return len(pdf.pages), len(stamper.forms)
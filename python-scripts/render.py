@@ -0,0 +1,235 @@
+"""
+Page Rendering
+Shared rasterization used by thumbnails, page previews, image export and OCR.
+
+Two backends are available:
+    fitz     - renders in-process with PyMuPDF (default)
+    poppler  - spawns pdftoppm through pdf2image (fallback)
+
+The backend can be forced with the PDF_TOOLS_RENDER_BACKEND environment
+variable. Pages are always produced one at a time, so callers never hold
+more than one decoded bitmap unless they choose to.
+"""
+import io
+import os
+import base64
+import threading
+from contextlib import contextmanager
+
+import render_cache
+
+DEFAULT_BACKEND = 'fitz'
+POPPLER_CHUNK = 8
+THUMBNAIL_DPI = 100
+
+# MuPDF is not thread-safe, so every fitz call in the process, in any
+# script, is made holding this one lock. It is re-entrant, so the helpers
+# here can be used by a caller that already holds it.
+FITZ_LOCK = threading.RLock()
+
+
+class FitzBackend:
+    name = 'fitz'
+    lock = FITZ_LOCK
+
+    def __init__(self):
+        import fitz
+        self.fitz = fitz
+
+    def page_count(self, pdf_path):
+        with self.lock:
+            with self.fitz.open(pdf_path) as doc:
+                return doc.page_count
+
+    def render_pages(self, pdf_path, pages, dpi=None, size=None):
+        from PIL import Image
+
+        with self.lock:
+            doc = self.fitz.open(pdf_path)
+        try:
+            for page_number in pages:
+                with self.lock:
+                    # fitz indexes from the end for negative numbers
+                    if not 1 <= page_number <= doc.page_count:
+                        raise ValueError(f'Invalid page number: {page_number}')
+                    page = doc[page_number - 1]
+                    if size:
+                        rect = page.rect
+                        zoom = min(size[0] / rect.width, size[1] / rect.height)
+                        matrix = self.fitz.Matrix(zoom, zoom)
+                    else:
+                        matrix = self.fitz.Matrix(dpi / 72, dpi / 72)
+                    pixmap = page.get_pixmap(matrix=matrix, alpha=False)
+                    image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+                    pixmap = None
+                yield page_number, image
+        finally:
+            with self.lock:
+                doc.close()
+
+
+class PopplerBackend:
+    name = 'poppler'
+
+    def page_count(self, pdf_path):
+        from pdf2image import pdfinfo_from_path
+        return int(pdfinfo_from_path(pdf_path)['Pages'])
+
+    def render_pages(self, pdf_path, pages, dpi=None, size=None):
+        from PIL import Image
+        from pdf2image import convert_from_path
+
+        invalid = [page for page in pages if page < 1]
+        if invalid:
+            raise ValueError(f'Invalid page number: {invalid[0]}')
+
+        # Contiguous pages are rendered in small chunks to amortize the
+        # pdftoppm spawn without holding the whole document in memory
+        for first, last in _chunks(pages, POPPLER_CHUNK):
+            images = convert_from_path(
+                pdf_path, first_page=first, last_page=last, dpi=THUMBNAIL_DPI if size else dpi
+            )
+            for page_number, image in zip(range(first, last + 1), images):
+                if size:
+                    # pdftoppm's scale-to ignores aspect ratio, so shrink here
+                    image.thumbnail(size, Image.Resampling.LANCZOS)
+                yield page_number, image
+
+
+BACKENDS = {
+    'fitz': FitzBackend,
+    'poppler': PopplerBackend,
+}
+
+_backends = {}
+
+
+def get_backend(name=None):
+    """Return a backend instance, falling back to poppler if fitz is missing"""
+    name = name or os.environ.get('PDF_TOOLS_RENDER_BACKEND') or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown render backend: {name}')
+
+    if name not in _backends:
+        try:
+            _backends[name] = BACKENDS[name]()
+        except ImportError:
+            if name == 'poppler':
+                raise
+            return get_backend('poppler')
+    return _backends[name]
+
+
+def _chunks(pages, limit):
+    """Split sorted page numbers into contiguous (first, last) runs"""
+    first = last = None
+    for page in pages:
+        if first is None:
+            first = last = page
+        elif page == last + 1 and page - first < limit:
+            last = page
+        else:
+            yield first, last
+            first = last = page
+    if first is not None:
+        yield first, last
+
+
+@contextmanager
+def open_document(pdf_path):
+    """
+    Open a PyMuPDF document for reading while holding the fitz lock, for
+    callers that need page data other than pixels.
+    """
+    import fitz
+
+    with FITZ_LOCK:
+        doc = fitz.open(pdf_path)
+        try:
+            yield doc
+        finally:
+            doc.close()
+
+
+def page_count(pdf_path, backend=None):
+    return get_backend(backend).page_count(pdf_path)
+
+
+def iter_pages(pdf_path, pages=None, dpi=150, size=None, backend=None):
+    """
+    Yield (page_number, PIL image) for each requested page in order.
+    pages defaults to the whole document; size=(w, h) fits each page into
+    that box instead of using dpi.
+    """
+    renderer = get_backend(backend)
+    if pages is None:
+        pages = range(1, renderer.page_count(pdf_path) + 1)
+    return renderer.render_pages(pdf_path, pages, dpi=dpi, size=size)
+
+
+def render_page(pdf_path, page_number, dpi=150, backend=None):
+    for _, image in iter_pages(pdf_path, [page_number], dpi=dpi, backend=backend):
+        return image
+    raise ValueError(f'Page not found: {page_number}')
+
+
+def encode(image, fmt='png', **options):
+    """Encode a PIL image and return the bytes"""
+    fmt = fmt.lower()
+    if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    buffered = io.BytesIO()
+    image.save(buffered, format=fmt.upper(), **options)
+    return buffered.getvalue()
+
+
+def data_url(data, fmt='png'):
+    img_str = base64.b64encode(data).decode()
+    return f'data:image/{fmt};base64,{img_str}'
+
+
+def page_image(pdf_path, page_number, dpi=150):
+    """PNG bytes of one page, served from the render cache when possible"""
+    if page_number < 1:
+        raise ValueError(f'Invalid page number: {page_number}')
+
+    variant = f'dpi{dpi}'
+    data = render_cache.lookup(pdf_path, page_number, variant, 'png')
+
+    if data is None:
+        data = encode(render_page(pdf_path, page_number, dpi), 'png')
+        render_cache.store(pdf_path, page_number, variant, 'png', data)
+    return data
+
+
+def iter_thumbnails(pdf_path, pages, box, fmt='png', **options):
+    """
+    Yield (page_number, bytes) with every page fitted into box, in order and
+    as soon as each page is ready. Cached pages are reused; only one decoded
+    bitmap is alive at a time however many pages are requested.
+    """
+    variant = f'thumb{box[0]}x{box[1]}'
+    pending = []
+
+    def render_pending():
+        for page, image in iter_pages(pdf_path, pending, size=box):
+            data = encode(image, fmt, **options)
+            render_cache.store(pdf_path, page, variant, fmt, data)
+            yield page, data
+        pending.clear()
+
+    for page in pages:
+        data = render_cache.lookup(pdf_path, page, variant, fmt)
+        if data is None:
+            pending.append(page)
+            continue
+
+        # Flush earlier misses first so output stays in page order
+        if pending:
+            yield from render_pending()
+        yield page, data
+
+    if pending:
+        yield from render_pending()
+
@@ -0,0 +1,218 @@
+"""
+Render Cache
+Two-level (memory + disk) LRU cache for rendered page images and thumbnails.
+
+Entries are keyed by the file identity (mtime + size + inode, or a content
+hash), page number, a render variant such as the DPI or thumbnail box, and
+the image format. On disk they are grouped per source path, so editing
+commands can drop everything rendered from a file they just rewrote:
+
+    render_cache.invalidate(output_path)
+"""
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_BYTES = 512 * 1024 * 1024
+
+
+def cache_root():
+    """Base directory shared by all on-disk caches"""
+    return os.environ.get('PDF_TOOLS_CACHE_DIR') or os.path.join(
+        tempfile.gettempdir(), 'pdf-tools-cache'
+    )
+
+
+def file_identity(path, content_hash=False):
+    """
+    Identify a file's current contents. The cheap form uses mtime, size and
+    inode; content_hash=True hashes the bytes for callers that need to
+    survive copies and touch-without-change.
+    """
+    if content_hash:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    stat = os.stat(path)
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}-{stat.st_ino:x}'
+
+
+def _path_key(path):
+    return hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, directory=None, memory_bytes=DEFAULT_MEMORY_BYTES,
+                 disk_bytes=DEFAULT_DISK_BYTES, content_hash=False):
+        self.directory = directory or os.path.join(cache_root(), 'render')
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.content_hash = content_hash
+
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.disk_used = None
+
+    def _entry(self, path, page, variant, fmt):
+        path_key = _path_key(path)
+        identity = file_identity(path, self.content_hash)
+
+        key = (path_key, identity, page, variant, fmt)
+        file_path = os.path.join(self.directory, path_key, identity, f'{page}_{variant}.{fmt}')
+        return key, file_path
+
+    def get(self, path, page, variant, fmt):
+        """Return cached image bytes or None"""
+        key, file_path = self._entry(path, page, variant, fmt)
+
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+                return data
+
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            # Touch so disk eviction sees this entry as recently used
+            os.utime(file_path)
+        except OSError:
+            return None
+
+        self._remember(key, data)
+        return data
+
+    def put(self, path, page, variant, fmt, data):
+        key, file_path = self._entry(path, page, variant, fmt)
+        self._remember(key, data)
+
+        identity_dir = os.path.dirname(file_path)
+        path_dir = os.path.dirname(identity_dir)
+        try:
+            if os.path.isdir(path_dir):
+                # Renders of older versions of this file can never hit again
+                for stale in os.listdir(path_dir):
+                    if stale != key[1]:
+                        shutil.rmtree(os.path.join(path_dir, stale), ignore_errors=True)
+
+            os.makedirs(identity_dir, exist_ok=True)
+            tmp_path = f'{file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, file_path)
+        except OSError:
+            # The disk level is best effort; memory still serves this process
+            return
+
+        with self.lock:
+            if self.disk_used is None:
+                self.disk_used = self._scan_disk_usage()
+            else:
+                self.disk_used += len(data)
+            over_budget = self.disk_used > self.disk_bytes
+
+        if over_budget:
+            self._evict_disk()
+
+    def invalidate(self, path):
+        """Forget everything rendered from path"""
+        path_key = _path_key(path)
+
+        with self.lock:
+            for key in [k for k in self.memory if k[0] == path_key]:
+                self.memory_used -= len(self.memory.pop(key))
+            self.disk_used = None
+
+        shutil.rmtree(os.path.join(self.directory, path_key), ignore_errors=True)
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.memory_used = 0
+            self.disk_used = None
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _remember(self, key, data):
+        with self.lock:
+            if key in self.memory:
+                self.memory_used -= len(self.memory.pop(key))
+            self.memory[key] = data
+            self.memory_used += len(data)
+
+            while self.memory_used > self.memory_bytes and self.memory:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_used -= len(evicted)
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                file_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, file_path
+
+    def _scan_disk_usage(self):
+        return sum(size for _, size, _ in self._disk_entries())
+
+    def _evict_disk(self):
+        """Drop least recently used files until the disk level fits again"""
+        entries = sorted(self._disk_entries())
+        used = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * 0.9
+
+        for _, size, file_path in entries:
+            if used <= target:
+                break
+            try:
+                os.remove(file_path)
+                used -= size
+            except OSError:
+                pass
+
+        with self.lock:
+            self.disk_used = used
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def enabled():
+    return os.environ.get('PDF_TOOLS_RENDER_CACHE', '1') != '0'
+
+
+def get_cache():
+    """Process-wide cache instance, shared by worker threads"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RenderCache()
+        return _cache
+
+
+def lookup(path, page, variant, fmt):
+    """Cached bytes for a render, or None on a miss or when caching is off"""
+    if not enabled():
+        return None
+    return get_cache().get(path, page, variant, fmt)
+
+
+def store(path, page, variant, fmt, data):
+    if enabled():
+        get_cache().put(path, page, variant, fmt, data)
+
+
+def invalidate(path):
+    """Drop cached renders for a file that was just written"""
+    if path:
+        get_cache().invalidate(path)
@@ -0,0 +1,542 @@
+"""
+Search Index
+Full-text search over the document library without opening the PDFs.
+
+Each page's text goes into an SQLite FTS5 index under the shared cache
+root, with the boxes of its words so hits can be highlighted on the page.
+Pages with a usable text layer are indexed from it; scanned pages take the
+text a previous OCR run left in the OCR cache. Pages with neither are
+indexed with whatever text they have and marked pending, and are picked up
+again once they have been recognized.
+
+Indexing is incremental. A file whose mtime and size are unchanged is
+skipped without being read; one whose contents hash is unchanged only has
+its stat updated. Changed files are extracted on a process pool, and the
+parent process writes the results.
+
+Usage:
+    python search_index.py index '["a.pdf", "library/"]' [workers] [languages] [prune]
+    python search_index.py query "search words" [limit] [offset]
+    python search_index.py remove '["a.pdf"]'
+    python search_index.py stats
+"""
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import array
+import sqlite3
+import unicodedata
+
+import render_cache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    pages INTEGER NOT NULL,
+    pending INTEGER NOT NULL,
+    error TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    page INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    width REAL NOT NULL,
+    height REAL NOT NULL,
+    boxes BLOB,
+    UNIQUE (file_id, page)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS page_text USING fts5(
+    text, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# Results written per transaction while indexing
+COMMIT_EVERY = 64
+
+# Word boxes are stored as unsigned 16-bit coordinates in half points
+BOX_SCALE = 2
+BOX_MAX = 65535
+
+SNIPPET_TOKENS = 16
+# Snippet match markers; control characters never occur in indexed text
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+QUERY_PART = re.compile(r'"([^"]*)"?|(\S+)')
+TOKEN = re.compile(r'[^\W_]+')
+
+
+def index_path():
+    return os.path.join(render_cache.cache_root(), 'search.sqlite3')
+
+
+def connect(path=None):
+    path = path or index_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, timeout=30)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.executescript(SCHEMA)
+    return db
+
+
+def _fold(text):
+    """Case and accent folding matching the index's tokenizer"""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    if decomposed.isascii():
+        return decomposed
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _tokens(text):
+    return TOKEN.findall(_fold(text))
+
+
+def parse_query(query):
+    """
+    (FTS5 query, terms) for user input: bare words must all occur, "quoted
+    words" must occur together and a trailing * matches any word starting
+    with what comes before it. terms holds (token, prefix) pairs for
+    finding the matched words on a page.
+    """
+    phrases = []
+    terms = []
+    for match in QUERY_PART.finditer(query):
+        quoted, bare = match.groups()
+        part = quoted if quoted is not None else bare
+        prefix = quoted is None and part.endswith('*')
+        tokens = _tokens(part)
+        if not tokens:
+            continue
+        # A word such as "INV-0042" is several tokens, searched as a phrase
+        phrases.append('"' + ' '.join(tokens) + '"' + ('*' if prefix else ''))
+        terms.extend((token, prefix and position == len(tokens) - 1) for position, token in enumerate(tokens))
+
+    if not phrases:
+        raise ValueError('Search query has no words')
+    return ' '.join(phrases), terms
+
+
+def _terms_pattern(terms):
+    """Regex finding the query terms as whole tokens of folded text"""
+    return re.compile('|'.join(
+        r'(?<![^\W_])' + re.escape(term) + ('' if prefix else r'(?![^\W_])')
+        for term, prefix in terms
+    ))
+
+
+def _pack_boxes(words):
+    coordinates = array.array('H', (
+        min(BOX_MAX, max(0, round(value * BOX_SCALE)))
+        for word in words for value in word[:4]
+    ))
+    return zlib.compress(coordinates.tobytes())
+
+
+def _hit_rects(text, boxes_blob, pattern):
+    """Rects of the words of an indexed page that match pattern"""
+    if boxes_blob is None:
+        return []
+    coordinates = array.array('H')
+    coordinates.frombytes(zlib.decompress(boxes_blob))
+
+    # Pages with boxes are indexed as their words joined by spaces, box i
+    # belonging to word i. Folding rarely turns a character into a space;
+    # such a page gets no rects rather than misplaced ones
+    folded = _fold(text)
+    if (folded.count(' ') + 1) * 4 != len(coordinates):
+        return []
+
+    matched = sorted({folded.count(' ', 0, match.start()) for match in pattern.finditer(folded)})
+    return [[value / BOX_SCALE for value in coordinates[index * 4:index * 4 + 4]] for index in matched]
+
+
+def _snippet_parts(snippet):
+    """Split a marked snippet into [{text, match}] runs"""
+    parts = []
+    for position, piece in enumerate(re.split(f'[{MATCH_START}{MATCH_END}]', snippet)):
+        if piece:
+            parts.append({'text': piece, 'match': position % 2 == 1})
+    return parts
+
+
+def search(query, limit=20, offset=0, db=None):
+    """
+    Best matching pages for query, most relevant first. Each hit has the
+    file path, page number, BM25 score, a snippet as [{text, match}] runs
+    and the rects of the matched words in PDF points.
+    """
+    fts_query, terms = parse_query(query)
+    pattern = _terms_pattern(terms)
+    db = db or connect()
+
+    start = time.perf_counter()
+    # Ranking runs on the FTS table alone so its top-N shortcut applies;
+    # pages and files are joined for the returned hits only
+    rows = db.execute(
+        'SELECT hits.rank, hits.snippet, hits.text, files.path, pages.page, pages.method, '
+        'pages.width, pages.height, pages.boxes FROM ('
+        '    SELECT rowid, rank, text, snippet(page_text, 0, ?, ?, ?, ?) AS snippet'
+        '    FROM page_text WHERE page_text MATCH ? ORDER BY rank LIMIT ? OFFSET ?'
+        ') AS hits '
+        'JOIN pages ON pages.id = hits.rowid JOIN files ON files.id = pages.file_id '
+        'ORDER BY hits.rank',
+        (MATCH_START, MATCH_END, '…', SNIPPET_TOKENS, fts_query, limit, offset)
+    ).fetchall()
+
+    hits = [
+        {
+            'path': path,
+            'page': page,
+            'score': round(-rank, 6),
+            'method': method,
+            'width': width,
+            'height': height,
+            'snippet': _snippet_parts(snippet),
+            'rects': _hit_rects(text, boxes, pattern),
+        }
+        for rank, snippet, text, path, page, method, width, height, boxes in rows
+    ]
+    return {'type': 'success', 'query': fts_query, 'hits': hits,
+            'ms': round((time.perf_counter() - start) * 1000, 2)}
+
+
+def _page_entry(page, pdf_path, page_number, languages):
+    """
+    (method, text, words) for one fitz page, where words is a list of
+    (x0, y0, x1, y1, word) in PDF points, or None when there are no boxes
+    """
+    import ocr_processor
+
+    # Same test as hybrid OCR, so a page is indexed from the text OCR would
+    # have used
+    if ocr_processor.usable_text_layer(page) is not None:
+        return 'text', None, [tuple(word[:5]) for word in page.get_text('words')]
+
+    cached = ocr_processor.cached_page_ocr(pdf_path, page_number, languages)
+    if cached is not None:
+        text, ocr_words = cached
+        if ocr_words is None:
+            return 'ocr', text, None
+        scale = 72 / ocr_processor.OCR_DPI
+        return 'ocr', None, [
+            (word['left'] * scale, word['top'] * scale, (word['left'] + word['width']) * scale,
+             (word['top'] + word['height']) * scale, word['text'])
+            for word in ocr_words
+        ]
+
+    # Needs OCR; keep what little text it has until it has been recognized
+    return 'pending', page.get_text('text'), None
+
+
+def _page_row(doc, pdf_path, page_number, languages):
+    page = doc[page_number - 1]
+    method, text, words = _page_entry(page, pdf_path, page_number, languages)
+    if words is not None:
+        # Words are split on whitespace again when matched to their boxes
+        words = [(*box, ''.join(word.split())) for *box, word in words if word.strip()]
+    return {
+        'page': page_number,
+        'method': method,
+        'width': round(page.rect.width, 2),
+        'height': round(page.rect.height, 2),
+        'text': text if words is None else ' '.join(word[4] for word in words),
+        'boxes': None if words is None else _pack_boxes(words),
+    }
+
+
+def _page_rows(pdf_path, page_numbers, languages):
+    """
+    Rows for page_numbers of pdf_path, or all of its pages. Pool workers
+    have render.FITZ_LOCK to themselves; inline runs share it with renders,
+    so it is taken per page rather than for the whole document.
+    """
+    import fitz
+    import render
+
+    with render.FITZ_LOCK:
+        doc = fitz.open(pdf_path)
+    try:
+        with render.FITZ_LOCK:
+            if doc.needs_pass:
+                raise ValueError('Document is encrypted')
+            page_count = doc.page_count
+        rows = []
+        for page_number in page_numbers or range(1, page_count + 1):
+            with render.FITZ_LOCK:
+                rows.append(_page_row(doc, pdf_path, page_number, languages))
+        return rows
+    finally:
+        with render.FITZ_LOCK:
+            doc.close()
+
+
+def _index_file(pdf_path, known_hash, pending, languages):
+    """
+    Body of a pool task. With known_hash set, the file is only extracted if
+    its contents changed; with pending set, the contents are known to be
+    unchanged and only those pages are looked at again.
+    """
+    result = {'path': pdf_path}
+    try:
+        stat = os.stat(pdf_path)
+        result.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        if pending:
+            import ocr_processor
+
+            # The document is only opened once some page has been recognized
+            recognized = [
+                page_number for page_number in pending
+                if ocr_processor.cached_page_ocr(pdf_path, page_number, languages) is not None
+            ]
+            result['pages'] = []
+            result['partial'] = True
+            if recognized:
+                result['pages'] = _page_rows(pdf_path, recognized, languages)
+            return result
+
+        result['hash'] = render_cache.file_identity(pdf_path, content_hash=True)
+        if result['hash'] == known_hash:
+            return result
+
+        result['pages'] = _page_rows(pdf_path, None, languages)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def _collect_pdfs(paths):
+    """Expand files and directories into absolute PDF paths"""
+    found = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                found.extend(os.path.join(root, name) for name in names if name.lower().endswith('.pdf'))
+        else:
+            found.append(path)
+    return sorted(set(found))
+
+
+def _drop_pages(db, file_id, page_numbers=None):
+    where = 'file_id = ?' + ('' if page_numbers is None else f' AND page IN ({",".join("?" * len(page_numbers))})')
+    params = (file_id, *(page_numbers or ()))
+    db.execute(f'DELETE FROM page_text WHERE rowid IN (SELECT id FROM pages WHERE {where})', params)
+    db.execute(f'DELETE FROM pages WHERE {where}', params)
+
+
+def _store(db, result, known):
+    """Write one task result; returns the outcome counted in the summary"""
+    path = result['path']
+    file_id = known[path][0] if path in known else None
+
+    if 'error' in result:
+        if 'mtime_ns' not in result:
+            return 'missing'
+        # Kept with its stat, so an unreadable file is not retried until it changes
+        if file_id is not None:
+            _drop_pages(db, file_id)
+        db.execute(
+            'INSERT INTO files (path, mtime_ns, size, hash, pages, pending, error, indexed_at) '
+            'VALUES (?, ?, ?, ?, 0, 0, ?, ?) ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns, '
+            'size = excluded.size, hash = excluded.hash, pages = 0, pending = 0, error = excluded.error, '
+            'indexed_at = excluded.indexed_at',
+            (path, result['mtime_ns'], result['size'], result.get('hash', ''), result['error'], time.time())
+        )
+        return 'failed'
+
+    if 'pages' not in result:
+        db.execute('UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?', (result['mtime_ns'], result['size'], file_id))
+        return 'unchanged'
+
+    pages = result['pages']
+    if result.get('partial'):
+        if not pages:
+            return 'unchanged'
+        _drop_pages(db, file_id, [row['page'] for row in pages])
+        db.execute('UPDATE files SET pending = pending - ? WHERE id = ?', (len(pages), file_id))
+    else:
+        if file_id is not None:
+            _drop_pages(db, file_id)
+        file_id = db.execute(
+            'INSERT INTO files (path, mtime_ns, size, hash, pages, pending, error, indexed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, NULL, ?) ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns, '
+            'size = excluded.size, hash = excluded.hash, pages = excluded.pages, pending = excluded.pending, '
+            'error = NULL, indexed_at = excluded.indexed_at RETURNING id',
+            (path, result['mtime_ns'], result['size'], result['hash'], len(pages),
+             sum(1 for row in pages if row['method'] == 'pending'), time.time())
+        ).fetchone()[0]
+
+    for row in pages:
+        page_id = db.execute(
+            'INSERT INTO pages (file_id, page, method, width, height, boxes) VALUES (?, ?, ?, ?, ?, ?)',
+            (file_id, row['page'], row['method'], row['width'], row['height'], row['boxes'])
+        ).lastrowid
+        db.execute('INSERT INTO page_text (rowid, text) VALUES (?, ?)', (page_id, row['text']))
+    return 'updated' if result.get('partial') else 'indexed'
+
+
+def _emit(event):
+    print(json.dumps(event, ensure_ascii=False), flush=True)
+
+
+def index_documents(paths, workers=None, languages='eng+ind', prune=False, db=None):
+    """
+    Bring the index up to date for the given PDF files and directories,
+    printing NDJSON progress lines. Indexed files under them that no longer
+    exist are dropped; with prune, so is every indexed file not among them.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    db = db or connect()
+    start = time.perf_counter()
+    pdf_paths = _collect_pdfs(paths)
+
+    known = {
+        path: (file_id, mtime_ns, size, file_hash, pending)
+        for file_id, path, mtime_ns, size, file_hash, pending
+        in db.execute('SELECT id, path, mtime_ns, size, hash, pending FROM files')
+    }
+    roots = [os.path.abspath(path) for path in paths]
+    listed = set(pdf_paths)
+    gone = [
+        path for path in known
+        if (prune and path not in listed)
+        or (any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in roots)
+            and not os.path.exists(path))
+    ]
+    with db:
+        for path in gone:
+            _drop_pages(db, known[path][0])
+            db.execute('DELETE FROM files WHERE id = ?', (known[path][0],))
+
+    tasks = []
+    counts = {'indexed': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'missing': 0, 'removed': len(gone)}
+    for path in pdf_paths:
+        entry = known.get(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            counts['missing'] += 1
+            continue
+
+        if entry is None or (stat.st_mtime_ns, stat.st_size) != entry[1:3]:
+            tasks.append((path, entry[3] if entry else None, None, languages))
+        elif entry[4]:
+            pending = [page for (page,) in db.execute(
+                "SELECT page FROM pages WHERE file_id = ? AND method = 'pending' ORDER BY page", (entry[0],)
+            )]
+            tasks.append((path, None, pending, languages))
+        else:
+            counts['unchanged'] += 1
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    try:
+        results = (
+            (future.result() for future in as_completed([executor.submit(_index_file, *task) for task in tasks]))
+            if executor else (_index_file(*task) for task in tasks)
+        )
+        for completed, result in enumerate(results, start=1):
+            counts[_store(db, result, known)] += 1
+            if completed % COMMIT_EVERY == 0 or completed == len(tasks):
+                db.commit()
+                _emit({
+                    'type': 'progress',
+                    'progress': (completed / len(tasks)) * 100,
+                    'completed': completed,
+                    'total': len(tasks)
+                })
+    finally:
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    return {
+        'type': 'success',
+        'files': len(pdf_paths),
+        **counts,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def remove_documents(paths, db=None):
+    db = db or connect()
+    removed = 0
+    with db:
+        for path in paths:
+            row = db.execute('SELECT id FROM files WHERE path = ?', (os.path.abspath(path),)).fetchone()
+            if row is not None:
+                _drop_pages(db, row[0])
+                db.execute('DELETE FROM files WHERE id = ?', (row[0],))
+                removed += 1
+    return {'type': 'success', 'removed': removed}
+
+
+def stats(db=None):
+    db = db or connect()
+    files, pages, pending, failed = db.execute(
+        'SELECT COUNT(*), COALESCE(SUM(pages), 0), COALESCE(SUM(pending), 0), '
+        'COUNT(error) FROM files'
+    ).fetchone()
+    return {
+        'type': 'success',
+        'data': {
+            'files': files,
+            'pages': pages,
+            'pending_pages': pending,
+            'failed_files': failed,
+            'bytes': os.path.getsize(index_path()) if os.path.exists(index_path()) else 0,
+        }
+    }
+
+
+def run_command(command, args):
+    """Execute one CLI command and return the JSON it would print"""
+    if command == 'index':
+        paths = json.loads(args[0])
+        workers = int(args[1]) if len(args) > 1 and args[1] else None
+        languages = args[2] if len(args) > 2 and args[2] else 'eng+ind'
+        prune = len(args) > 3 and args[3].lower() in ('1', 'true')
+        return json.dumps(index_documents(paths, workers, languages, prune))
+
+    elif command == 'query':
+        query = args[0]
+        limit = int(args[1]) if len(args) > 1 and args[1] else 20
+        offset = int(args[2]) if len(args) > 2 and args[2] else 0
+        return json.dumps(search(query, limit, offset), ensure_ascii=False)
+
+    elif command == 'remove':
+        return json.dumps(remove_documents(json.loads(args[0])))
+
+    elif command == 'stats':
+        return json.dumps(stats())
+
+    raise ValueError(f'Unknown command: {command}')
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+
+    if len(sys.argv) < 2:
+        print(json.dumps({'type': 'error', 'message': 'Missing arguments'}))
+        sys.exit(1)
+
+    try:
+        print(run_command(sys.argv[1], sys.argv[2:]))
+    except Exception as e:
+        print(json.dumps({'type': 'error', 'message': str(e)}))
+        sys.exit(1)
@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+# The caches are process-wide singletons rooted here, so this is set before
+# any test touches them rather than per test
+os.environ['PDF_TOOLS_CACHE_DIR'] = tempfile.mkdtemp(prefix='pdf-tools-tests-')
+
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """Write a PDF whose pages hold the given lines of text; returns its path"""
+    import fitz
+
+    def make(pages, name='input.pdf'):
+        path = str(tmp_path / name)
+        doc = fitz.open()
+        for lines in pages:
+            page = doc.new_page()
+            for index, line in enumerate(lines):
+                page.insert_text((72, 72 + 20 * index), line, fontname='helv', fontsize=11)
+        doc.save(path)
+        doc.close()
+        return path
+
+    return make
+
+
+def page_texts(path):
+    import fitz
+
+    with fitz.open(path) as doc:
+        return [page.get_text() for page in doc]
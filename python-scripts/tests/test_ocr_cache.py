@@ -0,0 +1,45 @@
+import ocr_cache
+
+
+def _cache(tmp_path, max_bytes):
+    return ocr_cache.OcrCache(str(tmp_path / 'ocr.sqlite3'), max_bytes=max_bytes)
+
+
+def test_running_total_matches_entries(tmp_path):
+    cache = _cache(tmp_path, 10_000)
+    cache.put('image-a', 'eng', 100, '', 'x' * 100)
+    cache.put('image-b', 'eng', 100, '', 'y' * 50)
+    # Replacing an entry counts only the difference
+    cache.put('image-a', 'eng', 100, '', 'z' * 30)
+
+    stats = cache.stats()
+    assert stats['entries'] == 2
+    assert stats['bytes'] == 80
+
+
+def test_eviction_drops_orphaned_page_refs(tmp_path):
+    cache = _cache(tmp_path, 1000)
+    for page in range(1, 51):
+        image_key = f'image-{page}'
+        cache.remember_page('file', page, 100, image_key)
+        cache.put(image_key, 'eng', 100, '', 'x' * 100)
+
+    stats = cache.stats()
+    assert stats['bytes'] <= 1000
+    assert stats['evictions'] > 0
+
+    refs = cache.db.execute('SELECT COUNT(*) FROM page_refs').fetchone()[0]
+    assert refs == stats['entries']
+    assert cache.lookup_page('file', 1, 100, 'eng', '') is None
+    assert cache.lookup_page('file', 50, 100, 'eng', '') == 'x' * 100
+
+
+def test_page_ref_kept_while_another_entry_uses_its_image(tmp_path):
+    cache = _cache(tmp_path, 250)
+    cache.remember_page('file', 1, 100, 'image-1')
+    cache.put('image-1', 'eng', 100, '', 'a' * 100, kind='text')
+    cache.put('image-1', 'eng', 100, '', 'b' * 100, kind='words')
+    # Evicts the oldest entry, the text of image-1, but its words remain
+    cache.put('image-2', 'eng', 100, '', 'c' * 100)
+
+    assert cache.lookup_page('file', 1, 100, 'eng', '', kind='words') == 'b' * 100
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+import pdf_pipeline
+from conftest import page_texts
+
+
+@pytest.mark.parametrize('steps, message', [
+    ([], 'at least one step'),
+    ({'op': 'rotate'}, 'at least one step'),
+    ([{'op': 'flip'}], "Step 1: unknown operation 'flip'"),
+    (['rotate'], 'Step 1: unknown operation None'),
+    ([{'op': 'delete'}], "Step 1 (delete): missing 'pages'"),
+    ([{'op': 'rotate', 'pages': {'1': 45}}], 'multiple of 90'),
+    ([{'op': 'rotate', 'pages': {'6': 90}}], 'invalid page number 6 (document has 5 pages)'),
+    ([{'op': 'delete', 'pages': [1, 2, 3, 4, 5]}], 'cannot delete every page'),
+    ([{'op': 'reorder', 'order': [1, 1]}], 'more than once'),
+    ([{'op': 'reorder', 'order': []}], 'order is empty'),
+    ([{'op': 'rotate', 'pages': {}}, {'op': 'decrypt', 'password': 'x'}], 'Step 2 (decrypt): decrypt must be the first'),
+    ([{'op': 'encrypt', 'password': 'x'}, {'op': 'rotate', 'pages': {}}], 'encrypt must be the last'),
+    ([{'op': 'encrypt', 'password': ''}], 'password is empty'),
+    ([{'op': 'watermark', 'position': 'middle', 'text': 'x'}], 'Unknown watermark position'),
+    ([{'op': 'watermark'}], 'needs text or an image'),
+])
+def test_invalid_plans_are_rejected(steps, message):
+    with pytest.raises(ValueError, match=message.replace('(', r'\(').replace(')', r'\)')):
+        pdf_pipeline.validate(steps, 5)
+
+
+def test_page_numbers_follow_earlier_steps():
+    # After deleting two of five pages, page 4 no longer exists
+    steps = [{'op': 'delete', 'pages': [1, 2]}, {'op': 'rotate', 'pages': {'4': 90}}]
+    with pytest.raises(ValueError, match=r'Step 2 \(rotate\): invalid page number 4 \(document has 3 pages\)'):
+        pdf_pipeline.validate(steps, 5)
+
+    assert pdf_pipeline.validate([{'op': 'delete', 'pages': [1, 2]}, {'op': 'rotate', 'pages': {'3': 90}}], 5) == 3
+    assert pdf_pipeline.validate([{'op': 'reorder', 'order': [2, 1]}], 5) == 2
+
+
+def test_run_applies_steps_in_order(make_pdf, tmp_path):
+    import fitz
+
+    document = make_pdf([[f'Page {number}'] for number in range(1, 6)])
+    output = str(tmp_path / 'output.pdf')
+    result = pdf_pipeline.run(document, output, [
+        {'op': 'delete', 'pages': [2]},
+        {'op': 'reorder', 'order': [4, 1, 2]},
+        {'op': 'rotate', 'pages': {'1': 90}},
+        {'op': 'rotate', 'pages': {'1': 90}},
+    ])
+
+    assert result['pages'] == 3
+    assert [step['op'] for step in result['steps']] == ['delete', 'reorder', 'rotate', 'rotate']
+    assert [text.strip() for text in page_texts(output)] == ['Page 5', 'Page 1', 'Page 3']
+    with fitz.open(output) as doc:
+        assert [page.rotation for page in doc] == [180, 0, 0]
+
+
+def test_bad_late_step_writes_nothing(make_pdf, tmp_path):
+    document = make_pdf([['only page']])
+    output = str(tmp_path / 'output.pdf')
+    with pytest.raises(ValueError):
+        pdf_pipeline.run(document, output, [{'op': 'rotate', 'pages': {'1': 90}}, {'op': 'delete', 'pages': [1]}])
+
+    assert not os.path.exists(output)
+
+
+def test_encrypt_then_decrypt(make_pdf, tmp_path):
+    import pikepdf
+
+    document = make_pdf([['secret']])
+    encrypted = str(tmp_path / 'encrypted.pdf')
+    decrypted = str(tmp_path / 'decrypted.pdf')
+    pdf_pipeline.run(document, encrypted, [{'op': 'encrypt', 'password': 'pw'}])
+
+    with pytest.raises(pikepdf.PasswordError):
+        pikepdf.open(encrypted)
+    pdf_pipeline.run(encrypted, decrypted, [{'op': 'decrypt', 'password': 'pw'}, {'op': 'rotate', 'pages': {'1': 90}}])
+    assert page_texts(decrypted)[0].strip() == 'secret'
@@ -0,0 +1,127 @@
+import os
+
+import pytest
+
+import pdf_split
+from conftest import page_texts
+
+PAGES = 12
+
+
+@pytest.fixture
+def document(make_pdf):
+    return make_pdf([[f'Page {number}'] for number in range(1, PAGES + 1)])
+
+
+def _split(document, tmp_path, mode, value, workers=1):
+    return pdf_split.split(document, str(tmp_path / 'out'), mode, value, workers=workers)
+
+
+def _summary(outputs):
+    """(file name, page numbers, text of each page) of every output"""
+    return [
+        (os.path.basename(output['file']), output['pages'], [text.strip() for text in page_texts(output['file'])])
+        for output in outputs
+    ]
+
+
+def test_pages_mode_writes_one_file_per_page(document, tmp_path):
+    outputs = _split(document, tmp_path, 'pages', '2,5-6,99')
+
+    assert _summary(outputs) == [
+        ('page_2.pdf', [2], ['Page 2']),
+        ('page_5.pdf', [5], ['Page 5']),
+        ('page_6.pdf', [6], ['Page 6']),
+    ]
+
+
+def test_ranges_mode_with_open_end(document, tmp_path):
+    outputs = _split(document, tmp_path, 'ranges', '1-3,4-10,11-')
+
+    assert [(name, pages) for name, pages, _ in _summary(outputs)] == [
+        ('pages_1-3.pdf', [1, 2, 3]),
+        ('pages_4-10.pdf', list(range(4, 11))),
+        ('pages_11-12.pdf', [11, 12]),
+    ]
+    assert _summary(outputs)[2][2] == ['Page 11', 'Page 12']
+
+
+def test_repeated_ranges_get_their_own_files(document, tmp_path):
+    outputs = _split(document, tmp_path, 'ranges', ['1-2', '1-2'])
+
+    assert [os.path.basename(output['file']) for output in outputs] == ['pages_1-2.pdf', 'pages_1-2_2.pdf']
+    assert all(page_texts(output['file']) for output in outputs)
+
+
+def test_chunk_mode(document, tmp_path):
+    outputs = _split(document, tmp_path, 'chunk', 5)
+
+    assert [output['pages'] for output in outputs] == [[1, 2, 3, 4, 5], [6, 7, 8, 9, 10], [11, 12]]
+    with pytest.raises(ValueError):
+        _split(document, tmp_path, 'chunk', 0)
+
+
+def test_bookmarks_mode(document, tmp_path):
+    import fitz
+
+    path = str(tmp_path / 'bookmarked.pdf')
+    with fitz.open(document) as doc:
+        doc.set_toc([[1, 'Intro', 3], [2, 'Detail', 4], [1, 'Body: part/2', 7]])
+        doc.save(path)
+
+    outputs = _split(path, tmp_path, 'bookmarks', 1)
+
+    assert [(os.path.basename(output['file']), output['pages']) for output in outputs] == [
+        ('001_start.pdf', [1, 2]),
+        ('002_Intro.pdf', [3, 4, 5, 6]),
+        ('003_Body_ part_2.pdf', list(range(7, 13))),
+    ]
+
+
+def test_size_mode_keeps_page_order(document, tmp_path):
+    outputs = _split(document, tmp_path, 'size', 400)
+
+    assert len(outputs) > 1
+    assert [page for output in outputs for page in output['pages']] == list(range(1, PAGES + 1))
+
+
+def test_unknown_mode(document, tmp_path):
+    with pytest.raises(ValueError):
+        _split(document, tmp_path, 'halves', None)
+
+
+def test_outputs_leave_out_resources_their_pages_do_not_use(tmp_path):
+    import fitz
+    import pikepdf
+
+    path = str(tmp_path / 'fonts.pdf')
+    with fitz.open() as doc:
+        doc.new_page().insert_text((72, 72), 'helvetica page', fontname='helv')
+        doc.new_page().insert_text((72, 72), 'times page', fontname='tiro')
+        doc.save(path)
+    with pikepdf.open(path, allow_overwriting_input=True) as pdf:
+        # Both pages share one resource dictionary holding both fonts
+        fonts = pikepdf.Dictionary()
+        for page in pdf.pages:
+            for name, font in page.obj.Resources.Font.items():
+                fonts[name] = font
+        shared = pdf.make_indirect(pikepdf.Dictionary(Font=fonts))
+        for page in pdf.pages:
+            page.obj.Resources = shared
+        pdf.save(path)
+
+    outputs = _split(path, tmp_path, 'pages', '1-2')
+    base_fonts = []
+    for output in outputs:
+        with pikepdf.open(output['file']) as pdf:
+            base_fonts.append({str(obj.BaseFont) for obj in pdf.objects
+                               if isinstance(obj, pikepdf.Dictionary) and obj.get('/Type') == '/Font'})
+    assert base_fonts == [{'/Helvetica'}, {'/Times-Roman'}]
+
+
+def test_parallel_split_matches_serial(make_pdf, tmp_path):
+    path = make_pdf([[f'Page {number}'] for number in range(1, 41)])
+    serial = pdf_split.split(path, str(tmp_path / 'serial'), 'chunk', 2, workers=1)
+    parallel = pdf_split.split(path, str(tmp_path / 'parallel'), 'chunk', 2, workers=2)
+
+    assert _summary(parallel) == _summary(serial)
@@ -0,0 +1,123 @@
+import os
+
+import pytest
+
+import ocr_processor
+import search_index
+
+
+@pytest.fixture
+def db(tmp_path):
+    connection = search_index.connect(str(tmp_path / 'search.sqlite3'))
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def library(tmp_path, make_pdf):
+    os.makedirs(tmp_path / 'library')
+    make_pdf([['The quarterly invoice INV-0042 is attached to this page of the report']],
+             name='library/invoice.pdf')
+    make_pdf([['Minutes of the board meeting held on a rainy Tuesday afternoon'],
+              ['Second page about the annual budget and other planning matters']],
+             name='library/minutes.pdf')
+    return str(tmp_path / 'library')
+
+
+def _index(db, paths, **kwargs):
+    return search_index.index_documents(paths, workers=1, db=db, **kwargs)
+
+
+def _hits(db, query):
+    return [(os.path.basename(hit['path']), hit['page']) for hit in search_index.search(query, db=db)['hits']]
+
+
+def _no_extraction(monkeypatch):
+    def fail(*args):
+        raise AssertionError('file was extracted again')
+    monkeypatch.setattr(search_index, '_page_rows', fail)
+
+
+def test_index_and_search(db, library):
+    result = _index(db, [library])
+
+    assert (result['files'], result['indexed']) == (2, 2)
+    assert _hits(db, 'budget') == [('minutes.pdf', 2)]
+    assert _hits(db, '"board meeting"') == [('minutes.pdf', 1)]
+    assert _hits(db, 'quarter*') == [('invoice.pdf', 1)]
+    assert _hits(db, 'INV-0042') == [('invoice.pdf', 1)]
+
+    [hit] = search_index.search('invoice', db=db)['hits']
+    assert hit['method'] == 'text'
+    assert len(hit['rects']) == 1
+    assert any(part['match'] for part in hit['snippet'])
+
+
+def test_unchanged_files_are_not_read(db, library, monkeypatch):
+    _index(db, [library])
+    _no_extraction(monkeypatch)
+
+    result = _index(db, [library])
+    assert (result['unchanged'], result['indexed']) == (2, 0)
+
+
+def test_touched_file_with_same_contents_only_updates_its_stat(db, library, monkeypatch):
+    _index(db, [library])
+    path = os.path.join(library, 'invoice.pdf')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    _no_extraction(monkeypatch)
+
+    assert _index(db, [library])['unchanged'] == 2
+    stored = db.execute('SELECT mtime_ns FROM files WHERE path = ?', (path,)).fetchone()[0]
+    assert stored == stat.st_mtime_ns + 10 ** 9
+    assert _hits(db, 'invoice') == [('invoice.pdf', 1)]
+
+
+def test_changed_file_is_indexed_again(db, library, make_pdf):
+    _index(db, [library])
+    make_pdf([['A credit note replaced the earlier document on this page entirely']], name='library/invoice.pdf')
+
+    result = _index(db, [library])
+    assert (result['indexed'], result['unchanged']) == (1, 1)
+    assert _hits(db, 'invoice') == []
+    assert _hits(db, 'credit') == [('invoice.pdf', 1)]
+
+
+def test_removed_files_are_dropped(db, library):
+    _index(db, [library])
+    os.remove(os.path.join(library, 'minutes.pdf'))
+
+    result = _index(db, [library])
+    assert result['removed'] == 1
+    assert _hits(db, 'budget') == []
+
+
+def test_pending_pages_are_picked_up_once_recognized(db, tmp_path, make_pdf, monkeypatch):
+    path = make_pdf([['A page with a proper text layer that needs no recognition at all'], []], name='scan.pdf')
+    monkeypatch.setattr(ocr_processor, 'cached_page_ocr', lambda pdf_path, page_number, languages: None)
+
+    assert _index(db, [path])['indexed'] == 1
+    assert db.execute('SELECT pending FROM files').fetchone()[0] == 1
+
+    # Not recognized yet: the file is looked at again but nothing changes
+    assert _index(db, [path])['unchanged'] == 1
+
+    words = [{'left': 100, 'top': 100, 'width': 80, 'height': 20, 'text': 'scanned'},
+             {'left': 200, 'top': 100, 'width': 60, 'height': 20, 'text': 'receipt'}]
+    monkeypatch.setattr(
+        ocr_processor, 'cached_page_ocr',
+        lambda pdf_path, page_number, languages: ('scanned receipt', words) if page_number == 2 else None
+    )
+    assert _index(db, [path])['updated'] == 1
+    assert db.execute('SELECT pending FROM files').fetchone()[0] == 0
+
+    [hit] = search_index.search('receipt', db=db)['hits']
+    assert (hit['page'], hit['method']) == (2, 'ocr')
+    # OCR boxes are pixels at OCR_DPI, stored in half points
+    scale = 72 / ocr_processor.OCR_DPI
+    assert hit['rects'] == [pytest.approx([200 * scale, 100 * scale, 260 * scale, 120 * scale], abs=0.5)]
+
+    # Nothing is pending any more, so the file is not read again
+    _no_extraction(monkeypatch)
+    assert _index(db, [path])['unchanged'] == 1
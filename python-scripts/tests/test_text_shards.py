@@ -0,0 +1,55 @@
+import pytest
+
+import pdf_text_editor
+import text_shards
+from conftest import page_texts
+
+PAGES = 40
+
+
+@pytest.fixture
+def document(make_pdf):
+    return make_pdf([
+        [f'Page {number} says hello world', 'the quick brown fox', f'hello again from {number}']
+        for number in range(1, PAGES + 1)
+    ])
+
+
+def test_shard_ranges_cover_every_page_once():
+    for page_count in (1, 15, 16, 40, 1000):
+        ranges = text_shards.shard_ranges(page_count, 4)
+        assert [page for shard in ranges for page in shard] == list(range(1, page_count + 1))
+
+
+def test_sharded_replace_matches_unsharded(document, tmp_path):
+    replacements = [{'old_text': 'hello', 'new_text': 'goodbye'}, {'old_text': 'fox', 'new_text': 'cat'}]
+    single = pdf_text_editor.replace_text_in_pdf(document, str(tmp_path / 'single.pdf'), replacements)
+    sharded = pdf_text_editor.replace_text_in_pdf(document, str(tmp_path / 'sharded.pdf'), replacements, workers=2)
+
+    assert single['type'] == sharded['type'] == 'success'
+    assert sharded['total_replacements'] == single['total_replacements'] == PAGES * 3
+    assert sharded['page_details'] == single['page_details']
+    assert page_texts(str(tmp_path / 'sharded.pdf')) == page_texts(str(tmp_path / 'single.pdf'))
+
+
+def test_sharded_overlay_matches_unsharded(document, tmp_path):
+    content = 'first line\nsecond line'
+    single = pdf_text_editor.overlay_text_on_pdf(document, str(tmp_path / 'single.pdf'), content)
+    sharded = pdf_text_editor.overlay_text_on_pdf(document, str(tmp_path / 'sharded.pdf'), content, workers=2)
+
+    assert single['type'] == sharded['type'] == 'success'
+    assert page_texts(str(tmp_path / 'sharded.pdf')) == page_texts(str(tmp_path / 'single.pdf'))
+
+
+def test_sharded_output_shares_unchanged_resources(document, tmp_path):
+    import pikepdf
+
+    output = str(tmp_path / 'sharded.pdf')
+    pdf_text_editor.replace_text_in_pdf(document, output, [{'old_text': 'fox', 'new_text': 'cat'}], workers=2)
+
+    with pikepdf.open(document) as original, pikepdf.open(output) as edited:
+        def fonts(pdf):
+            return [obj for obj in pdf.objects if isinstance(obj, pikepdf.Dictionary) and obj.get('/Type') == '/Font']
+
+        # At most one new font per shard on top of the input's own
+        assert len(fonts(edited)) <= len(fonts(original)) + len(text_shards.shard_ranges(PAGES, 2))
@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import pdf_editor
+import worker
+from conftest import SCRIPTS_DIR
+
+
+def _serve(requests, max_workers=2):
+    """Run the server over the given request lines; returns the messages it sent"""
+    lines = [request if isinstance(request, str) else json.dumps(request) for request in requests]
+    out = io.StringIO()
+    worker.WorkerServer(max_workers=max_workers, stdin=io.StringIO('\n'.join(lines) + '\n'), stdout=out).serve()
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def _request(request_id, command='test', args=()):
+    return {'id': request_id, 'script': 'pdf_editor.py', 'command': command, 'args': list(args)}
+
+
+@pytest.fixture
+def fake_command(monkeypatch):
+    """Replace pdf_editor.run_command with the given function for the test"""
+    def install(function):
+        monkeypatch.setattr(pdf_editor, 'run_command', function)
+    return install
+
+
+def test_ping_and_invalid_request():
+    messages = _serve([{'id': 7, 'command': 'ping'}, 'not json'])
+
+    assert messages[0] == {'id': 7, 'type': 'pong'}
+    assert messages[1]['id'] is None
+    assert messages[1]['type'] == 'error'
+
+
+def test_prints_become_events_before_the_result(fake_command):
+    def command(name, args):
+        print(json.dumps({'type': 'progress', 'completed': 1}))
+        print('partial line without newline', end='')
+        return json.dumps({'type': 'success', 'args': args})
+
+    fake_command(command)
+    messages = _serve([_request(1, args=['a', 'b'])])
+
+    assert [message['type'] for message in messages] == ['event', 'event', 'result']
+    assert json.loads(messages[0]['line']) == {'type': 'progress', 'completed': 1}
+    assert messages[1]['line'] == 'partial line without newline'
+    assert messages[2]['exit_code'] == 0
+    assert json.loads(messages[2]['output']) == {'type': 'success', 'args': ['a', 'b']}
+
+
+def test_concurrent_requests_keep_their_events_apart(fake_command):
+    barrier = threading.Barrier(2)
+
+    def command(name, args):
+        barrier.wait(timeout=5)
+        for index in range(20):
+            print(f'{args[0]}:{index}')
+        return args[0]
+
+    fake_command(command)
+    messages = _serve([_request(1, args=['one']), _request(2, args=['two'])])
+
+    for request_id, tag in ((1, 'one'), (2, 'two')):
+        own = [message for message in messages if message['id'] == request_id]
+        assert [message['line'] for message in own[:-1]] == [f'{tag}:{index}' for index in range(20)]
+        assert own[-1] == {'id': request_id, 'type': 'result', 'output': tag, 'exit_code': 0}
+
+
+@pytest.mark.parametrize('error', [ValueError('bad input'), SystemExit(2)])
+def test_failed_command_still_gets_a_result(fake_command, error):
+    def command(name, args):
+        raise error
+
+    fake_command(command)
+    [message] = _serve([_request(3)])
+
+    assert message['type'] == 'result'
+    assert message['exit_code'] == 1
+    assert json.loads(message['output'])['type'] == 'error'
+
+
+def test_unknown_script_is_an_error_result():
+    [message] = _serve([{'id': 4, 'script': 'nope.py', 'command': 'x', 'args': []}])
+
+    assert message['exit_code'] == 1
+    assert 'Unknown script' in json.loads(message['output'])['message']
+
+
+def test_shutdown_stops_reading(fake_command):
+    fake_command(lambda name, args: 'done')
+    messages = _serve([_request(1), {'command': 'shutdown'}, _request(2)])
+
+    assert [message['id'] for message in messages] == [1]
+
+
+def test_daemon_stdout_carries_only_protocol_lines(tmp_path):
+    # A native tool or child writing to fd 1 must not reach the protocol stream
+    requests = '\n'.join([
+        json.dumps({'id': 1, 'command': 'ping'}),
+        json.dumps(_request(2)),
+    ]) + '\n'
+    code = (
+        'import os, pdf_editor, worker\n'
+        'pdf_editor.run_command = lambda command, args: os.write(1, b"noise\\n") and "done"\n'
+        'worker.serve()\n'
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        input=requests, capture_output=True, text=True, cwd=SCRIPTS_DIR, timeout=60,
+        env={**os.environ, 'PYTHONPATH': SCRIPTS_DIR}
+    )
+
+    messages = [json.loads(line) for line in result.stdout.splitlines()]
+    assert messages == [
+        {'id': 1, 'type': 'pong'},
+        {'id': 2, 'type': 'result', 'output': 'done', 'exit_code': 0},
+    ]
+    assert 'noise' in result.stderr
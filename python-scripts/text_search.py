@@ -0,0 +1,208 @@
+"""
+Text Search
+Finds many search strings on a PDF page in one pass over its text.
+
+page.search_for scans the whole page once per string, so replacing a
+few hundred strings across a long document repeats the same work tens of
+thousands of times. Here the strings are compiled into one Aho-Corasick
+automaton and each page's text is read once:
+
+    1. The page's plain text is extracted, or taken from the layout index
+       when the page is indexed, and run through the automaton. Pages
+       without a match stop here.
+    2. For pages with matches, the same text page is read character by
+       character with bounding boxes, and the matches are mapped to one
+       rectangle per line they cover.
+
+Runs of whitespace, including line and block breaks, compare as a single
+space, so a search string may span lines. Like search_for, matching
+ignores case unless match_case is set. Overlapping matches are resolved
+leftmost first, longest first, so each piece of text is replaced at most
+once.
+"""
+import re
+from collections import deque
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def _fold(char, match_case):
+    if match_case:
+        return char
+    lower = char.lower()
+    # Keep characters whose lowercase form is longer, so offsets stay aligned
+    return lower if len(lower) == 1 else char
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+class Matcher:
+    """Aho-Corasick automaton over a list of search strings"""
+
+    def __init__(self, patterns, match_case=False, whole_word=False):
+        self.match_case = match_case
+        self.whole_word = whole_word
+        self.lengths = []
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for index, pattern in enumerate(patterns):
+            key = self.normalize(pattern)
+            self.lengths.append(len(key))
+            if not key:
+                continue
+            state = 0
+            for char in key:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            # A string listed twice matches as its first occurrence
+            if not self.output[state]:
+                self.output[state].append(index)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def normalize(self, text):
+        return ''.join(_fold(char, self.match_case) for char in WHITESPACE.sub(' ', text))
+
+    def __bool__(self):
+        return len(self.goto) > 1
+
+    def find(self, text):
+        """
+        Non-overlapping (start, end, pattern index) matches in text, which
+        must already be normalized.
+        """
+        goto, fail, output, lengths = self.goto, self.fail, self.output, self.lengths
+        candidates = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                start = position + 1 - lengths[index]
+                if self.whole_word and not self._at_word_boundaries(text, start, position + 1):
+                    continue
+                candidates.append((start, position + 1, index))
+
+        matches = []
+        last_end = 0
+        for start, end, index in sorted(candidates, key=lambda match: (match[0], -match[1])):
+            if start >= last_end:
+                matches.append((start, end, index))
+                last_end = end
+        return matches
+
+    @staticmethod
+    def _at_word_boundaries(text, start, end):
+        return ((start == 0 or not (_is_word_char(text[start - 1]) and _is_word_char(text[start])))
+                and (end == len(text) or not (_is_word_char(text[end - 1]) and _is_word_char(text[end]))))
+
+
+class PageText:
+    """
+    Normalized text of a page with the bounding box, line and font size
+    of every character, built from a fitz TextPage
+    """
+
+    def __init__(self, textpage, match_case=False):
+        chars = []
+        boxes = []
+        lines = []
+        sizes = []
+        line_number = 0
+
+        def add(char, box, size):
+            if char.isspace():
+                if not chars or chars[-1] == ' ':
+                    return
+                char = ' '
+            chars.append(_fold(char, match_case))
+            boxes.append(box)
+            lines.append(line_number)
+            sizes.append(size)
+
+        for block in textpage.extractRAWDICT()['blocks']:
+            for line in block.get('lines', ()):
+                size = None
+                for span in line['spans']:
+                    size = span['size']
+                    for char in span['chars']:
+                        add(char['c'], char['bbox'], size)
+                add(' ', None, size)
+                line_number += 1
+
+        self.text = ''.join(chars)
+        self.boxes = boxes
+        self.lines = lines
+        self.sizes = sizes
+
+    def rects(self, start, end):
+        """One fitz.Rect per line covered by text[start:end]"""
+        import fitz
+
+        # Unions are taken on plain tuples; fitz.Rect arithmetic is far
+        # slower per character
+        extents = {}
+        for position in range(start, end):
+            box = self.boxes[position]
+            if box is None:
+                continue
+            line = self.lines[position]
+            if line in extents:
+                x0, y0, x1, y1 = extents[line]
+                extents[line] = (min(x0, box[0]), min(y0, box[1]), max(x1, box[2]), max(y1, box[3]))
+            else:
+                extents[line] = box
+        return [fitz.Rect(extents[line]) for line in sorted(extents)]
+
+
+def textpage_flags():
+    """
+    Extraction flags for searched text: ligatures are expanded and
+    characters outside the page are left out
+    """
+    import fitz
+    return fitz.TEXT_MEDIABOX_CLIP
+
+
+def search_page(page, matcher, text=None):
+    """
+    List of (pattern index, [fitz.Rect], font size) for every match of
+    matcher on a fitz page, with one rect per line and the size of the
+    first character; empty without extracting character boxes if nothing
+    matches. text, the page's plain text when the caller already has it
+    (see layout_index), saves extracting it for pages without a match.
+    The caller holds render.FITZ_LOCK.
+    """
+    if not matcher:
+        return []
+
+    if text is not None and not matcher.find(matcher.normalize(text)):
+        return []
+
+    textpage = page.get_textpage(flags=textpage_flags())
+    if text is None and not matcher.find(matcher.normalize(textpage.extractText())):
+        return []
+
+    page_text = PageText(textpage, matcher.match_case)
+    return [
+        (index, page_text.rects(start, end), page_text.sizes[start])
+        for start, end, index in matcher.find(page_text.text)
+    ]
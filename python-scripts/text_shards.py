@@ -0,0 +1,188 @@
+"""
+Text Shards
+Runs the text editor's page edits on a pool of processes.
+
+fitz documents cannot be shared between threads or processes, so the
+pages are cut into contiguous ranges and each worker opens its own handle
+on the input, edits the pages of one range and writes just the pages it
+changed to a shard file. The parent then copies the content streams of
+those pages over the same pages of the input with pikepdf, along with
+only the resources fitz added or changed, such as the font of the new
+text; fonts and images the pages already used stay the input's objects
+rather than a copy per shard. Every other object, including outlines,
+links and page objects, is left as it was, and the result is saved
+once. Per-page statistics come back with each shard and are merged in
+page order.
+
+Edits:
+    replace  {"replacements": [...], "match_case": bool, "whole_word": bool}
+    changes  {"changes": {page or None: [replacements]}}  smart_replace's diff
+    overlay  {"lines": [...]}
+"""
+import os
+import tempfile
+
+# Pages per shard below which a worker spends longer starting than editing
+MIN_PAGES_PER_SHARD = 16
+
+# Shards per worker, so a worker that drew light pages picks up more
+SHARDS_PER_WORKER = 4
+
+
+def _edit_pages(doc, edit, payload, page_numbers, page_texts):
+    """Apply one edit to the 1-based page_numbers of doc; returns page_details"""
+    import pdf_text_editor
+
+    if edit == 'replace':
+        return pdf_text_editor.apply_replacements(
+            doc, payload['replacements'], payload.get('match_case', False),
+            payload.get('whole_word', False), pages=page_numbers, page_texts=page_texts
+        )
+
+    if edit == 'changes':
+        page_details = []
+        wanted = set(page_numbers)
+        for page, replacements in sorted(payload['changes'].items(), key=lambda item: item[0] or 0):
+            pages = page_numbers if page is None else [page] if page in wanted else []
+            if pages:
+                page_details.extend(pdf_text_editor.apply_replacements(
+                    doc, replacements, match_case=True, whole_word=True, pages=pages, page_texts=page_texts
+                ))
+        return page_details
+
+    if edit == 'overlay':
+        for page_number in page_numbers:
+            pdf_text_editor.overlay_page(doc[page_number - 1], payload['lines'])
+        return [{'page': page_number} for page_number in page_numbers]
+
+    raise ValueError(f'Unknown edit: {edit}')
+
+
+def _edit_shard(input_path, shard_path, edit, payload, page_numbers):
+    """Body of a worker task: edit page_numbers and save the changed pages to shard_path"""
+    import fitz
+    import layout_index
+
+    page_texts = layout_index.cached_texts(input_path)
+    with fitz.open(input_path) as doc:
+        page_details = sorted(
+            _edit_pages(doc, edit, payload, page_numbers, page_texts),
+            key=lambda detail: detail['page']
+        )
+        changed = [detail['page'] for detail in page_details]
+        if changed:
+            doc.select([page - 1 for page in changed])
+            doc.save(shard_path, garbage=1)
+    return page_details, shard_path if changed else None
+
+
+def shard_ranges(page_count, workers):
+    """Contiguous 1-based page ranges for workers processes"""
+    shards = max(1, min(workers * SHARDS_PER_WORKER, page_count // MIN_PAGES_PER_SHARD))
+    size = -(-page_count // shards)
+    return [list(range(start, min(start + size, page_count + 1))) for start in range(1, page_count + 1, size)]
+
+
+def _copy(pdf, shard, value):
+    # Only indirect objects can be copied between files
+    if not value.is_indirect:
+        value = shard.make_indirect(value)
+    return pdf.copy_foreign(value)
+
+
+def _unchanged(original, edited):
+    """Whether edited, read from a shard, is still the original object of the input"""
+    import pikepdf
+
+    if original is None or type(original) is not type(edited):
+        return False
+    # Redactions rewrite the pixels of images they cover in place
+    if isinstance(original, pikepdf.Stream):
+        return original.get('/Length') == edited.get('/Length') and original.read_raw_bytes() == edited.read_raw_bytes()
+    return original.get('/Type') == edited.get('/Type')
+
+
+def _resource(pdf, shard, value, input_size):
+    """The object of pdf that stands for value, a resource read from shard"""
+    # fitz keeps object numbers when it saves a shard with garbage=1, so a
+    # resource it left alone, even under a new name, is still the input's
+    # object; numbers from input_size up were added to pdf by earlier shards
+    if value.is_indirect and value.objgen[0] < input_size:
+        original = pdf.get_object(value.objgen)
+        if _unchanged(original, value):
+            return original
+    return _copy(pdf, shard, value)
+
+
+def _apply_shard(pdf, pdf_pages, shard_path, page_details, opened, input_size):
+    import pikepdf
+
+    shard = pikepdf.open(shard_path)
+    # Copied objects are read from the shard when pdf is saved
+    opened.append(shard)
+    for detail, shard_page in zip(page_details, shard.pages):
+        target = pdf_pages[detail['page'] - 1]
+        contents = shard_page.obj.get('/Contents')
+        if contents is not None:
+            target.obj.Contents = _copy(pdf, shard, contents)
+
+        # Only the fonts and images fitz added or changed are copied; the
+        # rest point at the input's objects instead of a copy per shard
+        resources = pikepdf.Dictionary()
+        for category, entries in shard_page.obj.get('/Resources', pikepdf.Dictionary()).items():
+            if isinstance(entries, pikepdf.Dictionary):
+                resources[category] = pikepdf.Dictionary({
+                    name: _resource(pdf, shard, value, input_size) for name, value in entries.items()
+                })
+            else:
+                resources[category] = _resource(pdf, shard, entries, input_size)
+        target.obj.Resources = resources
+
+
+def run(input_path, output_path, edit, payload, workers=0):
+    """
+    Apply edit to every page of input_path on workers processes (0 for one
+    per CPU) and save to output_path. Returns page_details for the pages
+    that changed, in page order.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    import pikepdf
+
+    workers = workers or os.cpu_count() or 1
+    with pikepdf.open(input_path, allow_overwriting_input=True) as pdf:
+        pdf_pages = list(pdf.pages)
+        input_size = int(pdf.trailer.Size)
+        shards = shard_ranges(len(pdf_pages), workers)
+
+        opened = []
+        page_details = []
+        with tempfile.TemporaryDirectory() as work_dir:
+            executor = ProcessPoolExecutor(
+                max_workers=max(1, min(workers, len(shards))),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            try:
+                futures = [
+                    executor.submit(
+                        _edit_shard, input_path, os.path.join(work_dir, f'shard_{index}.pdf'),
+                        edit, payload, shard
+                    )
+                    for index, shard in enumerate(shards)
+                ]
+                # Results are taken in shard order, so page_details stay in page order
+                for future in futures:
+                    shard_details, shard_path = future.result()
+                    if shard_path is not None:
+                        _apply_shard(pdf, pdf_pages, shard_path, shard_details, opened, input_size)
+                    page_details.extend(shard_details)
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+            try:
+                pdf.save(output_path, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+            finally:
+                for shard in opened:
+                    shard.close()
+
+    return page_details
@@ -0,0 +1,170 @@
+"""
+Worker Daemon
+Long-lived server that keeps the PDF scripts imported between requests.
+
+Reads newline-delimited JSON requests on stdin:
+    {"id": 1, "script": "pdf_editor.py", "command": "rotate", "args": [...]}
+
+and writes newline-delimited JSON messages on stdout:
+    {"id": 1, "type": "event", "line": "..."}          progress output
+    {"id": 1, "type": "result", "output": "...", "exit_code": 0}
+
+`output` is exactly what the one-shot CLI would have printed as its final
+line, so callers can switch between both modes without parsing changes.
+"""
+import os
+import sys
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = 4
+
+def _load_script(script):
+    """Import a script module by its file or module name"""
+    name = script[:-3] if script.endswith('.py') else script
+
+    if name == 'pdf_editor':
+        import pdf_editor
+        return pdf_editor
+    elif name == 'pdf_converter':
+        import pdf_converter
+        return pdf_converter
+    elif name == 'ocr_processor':
+        import ocr_processor
+        return ocr_processor
+    elif name == 'pdf_text_editor':
+        import pdf_text_editor
+        return pdf_text_editor
+    elif name == 'search_index':
+        import search_index
+        return search_index
+
+    raise ValueError(f'Unknown script: {script}')
+
+
+class RequestStdout:
+    """
+    Stand-in for sys.stdout that turns prints made while serving a request
+    into tagged event messages, so concurrent requests never interleave.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.local = threading.local()
+
+    def bind(self, request_id):
+        self.local.request_id = request_id
+        self.local.buffer = ''
+
+    def unbind(self):
+        self.flush()
+        self.local.request_id = None
+
+    def write(self, text):
+        request_id = getattr(self.local, 'request_id', None)
+        if request_id is None:
+            # Output outside a request would corrupt the protocol stream
+            return sys.__stderr__.write(text)
+
+        self.local.buffer += text
+        while '\n' in self.local.buffer:
+            line, self.local.buffer = self.local.buffer.split('\n', 1)
+            self.server.send({'id': request_id, 'type': 'event', 'line': line})
+        return len(text)
+
+    def flush(self):
+        request_id = getattr(self.local, 'request_id', None)
+        if request_id is not None and self.local.buffer:
+            self.server.send({'id': request_id, 'type': 'event', 'line': self.local.buffer})
+            self.local.buffer = ''
+
+
+class WorkerServer:
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, stdin=None, stdout=None):
+        self.stdin = stdin or sys.stdin
+        self.out = stdout
+        self.max_workers = max_workers
+        self.write_lock = threading.Lock()
+        self.request_stdout = RequestStdout(self)
+
+    def send(self, message):
+        line = json.dumps(message, ensure_ascii=False)
+        with self.write_lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    def handle(self, request):
+        request_id = request.get('id')
+        interrupt = None
+        self.request_stdout.bind(request_id)
+        try:
+            module = _load_script(request['script'])
+            output = module.run_command(request['command'], list(request.get('args', [])))
+            exit_code = 0
+        except BaseException as e:
+            # Every request gets a result line, or its caller waits forever;
+            # a command exiting with SystemExit is just a failed request
+            output = json.dumps({'type': 'error', 'message': str(e) or type(e).__name__})
+            exit_code = 1
+            if isinstance(e, KeyboardInterrupt):
+                interrupt = e
+        finally:
+            self.request_stdout.unbind()
+
+        self.send({'id': request_id, 'type': 'result', 'output': output, 'exit_code': exit_code})
+        if interrupt is not None:
+            raise interrupt
+
+    def serve(self):
+        """Read requests until stdin closes or a shutdown request arrives"""
+        if self.out is None:
+            # Keep the protocol on a private copy of stdout and point fd 1 at
+            # stderr, so pool children and native tools cannot corrupt it
+            protocol_fd = os.dup(sys.__stdout__.fileno())
+            os.dup2(sys.__stderr__.fileno(), sys.__stdout__.fileno())
+            self.out = os.fdopen(protocol_fd, 'w', encoding='utf-8')
+
+        sys.stdout = self.request_stdout
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for raw in self.stdin:
+                    raw = raw.strip()
+                    if not raw:
+                        continue
+
+                    try:
+                        request = json.loads(raw)
+                    except json.JSONDecodeError as e:
+                        self.send({'id': None, 'type': 'error', 'message': f'Invalid request: {e}'})
+                        continue
+
+                    command = request.get('command')
+                    if command == 'ping' and 'script' not in request:
+                        self.send({'id': request.get('id'), 'type': 'pong'})
+                    elif command == 'shutdown' and 'script' not in request:
+                        break
+                    else:
+                        executor.submit(self.handle, request)
+        finally:
+            sys.stdout = sys.__stdout__
+
+
+def serve(max_workers=DEFAULT_MAX_WORKERS, preload=()):
+    for script in preload:
+        _load_script(script)
+    WorkerServer(max_workers=max_workers).serve()
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'serve':
+        print(json.dumps({'type': 'error', 'message': 'Usage: worker.py serve [max_workers] [preload]'}))
+        sys.exit(1)
+
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_MAX_WORKERS
+    preload = [name for name in sys.argv[3].split(',') if name] if len(sys.argv) > 3 else []
+    serve(max_workers, preload)
@@ -53,31 +53,45 @@ async fn ocr_pdf(
     languages: String,
     pages: Option<Vec<u32>>,
     output_format: String,
+    output_path: Option<String>,
 ) -> Result<String, String> {
     let pages_json = match pages {
         Some(p) => serde_json::to_string(&p).unwrap(),
         None => "null".to_string(),
     };
     
-    python::execute_python(
-        "ocr_processor.py".to_string(),
-        vec![
-            "ocr_pdf".to_string(),
-            pdf_path,
-            languages,
-            pages_json,
-            output_format,
-        ],
-    )
-    .await
+    let mut args = vec![
+        "ocr_pdf".to_string(),
+        pdf_path,
+        languages,
+        pages_json,
+        output_format,
+    ];
+    // Searchable PDF output; workers, mode and preprocess keep their defaults
+    if let Some(path) = output_path {
+        args.extend([String::new(), String::new(), String::new(), path]);
+    }
+    
+    python::execute_python("ocr_processor.py".to_string(), args).await
 }
 
 #[tauri::command]
-async fn merge_pdfs(input_paths: Vec<String>, output_path: String) -> Result<String, String> {
+async fn merge_pdfs(
+    input_paths: Vec<String>,
+    output_path: String,
+    outlines: Option<bool>,
+    links: Option<bool>,
+) -> Result<String, String> {
     let paths_json = serde_json::to_string(&input_paths).unwrap();
     python::execute_python(
         "pdf_editor.py".to_string(),
-        vec!["merge".to_string(), paths_json, output_path],
+        vec![
+            "merge".to_string(),
+            paths_json,
+            output_path,
+            outlines.map(|v| v.to_string()).unwrap_or_default(),
+            links.map(|v| v.to_string()).unwrap_or_default(),
+        ],
     )
     .await
 }
@@ -86,12 +100,27 @@ async fn merge_pdfs(input_paths: Vec<String>, output_path: String) -> Result<Str
 async fn split_pdf(
     input_path: String,
     output_dir: String,
-    pages: Vec<u32>,
+    pages: Option<Vec<u32>>,
+    mode: Option<String>,
+    value: Option<serde_json::Value>,
+    workers: Option<u32>,
 ) -> Result<String, String> {
-    let pages_json = serde_json::to_string(&pages).unwrap();
+    // `value` carries the ranges, chunk size, bookmark level or byte limit
+    // of the non-default modes; plain page lists keep using `pages`
+    let value_json = match value {
+        Some(value) => value.to_string(),
+        None => serde_json::to_string(&pages.unwrap_or_default()).unwrap(),
+    };
     python::execute_python(
         "pdf_editor.py".to_string(),
-        vec!["split".to_string(), input_path, output_dir, pages_json],
+        vec![
+            "split".to_string(),
+            input_path,
+            output_dir,
+            value_json,
+            mode.unwrap_or_default(),
+            workers.map(|w| w.to_string()).unwrap_or_default(),
+        ],
     )
     .await
 }
@@ -101,6 +130,7 @@ async fn rotate_pages(
     input_path: String,
     output_path: String,
     rotations: std::collections::HashMap<u32, i32>,
+    incremental: Option<bool>,
 ) -> Result<String, String> {
     let rotations_json = serde_json::to_string(&rotations).unwrap();
     python::execute_python(
@@ -110,6 +140,25 @@ async fn rotate_pages(
             input_path,
             output_path,
             rotations_json,
+            incremental.unwrap_or(false).to_string(),
+        ],
+    )
+    .await
+}
+
+#[tauri::command]
+async fn run_pipeline(
+    input_path: String,
+    output_path: String,
+    steps: serde_json::Value,
+) -> Result<String, String> {
+    python::execute_python(
+        "pdf_editor.py".to_string(),
+        vec![
+            "pipeline".to_string(),
+            input_path,
+            output_path,
+            steps.to_string(),
         ],
     )
     .await
@@ -120,11 +169,18 @@ async fn delete_pages(
     input_path: String,
     output_path: String,
     pages: Vec<u32>,
+    incremental: Option<bool>,
 ) -> Result<String, String> {
     let pages_json = serde_json::to_string(&pages).unwrap();
     python::execute_python(
         "pdf_editor.py".to_string(),
-        vec!["delete".to_string(), input_path, output_path, pages_json],
+        vec![
+            "delete".to_string(),
+            input_path,
+            output_path,
+            pages_json,
+            incremental.unwrap_or(false).to_string(),
+        ],
     )
     .await
 }
@@ -154,6 +210,7 @@ async fn add_watermark(
     output_path: String,
     watermark_text: String,
     position: String,
+    options: Option<serde_json::Value>,
 ) -> Result<String, String> {
     python::execute_python(
         "pdf_editor.py".to_string(),
@@ -163,6 +220,7 @@ async fn add_watermark(
             output_path,
             watermark_text,
             position,
+            options.map(|o| o.to_string()).unwrap_or_default(),
         ],
     )
     .await
@@ -209,7 +267,14 @@ async fn pdf_to_images(
     output_dir: String,
     format: String,
     dpi: u32,
+    pages: Option<String>,
+    options: Option<serde_json::Value>,
 ) -> Result<String, String> {
+    let options_json = match options {
+        Some(o) => o.to_string(),
+        None => String::new(),
+    };
+    
     python::execute_python(
         "pdf_converter.py".to_string(),
         vec![
@@ -218,17 +283,30 @@ async fn pdf_to_images(
             output_dir,
             format,
             dpi.to_string(),
+            pages.unwrap_or_default(),
+            options_json,
         ],
     )
     .await
 }
 
 #[tauri::command]
-async fn images_to_pdf(image_paths: Vec<String>, output_path: String) -> Result<String, String> {
+async fn images_to_pdf(
+    image_paths: Vec<String>,
+    output_path: String,
+    page_size: Option<String>,
+    margin: Option<f64>,
+) -> Result<String, String> {
     let paths_json = serde_json::to_string(&image_paths).unwrap();
     python::execute_python(
         "pdf_converter.py".to_string(),
-        vec!["images_to_pdf".to_string(), paths_json, output_path],
+        vec![
+            "images_to_pdf".to_string(),
+            paths_json,
+            output_path,
+            page_size.unwrap_or_default(),
+            margin.map(|m| m.to_string()).unwrap_or_default(),
+        ],
     )
     .await
 }
@@ -271,11 +349,66 @@ async fn get_pdf_thumbnails(pdf_path: String) -> Result<String, String> {
     .await
 }
 
+#[tauri::command]
+async fn stream_pdf_thumbnails(
+    app: tauri::AppHandle,
+    pdf_path: String,
+    start: u32,
+    count: u32,
+) -> Result<String, String> {
+    use tauri::Emitter;
+
+    let event_path = pdf_path.clone();
+    python::execute_python_streaming(
+        "pdf_converter.py".to_string(),
+        vec![
+            "stream_thumbnails".to_string(),
+            pdf_path,
+            start.to_string(),
+            count.to_string(),
+        ],
+        move |line| {
+            let _ = app.emit(
+                "pdf-thumbnail",
+                serde_json::json!({ "pdfPath": event_path, "line": line }),
+            );
+        },
+    )
+    .await
+}
+
+#[tauri::command]
+async fn stream_pdf_layout(
+    app: tauri::AppHandle,
+    pdf_path: String,
+    pages: Option<String>,
+) -> Result<String, String> {
+    use tauri::Emitter;
+
+    let event_path = pdf_path.clone();
+    python::execute_python_streaming(
+        "pdf_text_editor.py".to_string(),
+        vec![
+            "extract_layout".to_string(),
+            pdf_path,
+            pages.unwrap_or_default(),
+        ],
+        move |line| {
+            let _ = app.emit(
+                "pdf-layout",
+                serde_json::json!({ "pdfPath": event_path, "line": line }),
+            );
+        },
+    )
+    .await
+}
+
 #[tauri::command]
 async fn reorder_pdf_pages(
     input_path: String,
     output_path: String,
     page_order: Vec<u32>,
+    incremental: Option<bool>,
 ) -> Result<(), String> {
     let page_order_json = serde_json::to_string(&page_order)
         .map_err(|e| format!("JSON error: {}", e))?;
@@ -287,6 +420,7 @@ async fn reorder_pdf_pages(
             input_path,
             output_path,
             page_order_json,
+            incremental.unwrap_or(false).to_string(),
         ],
     )
     .await?;
@@ -325,6 +459,7 @@ async fn update_pdf_text(
     output_path: String,
     old_content: String,
     new_content: String,
+    incremental: Option<bool>,
 ) -> Result<String, String> {
     python::execute_python(
         "pdf_text_editor.py".to_string(),
@@ -334,6 +469,61 @@ async fn update_pdf_text(
             output_path,
             old_content,
             new_content,
+            incremental.unwrap_or(false).to_string(),
+        ],
+    )
+    .await
+}
+
+#[tauri::command]
+async fn index_documents(
+    app: tauri::AppHandle,
+    paths: Option<Vec<String>>,
+) -> Result<String, String> {
+    use tauri::Emitter;
+
+    // Without explicit paths the whole library is indexed, and documents
+    // no longer in it are dropped from the index
+    let prune = paths.is_none();
+    let paths = match paths {
+        Some(p) => p,
+        None => database::get_documents(None, None, None, None)?
+            .into_iter()
+            .map(|doc| doc.file_path)
+            .collect(),
+    };
+    let paths_json = serde_json::to_string(&paths)
+        .map_err(|e| format!("JSON error: {}", e))?;
+
+    python::execute_python_streaming(
+        "search_index.py".to_string(),
+        vec![
+            "index".to_string(),
+            paths_json,
+            String::new(),
+            String::new(),
+            prune.to_string(),
+        ],
+        move |line| {
+            let _ = app.emit("search-index", serde_json::json!({ "line": line }));
+        },
+    )
+    .await
+}
+
+#[tauri::command]
+async fn search_documents(
+    query: String,
+    limit: Option<u32>,
+    offset: Option<u32>,
+) -> Result<String, String> {
+    python::execute_python(
+        "search_index.py".to_string(),
+        vec![
+            "query".to_string(),
+            query,
+            limit.unwrap_or(20).to_string(),
+            offset.unwrap_or(0).to_string(),
         ],
     )
     .await
@@ -377,6 +567,7 @@ pub fn run() {
             merge_pdfs,
             split_pdf,
             rotate_pages,
+            run_pipeline,
             delete_pages,
             compress_pdf,
             add_watermark,
@@ -390,9 +581,14 @@ pub fn run() {
             get_pdf_info,
             get_file_stats,
             get_pdf_thumbnails,
+            stream_pdf_thumbnails,
+            stream_pdf_layout,
             reorder_pdf_pages,
             get_pdf_page_image,
             update_pdf_text,
+            // Full-text search
+            index_documents,
+            search_documents,
             // Security & Validation
             get_pdf_security_info,
             validate_pdf_file,
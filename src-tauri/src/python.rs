@@ -1,16 +1,24 @@
-use std::process::Command;
+use std::collections::HashMap;
+use std::io::{BufRead, BufReader, Write};
+use std::process::{Child, ChildStdin, Command, Stdio};
 use std::path::PathBuf;
+use std::sync::atomic::{AtomicBool, AtomicU64, Ordering};
+use std::sync::mpsc::{channel, Sender};
+use std::sync::{Arc, Mutex, OnceLock};
 
-pub async fn execute_python(script: String, args: Vec<String>) -> Result<String, String> {
+const WORKER_SCRIPT: &str = "worker.py";
+const WORKER_LOG: &str = "pdf-tools-worker.log";
+
+fn build_command(script: &str) -> Result<Command, String> {
     let app_dir = std::env::current_exe()
         .ok()
         .and_then(|path| path.parent().map(|p| p.to_path_buf()))
         .unwrap_or_else(|| PathBuf::from("."));
-    
+
     let poppler_path = app_dir.join("poppler");
     let tesseract_path = app_dir.join("tesseract");
     let tessdata_path = tesseract_path.join("tessdata");
-    
+
     let python_cmd = if cfg!(target_os = "windows") {
         if Command::new("py").arg("--version").output().is_ok() {
             "py"
@@ -22,9 +30,9 @@ pub async fn execute_python(script: String, args: Vec<String>) -> Result<String,
     } else {
         "python3"
     };
-    
+
     let (command, script_path) = if cfg!(debug_assertions) {
-        let path = PathBuf::from("..").join("python-scripts").join(&script);
+        let path = PathBuf::from("..").join("python-scripts").join(script);
         (python_cmd.to_string(), path)
     } else {
         let exe_name = script.replace(".py", "");
@@ -35,7 +43,7 @@ pub async fn execute_python(script: String, args: Vec<String>) -> Result<String,
         };
         (exe_path.to_string_lossy().to_string(), PathBuf::new())
     };
-    
+
     let mut cmd = if cfg!(debug_assertions) {
         let mut c = Command::new(command);
         c.arg(script_path);
@@ -43,40 +51,278 @@ pub async fn execute_python(script: String, args: Vec<String>) -> Result<String,
     } else {
         Command::new(command)
     };
-    
+
     #[cfg(target_os = "windows")]
     {
         use std::os::windows::process::CommandExt;
         const CREATE_NO_WINDOW: u32 = 0x08000000;
         cmd.creation_flags(CREATE_NO_WINDOW);
     }
-    
+
     let current_path = std::env::var("PATH").unwrap_or_default();
     let new_path = if cfg!(target_os = "windows") {
-        format!("{};{};{}", 
+        format!("{};{};{}",
             poppler_path.to_string_lossy(),
             tesseract_path.to_string_lossy(),
             current_path
         )
     } else {
-        format!("{}:{}:{}", 
+        format!("{}:{}:{}",
             poppler_path.to_string_lossy(),
             tesseract_path.to_string_lossy(),
             current_path
         )
     };
-    
+
     cmd.env("PATH", new_path);
     cmd.env("TESSDATA_PREFIX", tessdata_path.to_string_lossy().to_string());
+
+    Ok(cmd)
+}
+
+/// Result of one worker request: collected stdout and whether it succeeded.
+struct WorkerReply {
+    output: String,
+    success: bool,
+}
+
+/// Callback for output lines printed before a command's final result.
+pub type EventCallback = Arc<dyn Fn(&str) + Send + Sync>;
+
+/// A request waiting for its result, with progress output collected so far.
+struct PendingRequest {
+    output: String,
+    reply: Sender<WorkerReply>,
+    on_event: Option<EventCallback>,
+}
+
+type PendingMap = Arc<Mutex<HashMap<u64, PendingRequest>>>;
+
+/// Why a worker request produced no result.
+enum WorkerError {
+    /// The request never reached a worker, so it is safe to run it elsewhere.
+    Unavailable(String),
+    /// The worker died after taking the request, which may have partly run.
+    Lost(String),
+}
+
+/// Where the worker's stderr goes: output printed outside any request, such
+/// as tracebacks from helper threads, would otherwise be lost.
+fn worker_log() -> Stdio {
+    std::fs::OpenOptions::new()
+        .create(true)
+        .append(true)
+        .open(std::env::temp_dir().join(WORKER_LOG))
+        .map(Stdio::from)
+        .unwrap_or_else(|_| Stdio::null())
+}
+
+/// Long-lived `worker.py serve` process shared by all Python commands.
+struct Worker {
+    _child: Child,
+    stdin: ChildStdin,
+    pending: PendingMap,
+    alive: Arc<AtomicBool>,
+}
+
+static WORKER: OnceLock<Mutex<Option<Worker>>> = OnceLock::new();
+static NEXT_REQUEST_ID: AtomicU64 = AtomicU64::new(1);
+
+impl Worker {
+    fn spawn() -> Result<Worker, String> {
+        let mut cmd = build_command(WORKER_SCRIPT)?;
+        cmd.arg("serve")
+            .stdin(Stdio::piped())
+            .stdout(Stdio::piped())
+            .stderr(worker_log());
+
+        let mut child = cmd
+            .spawn()
+            .map_err(|e| format!("Failed to start worker: {}", e))?;
+        let stdin = child.stdin.take().ok_or("Worker stdin unavailable")?;
+        let stdout = child.stdout.take().ok_or("Worker stdout unavailable")?;
+
+        let pending: PendingMap = Arc::new(Mutex::new(HashMap::new()));
+        let alive = Arc::new(AtomicBool::new(true));
+
+        let reader_pending = Arc::clone(&pending);
+        let reader_alive = Arc::clone(&alive);
+        std::thread::spawn(move || {
+            for line in BufReader::new(stdout).lines() {
+                let Ok(line) = line else { break };
+                let Ok(message) = serde_json::from_str::<serde_json::Value>(&line) else {
+                    continue;
+                };
+                let Some(id) = message["id"].as_u64() else { continue };
+
+                let mut pending = reader_pending.lock().unwrap();
+                match message["type"].as_str() {
+                    Some("event") => {
+                        let line = message["line"].as_str().unwrap_or_default();
+                        if let Some(request) = pending.get_mut(&id) {
+                            match &request.on_event {
+                                Some(on_event) => on_event(line),
+                                // Keep progress lines so the output matches the one-shot CLI
+                                None => {
+                                    request.output.push_str(line);
+                                    request.output.push('\n');
+                                }
+                            }
+                        }
+                    }
+                    Some("result") => {
+                        if let Some(mut request) = pending.remove(&id) {
+                            request.output.push_str(message["output"].as_str().unwrap_or_default());
+                            let _ = request.reply.send(WorkerReply {
+                                output: request.output,
+                                success: message["exit_code"].as_i64() == Some(0),
+                            });
+                        }
+                    }
+                    _ => {}
+                }
+            }
+
+            // Worker exited: dropping the senders wakes every waiting request
+            reader_alive.store(false, Ordering::SeqCst);
+            reader_pending.lock().unwrap().clear();
+        });
+
+        Ok(Worker { _child: child, stdin, pending, alive })
+    }
+}
+
+/// Send a request to the shared worker. The outer error says whether the
+/// request can still fall back to a one-shot process.
+fn request_worker(
+    script: &str,
+    args: &[String],
+    on_event: Option<EventCallback>,
+) -> Result<Result<String, String>, WorkerError> {
+    let id = NEXT_REQUEST_ID.fetch_add(1, Ordering::SeqCst);
+    let (sender, receiver) = channel();
+
+    {
+        let mut slot = WORKER.get_or_init(|| Mutex::new(None)).lock().unwrap();
+        if slot.as_ref().map_or(true, |w| !w.alive.load(Ordering::SeqCst)) {
+            *slot = Some(Worker::spawn().map_err(WorkerError::Unavailable)?);
+        }
+        let worker = slot.as_mut().unwrap();
+
+        let request = serde_json::json!({
+            "id": id,
+            "script": script,
+            "command": args.first().cloned().unwrap_or_default(),
+            "args": args.iter().skip(1).collect::<Vec<_>>(),
+        });
+
+        worker.pending.lock().unwrap().insert(id, PendingRequest {
+            output: String::new(),
+            reply: sender,
+            on_event,
+        });
+        let written = writeln!(worker.stdin, "{}", request).and_then(|_| worker.stdin.flush());
+        if let Err(e) = written {
+            worker.pending.lock().unwrap().remove(&id);
+            worker.alive.store(false, Ordering::SeqCst);
+            return Err(WorkerError::Unavailable(format!("Failed to write to worker: {}", e)));
+        }
+    }
+
+    match receiver.recv() {
+        Ok(reply) if reply.success => Ok(Ok(reply.output)),
+        Ok(reply) => Ok(Err(reply.output)),
+        Err(_) => Err(WorkerError::Lost("Worker exited before replying".to_string())),
+    }
+}
+
+fn execute_once(script: &str, args: Vec<String>) -> Result<String, String> {
+    let mut cmd = build_command(script)?;
     cmd.args(args);
-    
+
     let output = cmd
         .output()
         .map_err(|e| format!("Failed to execute: {}", e))?;
-    
+
     if output.status.success() {
         Ok(String::from_utf8_lossy(&output.stdout).to_string())
     } else {
         Err(String::from_utf8_lossy(&output.stderr).to_string())
     }
 }
+
+/// One-shot fallback that forwards every line but the last as it is printed.
+fn execute_once_streaming(
+    script: &str,
+    args: Vec<String>,
+    on_event: EventCallback,
+) -> Result<String, String> {
+    let mut cmd = build_command(script)?;
+    cmd.args(args).stdout(Stdio::piped()).stderr(Stdio::piped());
+
+    let mut child = cmd
+        .spawn()
+        .map_err(|e| format!("Failed to execute: {}", e))?;
+    let stdout = child.stdout.take().ok_or("Process stdout unavailable")?;
+    let mut stderr = child.stderr.take().ok_or("Process stderr unavailable")?;
+
+    // Drained alongside stdout, or a child that fills the stderr pipe blocks
+    // before it closes stdout
+    let stderr_reader = std::thread::spawn(move || {
+        let mut text = String::new();
+        let _ = std::io::Read::read_to_string(&mut stderr, &mut text);
+        text
+    });
+
+    let mut last_line: Option<String> = None;
+    for line in BufReader::new(stdout).lines() {
+        let line = line.map_err(|e| format!("Failed to read output: {}", e))?;
+        if let Some(previous) = last_line.replace(line) {
+            on_event(&previous);
+        }
+    }
+
+    let status = child
+        .wait()
+        .map_err(|e| format!("Failed to execute: {}", e))?;
+    let stderr = stderr_reader.join().unwrap_or_default();
+
+    if status.success() {
+        Ok(last_line.unwrap_or_default())
+    } else {
+        Err(stderr)
+    }
+}
+
+pub async fn execute_python(script: String, args: Vec<String>) -> Result<String, String> {
+    tokio::task::spawn_blocking(move || match request_worker(&script, &args, None) {
+        Ok(result) => result,
+        Err(WorkerError::Unavailable(_)) => execute_once(&script, args),
+        // Running it again could repeat a partly applied edit
+        Err(WorkerError::Lost(message)) => Err(message),
+    })
+    .await
+    .map_err(|e| format!("Python task failed: {}", e))?
+}
+
+/// Like `execute_python`, but hands each line printed before the final result
+/// to `on_event` as soon as it arrives instead of collecting it.
+pub async fn execute_python_streaming<F>(
+    script: String,
+    args: Vec<String>,
+    on_event: F,
+) -> Result<String, String>
+where
+    F: Fn(&str) + Send + Sync + 'static,
+{
+    let on_event: EventCallback = Arc::new(on_event);
+    tokio::task::spawn_blocking(move || {
+        match request_worker(&script, &args, Some(Arc::clone(&on_event))) {
+            Ok(result) => result,
+            Err(WorkerError::Unavailable(_)) => execute_once_streaming(&script, args, on_event),
+            Err(WorkerError::Lost(message)) => Err(message),
+        }
+    })
+    .await
+    .map_err(|e| format!("Python task failed: {}", e))?
+}
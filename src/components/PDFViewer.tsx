@@ -11,6 +11,8 @@ import {
 } from 'lucide-react';
 import '../styles/PDFViewer.css';
 
+const THUMBNAIL_BATCH_SIZE = 50;
+
 interface PDFViewerProps {
   pdfPath: string;
   fileName: string;
@@ -66,22 +68,44 @@ const PDFViewer = ({ pdfPath, fileName }: PDFViewerProps) => {
   };
 
   const loadAllThumbnails = async () => {
+    const { invoke } = await import('@tauri-apps/api/core');
+    const { listen } = await import('@tauri-apps/api/event');
+
+    // Thumbnails arrive one event per page so the grid fills in progressively
+    const unlisten = await listen<{ pdfPath: string; line: string }>('pdf-thumbnail', (event) => {
+      if (event.payload.pdfPath !== pdfPath) return;
+      try {
+        const thumb = JSON.parse(event.payload.line);
+        if (thumb.type === 'thumbnail') {
+          setThumbnails(prev => ({ ...prev, [thumb.page]: thumb.thumbnail }));
+        }
+      } catch {
+        // Ignore non-JSON diagnostics printed by the script
+      }
+    });
+
     try {
-      const { invoke } = await import('@tauri-apps/api/core');
-      const result = await invoke('get_pdf_thumbnails', { pdfPath });
-      const resultStr = String(result);
-      const cleanJson = resultStr.trim().split('\n').filter(line => line.trim()).pop() || resultStr;
-      const data = JSON.parse(cleanJson);
-      
-      if (data.type === 'success' && data.thumbnails) {
-        const thumbMap: {[key: number]: string} = {};
-        data.thumbnails.forEach((thumb: any) => {
-          thumbMap[thumb.page] = thumb.thumbnail;
+      let start: number | null = 1;
+      while (start !== null) {
+        const result = await invoke('stream_pdf_thumbnails', {
+          pdfPath,
+          start,
+          count: THUMBNAIL_BATCH_SIZE,
         });
-        setThumbnails(thumbMap);
+        const resultStr = String(result);
+        const cleanJson = resultStr.trim().split('\n').filter(line => line.trim()).pop() || resultStr;
+        const data = JSON.parse(cleanJson);
+
+        if (data.type !== 'success') {
+          console.error('Failed to load thumbnails:', data.message);
+          break;
+        }
+        start = data.next_start;
       }
     } catch (error) {
       console.error('Failed to load thumbnails:', error);
+    } finally {
+      unlisten();
     }
   };
 
@@ -18,7 +18,51 @@ export interface ProcessingTask {
 export interface OCROptions {
   languages: string[];
   pages?: number[];
-  outputFormat: 'txt' | 'json' | 'docx';
+  outputFormat: 'txt' | 'json' | 'docx' | 'pdf';
+  outputPath?: string;
+}
+
+export interface WatermarkOptions {
+  font_size?: number;
+  color?: [number, number, number];
+  opacity?: number;
+  rotation?: number;
+  image?: string;
+  scale?: number;
+  margin?: number;
+}
+
+export type PipelineStep =
+  | { op: 'decrypt'; password: string }
+  | { op: 'rotate'; pages: Record<number, number> }
+  | { op: 'delete'; pages: number[] }
+  | { op: 'reorder'; order: number[] }
+  | { op: 'watermark'; text: string; position?: string; options?: WatermarkOptions }
+  | { op: 'encrypt'; password: string };
+
+export interface LayoutSpan {
+  text: string;
+  bbox: [number, number, number, number];
+  origin: [number, number];
+  font: string;
+  size: number;
+  color: number;
+  flags: number;
+}
+
+export interface LayoutLine {
+  bbox: [number, number, number, number];
+  dir: [number, number];
+  spans: LayoutSpan[];
+}
+
+export interface PageLayout {
+  page: number;
+  cached: boolean;
+  width: number;
+  height: number;
+  rotation: number;
+  blocks: { bbox: [number, number, number, number]; lines: LayoutLine[] }[];
 }
 
 export interface ConversionOptions {
@@ -67,3 +111,20 @@ export interface DocumentFilter {
   limit?: number;
   offset?: number;
 }
+
+export interface SearchHit {
+  path: string;
+  page: number;
+  score: number;
+  method: 'text' | 'ocr' | 'pending';
+  width: number;
+  height: number;
+  snippet: { text: string; match: boolean }[];
+  rects: [number, number, number, number][];
+}
+
+export interface SearchIndexProgress {
+  progress: number;
+  completed: number;
+  total: number;
+}
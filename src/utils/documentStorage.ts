@@ -1,5 +1,5 @@
 import { invoke } from '@tauri-apps/api/core';
-import type { DocumentRecord, DocumentStats, DocumentFilter } from '../types';
+import type { DocumentRecord, DocumentStats, DocumentFilter, SearchHit, SearchIndexProgress } from '../types';
 
 /**
  * Fast document storage API using Rust + SQLite
@@ -69,6 +69,51 @@ export async function getDocumentStats(): Promise<DocumentStats> {
   }
 }
 
+/**
+ * Bring the full-text index up to date; indexes the whole library when no
+ * paths are given
+ */
+export async function indexDocuments(
+  paths: string[] | null = null,
+  onProgress?: (progress: SearchIndexProgress) => void
+): Promise<any> {
+  const { listen } = await import('@tauri-apps/api/event');
+
+  const unlisten = await listen<{ line: string }>('search-index', (event) => {
+    try {
+      const message = JSON.parse(event.payload.line);
+      if (message.type === 'progress') {
+        onProgress?.(message as SearchIndexProgress);
+      }
+    } catch {
+      // Ignore non-JSON diagnostics printed by the script
+    }
+  });
+
+  try {
+    const result = await invoke<string>('index_documents', { paths });
+    return JSON.parse(result.trim().split('\n').filter(line => line.trim()).pop() || result);
+  } catch (error) {
+    console.error('Failed to index documents:', error);
+    throw error;
+  } finally {
+    unlisten();
+  }
+}
+
+export async function searchDocuments(query: string, limit = 20, offset = 0): Promise<SearchHit[]> {
+  try {
+    const result = JSON.parse(await invoke<string>('search_documents', { query, limit, offset }));
+    if (result.type === 'error') {
+      throw new Error(result.message);
+    }
+    return result.hits;
+  } catch (error) {
+    console.error('Failed to search documents:', error);
+    throw error;
+  }
+}
+
 /**
  * Helper to format file size
  */
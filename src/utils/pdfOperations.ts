@@ -1,30 +1,48 @@
 import { invoke } from '@tauri-apps/api/core';
 import { open, save } from '@tauri-apps/plugin-dialog';
+import { lastResultLine } from './tauri';
 
 export const pdfOperations = {
   async extractText(pdfPath: string, languages = 'eng+ind'): Promise<string> {
-    return await invoke('ocr_pdf', {
+    return lastResultLine(await invoke('ocr_pdf', {
       pdfPath,
       languages,
       pages: null,
       outputFormat: 'text',
-    });
+    }));
+  },
+
+  async makeSearchable(pdfPath: string, outputPath: string, languages = 'eng+ind'): Promise<string> {
+    return lastResultLine(await invoke('ocr_pdf', {
+      pdfPath,
+      languages,
+      pages: null,
+      outputFormat: 'pdf',
+      outputPath,
+    }));
   },
 
   async convertToWord(inputPath: string, outputPath: string): Promise<string> {
     return await invoke('pdf_to_word', { inputPath, outputPath });
   },
 
-  async convertToImages(inputPath: string, outputDir: string, format = 'png', dpi = 200): Promise<string> {
-    return await invoke('pdf_to_images', { inputPath, outputDir, format, dpi });
+  async convertToImages(
+    inputPath: string,
+    outputDir: string,
+    format = 'png',
+    dpi = 200,
+    pages: string | null = null,
+    options: Record<string, number | boolean> | null = null
+  ): Promise<string> {
+    return await invoke('pdf_to_images', { inputPath, outputDir, format, dpi, pages, options });
   },
 
   async mergePDFs(inputPaths: string[], outputPath: string): Promise<string> {
-    return await invoke('merge_pdfs', { inputPaths, outputPath });
+    return lastResultLine(await invoke('merge_pdfs', { inputPaths, outputPath }));
   },
 
   async splitPDF(inputPath: string, outputDir: string, pages: number[]): Promise<string> {
-    return await invoke('split_pdf', { inputPath, outputDir, pages });
+    return lastResultLine(await invoke('split_pdf', { inputPath, outputDir, pages }));
   },
 
   async rotatePages(inputPath: string, outputPath: string, rotations: Record<number, number>): Promise<string> {
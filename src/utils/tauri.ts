@@ -1,5 +1,13 @@
 import { invoke } from '@tauri-apps/api/core';
 import { open } from '@tauri-apps/plugin-dialog';
+import type { PageLayout, PipelineStep, WatermarkOptions } from '../types';
+
+// Commands that report progress print NDJSON lines before their result,
+// and non-streaming calls return all of them; the result is the last line
+export function lastResultLine(output: unknown): string {
+  const text = String(output);
+  return text.trim().split('\n').filter(line => line.trim()).pop() || text;
+}
 
 export const tauriAPI = {
   async selectPDFFiles(): Promise<string[] | null> {
@@ -37,7 +45,8 @@ export const tauriAPI = {
     pdfPath: string,
     languages: string = 'eng+ind',
     pages: number[] | null = null,
-    outputFormat: string = 'txt'
+    outputFormat: string = 'txt',
+    outputPath: string | null = null
   ): Promise<any> {
     try {
       const result = await invoke('ocr_pdf', {
@@ -45,18 +54,24 @@ export const tauriAPI = {
         languages,
         pages,
         outputFormat,
+        outputPath,
       });
-      return JSON.parse(result as string);
+      return JSON.parse(lastResultLine(result));
     } catch (error) {
       console.error('OCR failed:', error);
       throw error;
     }
   },
 
-  async mergePDFs(inputPaths: string[], outputPath: string): Promise<any> {
+  async mergePDFs(
+    inputPaths: string[],
+    outputPath: string,
+    outlines: boolean | null = null,
+    links: boolean | null = null
+  ): Promise<any> {
     try {
-      const result = await invoke('merge_pdfs', { inputPaths, outputPath });
-      return JSON.parse(result as string);
+      const result = await invoke('merge_pdfs', { inputPaths, outputPath, outlines, links });
+      return JSON.parse(lastResultLine(result));
     } catch (error) {
       console.error('Merge failed:', error);
       throw error;
@@ -66,7 +81,23 @@ export const tauriAPI = {
   async splitPDF(inputPath: string, outputDir: string, pages: number[]): Promise<any> {
     try {
       const result = await invoke('split_pdf', { inputPath, outputDir, pages });
-      return JSON.parse(result as string);
+      return JSON.parse(lastResultLine(result));
+    } catch (error) {
+      console.error('Split failed:', error);
+      throw error;
+    }
+  },
+
+  async splitPDFBy(
+    inputPath: string,
+    outputDir: string,
+    mode: 'ranges' | 'chunk' | 'bookmarks' | 'size',
+    value: string | number,
+    workers: number | null = null
+  ): Promise<any> {
+    try {
+      const result = await invoke('split_pdf', { inputPath, outputDir, mode, value, workers });
+      return JSON.parse(lastResultLine(result));
     } catch (error) {
       console.error('Split failed:', error);
       throw error;
@@ -76,10 +107,11 @@ export const tauriAPI = {
   async rotatePages(
     inputPath: string,
     outputPath: string,
-    rotations: { [key: number]: number }
+    rotations: { [key: number]: number },
+    incremental = false
   ): Promise<any> {
     try {
-      const result = await invoke('rotate_pages', { inputPath, outputPath, rotations });
+      const result = await invoke('rotate_pages', { inputPath, outputPath, rotations, incremental });
       return JSON.parse(result as string);
     } catch (error) {
       console.error('Rotate failed:', error);
@@ -87,9 +119,14 @@ export const tauriAPI = {
     }
   },
 
-  async deletePages(inputPath: string, outputPath: string, pagesToDelete: number[]): Promise<any> {
+  async deletePages(
+    inputPath: string,
+    outputPath: string,
+    pagesToDelete: number[],
+    incremental = false
+  ): Promise<any> {
     try {
-      const result = await invoke('delete_pages', { inputPath, outputPath, pagesToDelete });
+      const result = await invoke('delete_pages', { inputPath, outputPath, pagesToDelete, incremental });
       return JSON.parse(result as string);
     } catch (error) {
       console.error('Delete pages failed:', error);
@@ -107,14 +144,63 @@ export const tauriAPI = {
     }
   },
 
+  async runPipeline(inputPath: string, outputPath: string, steps: PipelineStep[]): Promise<any> {
+    try {
+      const result = await invoke('run_pipeline', { inputPath, outputPath, steps });
+      return JSON.parse(result as string);
+    } catch (error) {
+      console.error('Pipeline failed:', error);
+      throw error;
+    }
+  },
+
+  async streamPdfLayout(
+    pdfPath: string,
+    pages: string | null,
+    onPage: (layout: PageLayout) => void
+  ): Promise<any> {
+    const { listen } = await import('@tauri-apps/api/event');
+
+    // One event per page, so the editor can show text before the range is done
+    const unlisten = await listen<{ pdfPath: string; line: string }>('pdf-layout', (event) => {
+      if (event.payload.pdfPath !== pdfPath) return;
+      try {
+        const layout = JSON.parse(event.payload.line);
+        if (layout.type === 'layout') {
+          onPage(layout as PageLayout);
+        }
+      } catch {
+        // Ignore non-JSON diagnostics printed by the script
+      }
+    });
+
+    try {
+      const result = await invoke('stream_pdf_layout', { pdfPath, pages });
+      const resultStr = String(result);
+      return JSON.parse(resultStr.trim().split('\n').filter(line => line.trim()).pop() || resultStr);
+    } catch (error) {
+      console.error('Layout extraction failed:', error);
+      throw error;
+    } finally {
+      unlisten();
+    }
+  },
+
   async addWatermark(
     inputPath: string,
     outputPath: string,
     text: string,
-    position: string
+    position: string,
+    options: WatermarkOptions | null = null
   ): Promise<any> {
     try {
-      const result = await invoke('add_watermark', { inputPath, outputPath, text, position });
+      const result = await invoke('add_watermark', {
+        inputPath,
+        outputPath,
+        watermarkText: text,
+        position,
+        options
+      });
       return JSON.parse(result as string);
     } catch (error) {
       console.error('Watermark failed:', error);
@@ -162,14 +248,18 @@ export const tauriAPI = {
     pdfPath: string,
     outputDir: string,
     format: string = 'png',
-    dpi: number = 200
+    dpi: number = 200,
+    pages: string | null = null,
+    options: Record<string, number | boolean> | null = null
   ): Promise<any> {
     try {
       const result = await invoke('pdf_to_images', { 
         inputPath: pdfPath, 
         outputDir, 
         format, 
-        dpi 
+        dpi,
+        pages,
+        options
       });
       if (!result || result === '') {
         throw new Error('Empty response from pdf_to_images command');
@@ -181,11 +271,18 @@ export const tauriAPI = {
     }
   },
 
-  async imagesToPDF(imagePaths: string[], outputPath: string): Promise<any> {
+  async imagesToPDF(
+    imagePaths: string[],
+    outputPath: string,
+    pageSize: string | null = null,
+    margin: number | null = null
+  ): Promise<any> {
     try {
       const result = await invoke('images_to_pdf', { 
         imagePaths, 
-        outputPath 
+        outputPath,
+        pageSize,
+        margin
       });
       if (!result || result === '') {
         throw new Error('Empty response from images_to_pdf command');